@@ -0,0 +1,118 @@
+import numpy as np
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class IVFInnerProductIndex:
+    """Index IVF (k-means coarse quantizer) cho tìm kiếm maximum inner product
+
+    Vector item được chuẩn hóa theo phép biến đổi MIPS -> cosine (thêm 1 chiều
+    sqrt(M^2 - |x|^2), M = norm lớn nhất) để item norm lớn/nhỏ được tách cụm,
+    sau đó chia vào n_lists cụm bằng spherical k-means. Khi tìm kiếm,
+    chỉ các item thuộc nprobe cụm có centroid . query lớn nhất mới được chấm
+    điểm chính xác; nprobe càng lớn thì recall càng cao và latency càng lớn.
+    """
+
+    def __init__(self, n_lists=None, nprobe=8, n_iter=10, random_state=42):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.random_state = random_state
+        self.centroids = None
+        self.list_offsets = None   # Item của cụm c nằm ở sorted_items[offsets[c]:offsets[c + 1]]
+        self.sorted_items = None
+        self.sorted_vectors = None
+        self.n_items = 0
+
+    def build(self, item_vectors):
+        """Phân cụm item_vectors (n_items x k)"""
+        item_vectors = np.ascontiguousarray(item_vectors, dtype=np.float64)
+        self.n_items = len(item_vectors)
+        n_lists = self.n_lists or max(1, int(np.sqrt(self.n_items)))
+        n_lists = min(n_lists, self.n_items)
+
+        rng = np.random.default_rng(self.random_state)
+        norms = np.linalg.norm(item_vectors, axis=1, keepdims=True)
+        max_norm = max(float(norms.max()), 1e-12)
+        # Mọi vector sau biến đổi có norm = 1; query [q, 0] giữ nguyên thứ hạng inner product
+        directions = np.hstack([
+            item_vectors, np.sqrt(np.maximum(max_norm ** 2 - norms ** 2, 0))
+        ]) / max_norm
+
+        # Spherical k-means: gán theo cosine, centroid = trung bình hướng
+        centroids = directions[rng.choice(self.n_items, n_lists, replace=False)]
+        for _ in range(self.n_iter):
+            assignments = np.argmax(directions.dot(centroids.T), axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, directions)
+            counts = np.bincount(assignments, minlength=n_lists)
+            empty = counts == 0
+            # Cụm rỗng được khởi tạo lại bằng item ngẫu nhiên
+            sums[empty] = directions[rng.choice(self.n_items, empty.sum())]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        assignments = np.argmax(directions.dot(centroids.T), axis=1)
+
+        # Query có thành phần cuối = 0 nên chỉ cần k chiều đầu của centroid
+        self.centroids = centroids[:, :-1]
+        self.sorted_items = np.argsort(assignments, kind='stable')
+        self.sorted_vectors = item_vectors[self.sorted_items]
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))])
+        logger.info(f"Built IVF index: {self.n_items} items, {n_lists} lists")
+        return self
+
+    def search(self, query, k, nprobe=None, exclude=None):
+        """Top-k (item_indices, scores) theo inner product với query, chỉ duyệt nprobe cụm"""
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_scores = self.centroids.dot(query)
+        if nprobe < len(self.centroids):
+            probe_lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe_lists = np.arange(len(self.centroids))
+
+        positions = np.concatenate([
+            np.arange(self.list_offsets[c], self.list_offsets[c + 1]) for c in probe_lists
+        ])
+        candidates = self.sorted_items[positions]
+        scores = self.sorted_vectors[positions].dot(query)
+
+        if exclude is not None and len(exclude):
+            scores[np.isin(candidates, exclude)] = -np.inf
+
+        k = min(k, len(candidates))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(candidates) else np.arange(len(candidates))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        top = top[np.isfinite(scores[top])]
+        return candidates[top], scores[top]
+
+    def evaluate(self, queries, k=10, nprobes=(1, 2, 4, 8, 16, 32)):
+        """Recall@k và latency so với chấm điểm chính xác (toàn bộ item) cho từng nprobe"""
+        item_vectors = np.empty_like(self.sorted_vectors)
+        item_vectors[self.sorted_items] = self.sorted_vectors
+
+        exact = []
+        start = time.perf_counter()
+        for query in queries:
+            scores = item_vectors.dot(query)
+            top = np.argpartition(-scores, k - 1)[:k]
+            exact.append(set(top.tolist()))
+        exact_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+        report = [{'nprobe': 'exact', 'recall@k': 1.0, 'latency_ms': exact_ms}]
+        for nprobe in nprobes:
+            if nprobe > len(self.centroids):
+                break
+            hits = 0
+            start = time.perf_counter()
+            results = [self.search(query, k, nprobe=nprobe)[0] for query in queries]
+            latency_ms = (time.perf_counter() - start) / len(queries) * 1000
+            for truth, found in zip(exact, results):
+                hits += len(truth.intersection(found.tolist()))
+            report.append({
+                'nprobe': nprobe,
+                'recall@k': hits / (k * len(queries)),
+                'latency_ms': latency_ms
+            })
+        return report
@@ -5,16 +5,22 @@ from popularity_recommender import PopularityRecommender
 from collaborative_recommender import CollaborativeRecommender
 from content_based_recommender import ContentBasedRecommender
 from hybrid_recommender import HybridRecommender
-import mysql.connector
+from hybrid_candidates import HybridCandidates
+from model_holder import ModelHolder
+from db_pool import get_connection, get_pool
+from interaction_counter import InteractionCounter
+from popularity_stream import PopularityStream
+from product_cache import get_product_cache
+from model_store import get_artifact_store
+import config
 from datetime import datetime
 import logging
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
 import threading
 import queue
 import time
+from collections import deque
 
 app = Flask(__name__)
 # Cấu hình logging
@@ -37,74 +43,290 @@ CORS(app, resources={
     }
 })
 
-# Config database giữ nguyên
-db_config = {
-    'host': 'localhost',
-    'user': 'root', 
-    'password': '100103',
-    'database': 'NLCN',
-    'port': 3307,
-    'auth_plugin': 'mysql_native_password'
-}
-
 # Cache cho recommender để tránh train lại model quá nhiều
-recommender = None
-last_train_time = None
-CACHE_DURATION = 3600  # 1 giờ
-
-# Thêm global variable
-collab_recommender = None
-content_based_recommender = None
-hybrid_recommender = None
+CACHE_DURATION = 3600  # 1 giờ (hard TTL: quá hạn vẫn trả version cũ nhưng log cảnh báo)
+CACHE_SOFT_TTL = 3000  # Quá soft TTL thì train lại ở background trước khi hết hard TTL
+TRAIN_RETRY_INTERVAL = 60  # giây chờ trước khi thử train lại sau một lượt lỗi
+MODEL_REFRESH_CHECK_INTERVAL = 60  # giây giữa 2 lần kiểm tra model quá hạn
+EVENT_PUBLISH_INTERVAL = 1  # giây tối thiểu giữa 2 lần publish snapshot collaborative từ events
+INTERACTION_RECONCILE_INTERVAL = 600  # giây giữa 2 lần đối soát số tương tác với DB
+MIN_COLLABORATIVE_INTERACTIONS = 5  # Số tương tác tối thiểu để dùng collaborative filtering
+CONTENT_SYNC_INTERVAL = config.CONTENT_CONFIG['sync_interval']  # giây giữa 2 lần đồng bộ sản phẩm thay đổi
+POPULARITY_STREAMING = config.POPULARITY_CONFIG['streaming']
+POPULARITY_PUBLISH_INTERVAL = config.POPULARITY_CONFIG['publish_interval']  # giây giữa 2 lần publish popularity từ events
+# Bật streaming thì popularity được cập nhật theo events, fit lại từ DB thưa hơn (đối soát)
+POPULARITY_SOFT_TTL = config.POPULARITY_CONFIG['reconcile_interval'] if POPULARITY_STREAMING else CACHE_SOFT_TTL
+MODEL_SOFT_TTLS = {'popularity': POPULARITY_SOFT_TTL}
+HYBRID_CANDIDATE_CHECK_INTERVAL = 5  # giây giữa 2 lần kiểm tra hybrid/model thành phần đổi
+HYBRID_CANDIDATE_REFRESH_INTERVAL = config.HYBRID_CONFIG['candidate_refresh_interval']
 
 # Khởi tạo các biến theo dõi trạng thái
 training_status = {
     'last_train_time': None,
     'total_events_processed': 0,
     'pending_events': 0,
-    'model_version': 1,
     'source': None  # Nguồn recommendation hiện tại
 }
 
-# Queue để lưu các events
+# Queue để lưu các events (chế độ nhiều worker: serve.py thay bằng queue liên process)
 event_queue = queue.Queue()
 
-# Thêm biến để theo dõi trạng thái khởi tạo
-collaborative_initialized = False
+# Chế độ nhiều worker (serve.py): worker không tự train mà gửi tên model vào queue này
+# cho process cha; None = process đơn, train tại chỗ
+train_request_queue = None
+
+# Số tương tác của từng user, dùng để chọn thuật toán mà không cần query DB
+interaction_counter = InteractionCounter()
+
+def load_product_viewers(product_ids):
+    """Người đã xem từng sản phẩm trong DB, để popularity_stream không đếm lại người xem cũ"""
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    with get_connection() as conn:
+        viewers = pd.read_sql(
+            f"SELECT product_id, user_id FROM user_product_views WHERE product_id IN ({placeholders})",
+            conn, params=list(product_ids)
+        )
+    return viewers.groupby('product_id')['user_id'].apply(list).to_dict()
+
+# Bộ đếm popularity cập nhật theo events (process_events)
+popularity_stream = PopularityStream(
+    half_life_hours=config.POPULARITY_CONFIG['half_life_hours'],
+    hll_precision=config.POPULARITY_CONFIG['hll_precision'],
+    viewer_loader=load_product_viewers
+)
+
+# Artifact đã lưu của từng model: name -> (model, version)
+saved_artifacts = {}
+
+def save_artifact(name, model, trained_from):
+    """Lưu model vừa train ra đĩa để lần khởi động sau warm start (lỗi ghi không làm hỏng lượt train)"""
+    if not config.ARTIFACT_CONFIG['enabled']:
+        return
+    try:
+        saved_artifacts[name] = (model, get_artifact_store().save(name, model, trained_from=trained_from))
+    except Exception as e:
+        logger.error(f"Error saving {name} artifact: {str(e)}")
+
+def train_popularity():
+    """Train 1 version popularity recommender mới"""
+    trained_from = datetime.now()
+    with get_connection() as conn:
+        model = PopularityRecommender()
+        if not model.fit(conn):
+            raise RuntimeError("Popularity recommender fit failed")
+    save_artifact('popularity', model, trained_from)
+    return model
+
+def train_collaborative_model():
+    """Train 1 version collaborative recommender mới"""
+    trained_from = datetime.now()
+    with get_connection() as conn:
+        model = CollaborativeRecommender().fit(conn)
+        # Load lại số tương tác cùng lúc với dữ liệu train
+        try:
+            interaction_counter.load(conn)
+        except Exception as e:
+            logger.error(f"Error loading interaction counts: {str(e)}")
+    save_artifact('collaborative', model, trained_from)
+    return model
+
+def train_content_based():
+    """Train 1 version content-based recommender mới"""
+    trained_from = datetime.now()
+    model = ContentBasedRecommender().fit()
+    save_artifact('content_based', model, trained_from)
+    return model
+
+def train_hybrid():
+    """Train 1 version hybrid recommender mới
+
+    Dùng lại các model thành phần app đang phục vụ; model nào chưa có thì được train
+    song song (mỗi model 1 connection riêng từ pool).
+    """
+    model = HybridRecommender()
+    reuse = {
+        'collaborative': collaborative_holder.get(),
+        'content_based': content_based_holder.get(),
+        'popularity': popularity_holder.get()
+    }
+    if not model.fit(reuse=reuse):
+        raise RuntimeError(f"Hybrid recommender fit failed: {model.fit_report}")
+    return model.use_candidates(candidates_holder.get())
+
+def train_hybrid_candidates():
+    """Tính 1 bộ candidate hybrid mới từ các model thành phần đang phục vụ"""
+    if not all(holder.is_ready for holder in hybrid_component_holders):
+        raise RuntimeError("Hybrid component models are not ready")
+    trained_from = datetime.now()
+    model = HybridCandidates.build(*(holder.get() for holder in hybrid_component_holders))
+    save_artifact('hybrid_candidates', model, trained_from)
+    return model
+
+# Mỗi model được giữ trong 1 holder: request đọc version đã publish,
+# version mới được train ở background rồi swap nguyên tử
+popularity_holder = ModelHolder('popularity', train_popularity)
+collaborative_holder = ModelHolder('collaborative', train_collaborative_model)
+content_based_holder = ModelHolder('content_based', train_content_based)
+hybrid_holder = ModelHolder('hybrid', train_hybrid)
+candidates_holder = ModelHolder('hybrid_candidates', train_hybrid_candidates)
+model_holders = [popularity_holder, collaborative_holder, content_based_holder, hybrid_holder, candidates_holder]
+# Hybrid được ghép từ các model này (thứ tự tham số của HybridRecommender.from_components)
+hybrid_component_holders = (content_based_holder, collaborative_holder, popularity_holder)
 
 def get_recommender():
-    """Lấy recommender từ cache hoặc train mới nếu cần"""
-    global recommender, last_train_time
-    
-    current_time = datetime.now()
+    """Lấy popularity recommender đang phục vụ (stale-while-revalidate)
+
+    Không request nào phải chờ train khi đã có version cũ: quá CACHE_SOFT_TTL thì
+    đúng 1 lượt train chạy ở background, các request vẫn nhận version cũ.
+    """
+    recommender = popularity_holder.get()
     
-    # Kiểm tra xem có cần train lại model không
-    need_retrain = (
-        recommender is None or 
-        last_train_time is None or
-        (current_time - last_train_time).total_seconds() > CACHE_DURATION
-    )
+    if recommender is None:
+        # Chưa có version nào (cold start) -> train đồng bộ, các request đồng thời
+        # chờ chung lượt train đó thay vì mỗi request tự fit
+        if not popularity_holder.train(wait=True):
+            raise RuntimeError(popularity_holder.last_error or 'Popularity model is not ready')
+        return popularity_holder.get()
     
-    if need_retrain:
-        try:
-            conn = mysql.connector.connect(**db_config)
-            recommender = PopularityRecommender()
-            recommender.fit(conn)
-            last_train_time = current_time
-            conn.close()
-            logger.info("Model retrained successfully")
-        except Exception as e:
-            logger.error(f"Error training model: {str(e)}")
-            raise e
+    stale_after = POPULARITY_SOFT_TTL + CACHE_DURATION - CACHE_SOFT_TTL
+    popularity_holder.refresh(POPULARITY_SOFT_TTL, TRAIN_RETRY_INTERVAL)
+    # Cảnh báo theo tuổi model, kể cả khi lượt train lại đang chạy sẵn hoặc đang chờ retry
+    age = popularity_holder.age()
+    if age is not None and age > stale_after:
+        logger.warning(f"Serving stale popularity model (age {age:.0f}s)")
             
     return recommender
 
+# Model có artifact trên đĩa: (holder, class); hybrid được ghép lại từ 3 model thành phần
+# và candidate tính sẵn (tính sau cùng, từ các model thành phần)
+artifact_models = [
+    (popularity_holder, PopularityRecommender),
+    (collaborative_holder, CollaborativeRecommender),
+    (content_based_holder, ContentBasedRecommender),
+    (candidates_holder, HybridCandidates)
+]
+
+def load_artifact_models(versions=None):
+    """Load artifact (mmap) của các model -> {name: (model, manifest)}
+
+    versions = {name: version} để ghim đúng version (release), None = version CURRENT.
+    """
+    store = get_artifact_store()
+    models = {}
+    for holder, model_cls in artifact_models:
+        try:
+            result = store.load(holder.name, model_cls, version=(versions or {}).get(holder.name))
+        except Exception as e:
+            logger.error(f"Error loading {holder.name} artifact: {str(e)}")
+            continue
+        if result is not None:
+            models[holder.name] = result
+    return models
+
+def publish_artifact_models(models):
+    """Publish các model load từ artifact vào holder, trả về các holder đã publish"""
+    published = []
+    for holder, _ in artifact_models:
+        if holder.name not in models:
+            continue
+        model, manifest = models[holder.name]
+        trained_from = manifest.get('trained_from')
+        holder.publish(model, trained_from=datetime.fromisoformat(trained_from) if trained_from else None)
+        saved_artifacts[holder.name] = (model, manifest['version'])
+        published.append(holder)
+    
+    if all(holder.name in models for holder in hybrid_component_holders):
+        # Hybrid dùng chung các model thành phần vừa load thay vì train thêm 1 bộ nữa
+        compose_hybrid()
+        published.append(hybrid_holder)
+    return published
+
+def compose_hybrid():
+    """Ghép lại hybrid từ model thành phần và candidate đang phục vụ nếu có thay đổi
+
+    Không tốn tính toán (dùng chung object), publish kiểu CAS; trả về version mới hoặc None.
+    """
+    version = hybrid_holder.version
+    current = hybrid_holder.get()
+    models = [holder.get() for holder in hybrid_component_holders]
+    candidates = candidates_holder.get()
+    if current is not None and current.candidates is candidates and all(
+        getattr(current, name) is model for name, model in zip(('content_based', 'collaborative', 'popularity'), models)
+    ):
+        return None
+    return hybrid_holder.publish(
+        HybridRecommender.from_components(*models, candidates=candidates),
+        trained_from=min(holder.trained_from for holder in hybrid_component_holders),
+        expected_version=version
+    )
+
+def warm_start_models():
+    """Publish các model từ artifact đã lưu (mmap) để phục vụ ngay, trả về các holder đã load
+
+    Model load từ artifact giữ trained_from cũ nên vẫn được train lại từ DB sau đó.
+    """
+    if not config.ARTIFACT_CONFIG['enabled']:
+        return []
+    return publish_artifact_models(load_artifact_models())
+
+def save_current_artifacts():
+    """Đảm bảo version đang phục vụ của từng model đã có artifact, trả về {name: version}
+
+    Model đã được lưu lúc train (hoặc vừa load từ artifact) không bị ghi lại; model
+    publish từ event/đồng bộ incremental được lưu thành version mới.
+    """
+    versions = {}
+    for holder, _ in artifact_models:
+        model = holder.get()
+        if model is None:
+            continue
+        saved = saved_artifacts.get(holder.name)
+        if saved is None or saved[0] is not model:
+            version = get_artifact_store().save(holder.name, model, trained_from=holder.trained_from)
+            saved_artifacts[holder.name] = saved = (model, version)
+        versions[holder.name] = saved[1]
+    return versions
+
+def init_models():
+    """Khởi tạo mọi model: warm start từ artifact nếu có, model còn thiếu thì train đồng bộ
+
+    Trả về các holder đã warm start (được train lại từ DB ở background bởi
+    start_background_tasks). Không start thread nào.
+    """
+    warm_started = warm_start_models()
+    if popularity_holder not in warm_started:
+        get_recommender()  # Popularity recommender
+    if collaborative_holder not in warm_started:
+        init_collaborative()  # Collaborative recommender
+    if content_based_holder not in warm_started:
+        init_content_based()
+    if hybrid_holder not in warm_started:
+        init_hybrid()
+    return warm_started
+
+def retrain_models(holders):
+    """Train lại lần lượt các model đã warm start từ artifact (chạy ở background)"""
+    for holder in holders:
+        holder.train()
+
+def artifact_versions():
+    """Version artifact hiện tại trên đĩa của từng model"""
+    if not config.ARTIFACT_CONFIG['enabled']:
+        return {}
+    store = get_artifact_store()
+    return {holder.name: store.current_version(holder.name) for holder, _ in artifact_models}
+
+def model_versions():
+    """Version đã publish của từng model"""
+    return {holder.name: holder.version for holder in model_holders}
+
 @app.route('/api/recommended-products', methods=['GET'])
 def get_recommended_products():
     try:
         user_id = request.args.get('user_id')
+        collaborative_recommender = collaborative_holder.get()
         
-        if user_id and check_user_interactions(user_id):
+        if user_id and collaborative_recommender and check_user_interactions(user_id):
             # Dùng collaborative
             recommendations = collaborative_recommender.recommend(
                 user_id=user_id,
@@ -127,7 +349,7 @@ def get_recommended_products():
             'recommendations': recommendations,
             'metadata': {
                 'source': training_status['source'],
-                'model_version': training_status['model_version'],
+                'model_version': model_versions().get(training_status['source']),
                 'last_updated': training_status['last_train_time']
             }
         })
@@ -143,15 +365,32 @@ def get_recommended_products():
 def retrain_model():
     """API để force retrain model"""
     try:
-        global recommender, last_train_time
-        recommender = None
-        last_train_time = None
-        get_recommender()
+        if train_request_queue is not None:
+            train_request_queue.put(popularity_holder.name)
+            return jsonify({'success': True, 'message': 'Retrain requested, workers reload when it finishes'}), 202
+        
+        # Train đồng bộ version mới, các request khác vẫn dùng version cũ tới khi swap
+        if not popularity_holder.train():
+            return jsonify({
+                'success': False,
+                'error': popularity_holder.last_error or 'Model is already training'
+            }), 500
         return jsonify({'success': True, 'message': 'Model retrained successfully'})
     except Exception as e:
         logger.error(f"Error retraining model: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/products/cache/invalidate', methods=['POST'])
+def invalidate_product_cache():
+    """API để backend báo sản phẩm thay đổi (product_ids rỗng = toàn bộ catalog)"""
+    try:
+        product_ids = (request.get_json(silent=True) or {}).get('product_ids')
+        version = get_product_cache().invalidate(product_ids)
+        return jsonify({'success': True, 'version': version})
+    except Exception as e:
+        logger.error(f"Error invalidating product cache: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/personalized-recommendations', methods=['GET'])
 def get_personalized_recommendations():
     try:
@@ -167,7 +406,10 @@ def get_personalized_recommendations():
             return get_recommended_products()
             
         # Lấy collaborative recommendations
-        recommendations = collab_recommender.recommend(
+        collaborative_recommender = collaborative_holder.get()
+        if collaborative_recommender is None:
+            return get_recommended_products()
+        recommendations = collaborative_recommender.recommend(
             user_id=user_id,
             n_items=8
         )
@@ -183,6 +425,10 @@ def get_personalized_recommendations():
 def train_collaborative():
     """API để train collaborative model"""
     try:
+        if train_request_queue is not None:
+            train_request_queue.put(collaborative_holder.name)
+            return jsonify({'success': True, 'message': 'Training requested, workers reload when it finishes'}), 202
+        
         success = init_collaborative()
         if success:
             return jsonify({
@@ -214,19 +460,18 @@ def get_collaborative_recommendations():
         has_interactions = check_user_interactions(int(user_id))
         logger.info(f"User {user_id} has sufficient interactions: {has_interactions}")
         
-        if not has_interactions:
+        collaborative_recommender = collaborative_holder.get()
+        if not has_interactions or collaborative_recommender is None:
             return get_popularity_recommendations()
             
         # Lấy recommendations từ collaborative model
-        conn = mysql.connector.connect(**db_config)
         recommendations = collaborative_recommender.recommend(
             user_id=int(user_id),
             n_items=int(request.args.get('limit', 8))
         )
         
         # Format response giống nh popularity recommendations
-        product_details = get_product_details(conn, recommendations)
-        conn.close()
+        product_details = get_product_details(recommendations)
         
         formatted_recommendations = [{
             'id': rec['product_id'],  # Thêm id để tương thích với ProductCard
@@ -263,12 +508,13 @@ def get_collaborative_recommendations():
 def get_collaborative_status():
     """API để lấy thông tin về collaborative model"""
     try:
-        if not collaborative_initialized:
+        if not collaborative_holder.is_ready:
             return jsonify({
                 'status': 'inactive',
                 'error': 'Collaborative recommender not initialized'
             })
 
+        collaborative_recommender = collaborative_holder.get()
         if collaborative_recommender is None:
             return jsonify({
                 'status': 'error',
@@ -277,9 +523,10 @@ def get_collaborative_status():
             
         stats = {
             'status': 'active',
-            'unique_users': len(collaborative_recommender.user_item_matrix.index) if hasattr(collaborative_recommender, 'user_item_matrix') else 0,
-            'unique_items': len(collaborative_recommender.user_item_matrix.columns) if hasattr(collaborative_recommender, 'user_item_matrix') else 0,
-            'sparsity': collaborative_recommender.calculate_sparsity() if hasattr(collaborative_recommender, 'calculate_sparsity') else 0
+            'unique_users': collaborative_recommender.user_item_matrix.n_users if collaborative_recommender.user_item_matrix is not None else 0,
+            'unique_items': collaborative_recommender.user_item_matrix.n_items if collaborative_recommender.user_item_matrix is not None else 0,
+            'sparsity': collaborative_recommender.calculate_sparsity() if hasattr(collaborative_recommender, 'calculate_sparsity') else 0,
+            'model_version': collaborative_holder.version
         }
         
         logger.info(f"Collaborative stats: {stats}")
@@ -295,97 +542,48 @@ def get_collaborative_status():
             'error': str(e)
         }), 500
 
-def get_product_details(conn, product_ids):
-    """Lấy thông tin chi tiết của các sản phẩm"""
+def get_product_details(product_ids, conn=None):
+    """Lấy thông tin chi tiết của các sản phẩm (theo thứ tự product_ids) từ cache dùng chung"""
     if not product_ids:
         return []
-        
-    query = """
-        SELECT 
-            p.id as product_id,
-            p.name,
-            p.image_url,
-            b.name as brand_name,
-            c.name as category_name,
-            COALESCE(pv.min_price, 0) as min_price,
-            COALESCE(pv.max_price, 0) as max_price,
-            COALESCE(r.avg_rating, 0) as avg_rating,
-            COALESCE(r.review_count, 0) as review_count,
-            COALESCE(s.sold_count, 0) as sold_count
-        FROM products p
-        LEFT JOIN brands b ON p.brand_id = b.id
-        LEFT JOIN categories c ON p.category_id = c.id
-        LEFT JOIN (
-            SELECT product_id, MIN(price) as min_price, MAX(price) as max_price
-            FROM productvariants
-            GROUP BY product_id
-        ) pv ON p.id = pv.product_id
-        LEFT JOIN (
-            SELECT product_id, 
-                   COUNT(*) as review_count,
-                   AVG(rating) as avg_rating
-            FROM reviews
-            GROUP BY product_id
-        ) r ON p.id = r.product_id
-        LEFT JOIN (
-            SELECT product_id, SUM(quantity) as sold_count
-            FROM orderitems oi
-            JOIN orders o ON oi.order_id = o.id
-            WHERE o.status != 'cancelled'
-            GROUP BY product_id
-        ) s ON p.id = s.product_id
-        WHERE p.id IN (%s)
-    """ % ','.join(map(str, product_ids))
-    
-    df = pd.read_sql(query, conn)
-    return df.to_dict('records')
+    return get_product_cache().get_many(product_ids, conn)
 
 def init_collaborative():
     """Khởi tạo collaborative recommender"""
-    try:
-        global collaborative_recommender, collaborative_initialized
-        
-        conn = mysql.connector.connect(**db_config)
-        collaborative_recommender = CollaborativeRecommender()
-        success = collaborative_recommender.fit(conn)
-        conn.close()
-        
-        if success:
-            collaborative_initialized = True
-            logger.info("Collaborative recommender initialized successfully")
-            return True
-        return False
-        
-    except Exception as e:
-        logger.error(f"Error initializing collaborative recommender: {str(e)}")
-        return False
+    success = collaborative_holder.train()
+    if success:
+        logger.info("Collaborative recommender initialized successfully")
+    return success
 
 def check_user_interactions(user_id):
-    """Kiểm tra xem user có đủ tương tác để dùng collaborative filtering kh��ng"""
+    """Kiểm tra xem user có đủ tương tác để dùng collaborative filtering không"""
     try:
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor()
-        
-        # Đếm số lượng tương tác (view, rating, purchase) của user
-        cursor.execute("""
-            SELECT COUNT(*) as interaction_count 
-            FROM (
-                SELECT user_id FROM user_product_views WHERE user_id = %s
-                UNION ALL
-                SELECT user_id FROM reviews WHERE user_id = %s
-                UNION ALL 
-                SELECT user_id FROM orders WHERE user_id = %s
-            ) interactions
-        """, (user_id, user_id, user_id))
-        
-        result = cursor.fetchone()
-        interaction_count = result[0] if result else 0
-        
-        cursor.close()
-        conn.close()
+        if interaction_counter.is_loaded:
+            return interaction_counter.has_min_interactions(user_id, MIN_COLLABORATIVE_INTERACTIONS)
+        
+        # Chưa load được bộ đếm (vd. lỗi DB lúc train) -> query trực tiếp
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            
+            # Đếm số lượng tương tác (view, rating, purchase) của user
+            cursor.execute("""
+                SELECT COUNT(*) as interaction_count 
+                FROM (
+                    SELECT user_id FROM user_product_views WHERE user_id = %s
+                    UNION ALL
+                    SELECT user_id FROM reviews WHERE user_id = %s
+                    UNION ALL 
+                    SELECT user_id FROM orders WHERE user_id = %s
+                ) interactions
+            """, (user_id, user_id, user_id))
+            
+            result = cursor.fetchone()
+            interaction_count = result[0] if result else 0
+            
+            cursor.close()
         
         # Yêu cầu ít nhất 5 tương tác
-        return interaction_count >= 5
+        return interaction_count >= MIN_COLLABORATIVE_INTERACTIONS
         
     except Exception as e:
         logger.error(f"Error checking user interactions: {str(e)}")
@@ -403,9 +601,7 @@ def format_recommendations(recommendations):
                 }
             })
             
-        conn = mysql.connector.connect(**db_config)
-        product_details = get_product_details(conn, recommendations)
-        conn.close()
+        product_details = get_product_details(recommendations)
         
         return jsonify({
             'success': True,
@@ -423,6 +619,7 @@ def format_recommendations(recommendations):
 def get_matrix_info():
     """API để xem thông tin chi tiết về ma trận"""
     try:
+        collaborative_recommender = collaborative_holder.get()
         if collaborative_recommender is None:
             return jsonify({
                 'success': False,
@@ -430,25 +627,29 @@ def get_matrix_info():
             })
             
         matrix = collaborative_recommender.user_item_matrix
+        item_ids = matrix.item_ids
+        
+        # Sample 5 user đầu, chỉ gồm các ô khác 0 (không densify ma trận)
+        matrix_sample = {}
+        for user_idx in range(min(5, matrix.n_users)):
+            indices, values = matrix.user_row(user_idx)
+            matrix_sample[str(int(matrix.user_ids[user_idx]))] = {
+                str(int(item_ids[col])): float(val)  # Convert to regular float
+                for col, val in zip(indices, values)
+            }
         
         return jsonify({
             'success': True,
-            'users': [int(x) for x in matrix.index.tolist()],  # Convert to regular int
-            'items': [int(x) for x in matrix.columns.tolist()],
-            'matrix_sample': {
-                str(idx): {
-                    str(col): float(val)  # Convert to regular float
-                    for col, val in row.items()
-                }
-                for idx, row in matrix.head().to_dict('index').items()
-            },
+            'users': matrix.user_ids.tolist(),  # Convert to regular int
+            'items': item_ids.tolist(),
+            'matrix_sample': matrix_sample,
             'matrix_stats': {
                 'shape': matrix.shape,
-                'non_zero_counts': int((matrix != 0).sum().sum()),
-                'user_interaction_counts': {
-                    int(user): int(count)
-                    for user, count in (matrix != 0).sum(axis=1).items()
-                }
+                'non_zero_counts': int(matrix.nnz),
+                'user_interaction_counts': dict(zip(
+                    matrix.user_ids.tolist(),
+                    matrix.row_nnz().tolist()
+                ))
             }
         })
         
@@ -526,6 +727,13 @@ def get_content_based_recommendations():
                 'error': 'Missing product_id parameter'
             }), 400
             
+        content_based_recommender = content_based_holder.get()
+        if content_based_recommender is None:
+            return jsonify({
+                'success': False,
+                'error': 'Content-based recommender not initialized'
+            }), 500
+            
         # Lấy recommendations từ content-based model
         recommendations = content_based_recommender.recommend(
             product_id=product_id,
@@ -534,13 +742,15 @@ def get_content_based_recommendations():
         
         # Format response giống như collaborative
         formatted_recommendations = []
-        conn = mysql.connector.connect(**db_config)
+        # Lấy thông tin chi tiết của tất cả sản phẩm một lần (cache + 1 query gộp cho miss)
+        products = {
+            product['product_id']: product
+            for product in get_product_details([rec['id'] for rec in recommendations])
+        }
         
         for rec in recommendations:
-            # Lấy thông tin chi tiết sản phẩm
-            product_details = get_product_details(conn, [rec['id']])
-            if product_details:
-                product = product_details[0]
+            product = products.get(rec['id'])
+            if product:
                 formatted_recommendations.append({
                     'id': rec['id'],
                     'product_id': rec['id'],  # Thêm trường này để đồng nhất
@@ -557,8 +767,6 @@ def get_content_based_recommendations():
                     },
                     'reason': get_similarity_reason(rec['similarity_score'])
                 })
-        
-        conn.close()
 
         return jsonify({
             'success': True,
@@ -577,6 +785,31 @@ def get_content_based_recommendations():
             'error': str(e)
         }), 500
 
+@app.route('/api/content-based/drift', methods=['GET'])
+def get_content_based_drift():
+    """So sánh model content-based cập nhật incremental với fit lại toàn bộ"""
+    try:
+        content_based_recommender = content_based_holder.get()
+        if content_based_recommender is None:
+            return jsonify({
+                'success': False,
+                'error': 'Content-based recommender not initialized'
+            }), 500
+        
+        sample_size = request.args.get('sample_size', default=100, type=int)
+        report = content_based_recommender.drift_report(sample_size=sample_size)
+        return jsonify({
+            'success': 'error' not in report,
+            'drift': report,
+            'model_version': content_based_holder.version
+        })
+    except Exception as e:
+        logger.error(f"Error computing content-based drift: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 def get_similarity_reason(similarity_score):
     """To lý do gợi ý dựa trên similarity score"""
     if similarity_score > 0.8:
@@ -589,29 +822,17 @@ def get_similarity_reason(similarity_score):
 
 def init_content_based():
     """Khởi tạo content-based recommender"""
-    global content_based_recommender
-    try:
-        content_based_recommender = ContentBasedRecommender()
-        content_based_recommender.fit()
+    success = content_based_holder.train()
+    if success:
         logger.info("Content-based model initialized successfully")
-        return True
-    except Exception as e:
-        logger.error(f"Error initializing content-based model: {str(e)}")
-        return False
+    return success
 
 def init_hybrid():
     """Khởi tạo hybrid recommender"""
-    global hybrid_recommender
-    try:
-        conn = mysql.connector.connect(**db_config)
-        hybrid_recommender = HybridRecommender()
-        hybrid_recommender.fit(conn)  # Truyền connection vào
-        conn.close()
+    success = hybrid_holder.train()
+    if success:
         logger.info("Hybrid recommender initialized successfully")
-        return True
-    except Exception as e:
-        logger.error(f"Error initializing hybrid recommender: {str(e)}")
-        return False
+    return success
 
 @app.route('/api/hybrid/recommend', methods=['GET'])
 def get_hybrid_recommendations():
@@ -622,6 +843,7 @@ def get_hybrid_recommendations():
         logger.info(f"=== Hybrid API request ===")
         logger.info(f"user_id: {user_id}, product_id: {product_id}")
         
+        hybrid_recommender = hybrid_holder.get()
         if not hybrid_recommender:
             logger.error("Hybrid recommender not initialized")
             return jsonify({
@@ -629,7 +851,7 @@ def get_hybrid_recommendations():
                 'error': 'Hybrid recommender not initialized'
             }), 500
             
-        recommendations = hybrid_recommender.recommend(
+        recommendations, hybrid_metadata = hybrid_recommender.recommend_with_metadata(
             user_id=user_id,
             product_id=product_id
         )
@@ -643,7 +865,8 @@ def get_hybrid_recommendations():
                 'source': 'hybrid',
                 'user_id': user_id,
                 'product_id': product_id,
-                'total_items': len(recommendations)
+                'total_items': len(recommendations),
+                **hybrid_metadata
             }
         }
         
@@ -665,52 +888,9 @@ def get_popularity_analytics():
         # Lấy recommender
         recommender = get_recommender()
         
-        # Tạo figure với subplot layout
-        plt.style.use('seaborn')  # Sử dụng style đẹp hơn
-        fig = plt.figure(figsize=(20, 12))
-        
-        # 1. Phân phối Popularity Score
-        plt.subplot(2, 3, 1)
-        sns.histplot(data=recommender.recommendations, x='popularity_score', bins=20)
-        plt.title('Phân phối Popularity Score', fontsize=12, pad=10)
-        
-        # 2. Top 10 sản phẩm phổ biến
-        plt.subplot(2, 3, 2)
-        top_10 = recommender.recommendations.head(10)
-        sns.barplot(data=top_10, y='name', x='popularity_score')
-        plt.title('Top 10 Sản phẩm phổ biến nhất', fontsize=12, pad=10)
-        
-        # 3. Ph��n phối theo danh mục
-        plt.subplot(2, 3, 3)
-        category_counts = recommender.recommendations['category_name'].value_counts()
-        plt.pie(category_counts.values, labels=category_counts.index, autopct='%1.1f%%')
-        plt.title('Phân phối theo danh mục', fontsize=12, pad=10)
-        
-        # 4. Tương quan giữa các metrics
-        plt.subplot(2, 3, 4)
-        metrics = ['total_views', 'sold_count', 'unique_viewers', 'avg_rating']
-        sns.heatmap(recommender.recommendations[metrics].corr(), annot=True, cmap='coolwarm')
-        plt.title('Tương quan giữa các metrics', fontsize=12, pad=10)
-        
-        # 5. Mối quan hệ Views - Sales
-        plt.subplot(2, 3, 5)
-        plt.scatter(recommender.recommendations['total_views'], 
-                   recommender.recommendations['sold_count'],
-                   alpha=0.6)
-        plt.xlabel('Tổng lượt xem')
-        plt.ylabel('Số lượng bán')
-        plt.title('Mối quan hệ Views - Sales', fontsize=12, pad=10)
-        
-        # 6. Phân phối giá theo danh mục
-        plt.subplot(2, 3, 6)
-        sns.boxplot(data=recommender.recommendations, y='category_name', x='min_price')
-        plt.title('Phân phối giá theo danh mục', fontsize=12, pad=10)
-        
-        # Điều chỉnh layout
-        plt.tight_layout()
-        
-        # Hiển thị figure trong cửa sổ mới
-        plt.show()
+        # Thư viện vẽ chỉ được import khi gọi analytics
+        from popularity_analytics import show_analytics
+        show_analytics(recommender.recommendations)
         
         return jsonify({
             'success': True,
@@ -754,6 +934,9 @@ def track_user_action():
         if not all(field in data for field in required_fields):
             return jsonify({'error': 'Missing required fields'}), 400
             
+        # Cập nhật bộ đếm ngay để lần chọn thuật toán tiếp theo thấy event này
+        interaction_counter.record_event(data['user_id'], data['product_id'], data['action'])
+        
         # Thêm event vào queue
         event_queue.put({
             'user_id': data['user_id'],
@@ -771,9 +954,8 @@ def track_user_action():
 def get_training_status():
     """API để kiểm tra trạng thái training"""
     try:
-        conn = mysql.connector.connect(**db_config)
-        stats = calculate_model_stats(conn)
-        conn.close()
+        with get_connection() as conn:
+            stats = calculate_model_stats(conn)
 
         if stats is None:
             return jsonify({
@@ -788,8 +970,17 @@ def get_training_status():
             'success': True,
             'status': {
                 **training_status,
+                'model_version': collaborative_holder.version,
+                'model_versions': {holder.name: holder.status() for holder in model_holders},
+                'artifacts': artifact_versions(),
                 'model_stats': stats,
-                'model_initialized': collaborative_initialized
+                'db_pool': get_pool().stats(),
+                'interaction_counts': interaction_counter.stats(),
+                'popularity_stream': popularity_stream.stats(),
+                'hybrid_candidates': candidates_holder.get().stats() if candidates_holder.is_ready else None,
+                'hybrid_fit': hybrid_holder.get().fit_report if hybrid_holder.is_ready else None,
+                'product_cache': get_product_cache().stats(),
+                'model_initialized': collaborative_holder.is_ready
             }
         })
     except Exception as e:
@@ -797,52 +988,198 @@ def get_training_status():
         return jsonify({'error': str(e)}), 500
 
 def process_events():
-    """Background task xử lý events"""
+    """Background task xử lý events
+
+    Events được áp vào một bản working riêng của collaborative model rồi publish
+    thành snapshot, nên request không bao giờ đọc model đang bị sửa. Popularity
+    được cập nhật theo cùng events qua popularity_stream.
+    """
+    working = None
+    working_version = None
+    # Events đã áp gần đây, để replay lên version vừa train lại từ DB
+    recent_events = deque(maxlen=100000)
+    dirty = False
+    last_publish = time.time()
+    popularity_version = None
+    last_popularity_publish = time.time()
+    
     while True:
         try:
-            event = event_queue.get(timeout=1)
-            
-            # Log event details
-            logger.info(f"Processing event: {event}")
+            try:
+                event = event_queue.get(timeout=1)
+            except queue.Empty:
+                event = None
             
-            # Cập nhật model dựa trên action
-            weight = {
-                'view': 1,
-                'cart': 2, 
-                'purchase': 3
-            }.get(event['action'], 1)
+            # Có version mới (train lại ở background) -> rebase working copy lên version đó
+            # và replay các event xảy ra từ lúc bắt đầu train
+            if collaborative_holder.is_ready and collaborative_holder.version != working_version:
+                working_version = collaborative_holder.version
+                trained_from = collaborative_holder.trained_from
+                working = collaborative_holder.get().snapshot()
+                replay = [e for e in recent_events if e[0] >= trained_from]
+                for _, user_id, product_id, weight in replay:
+                    working.update_user_item(user_id, product_id, weight)
+                dirty = bool(replay)
             
-            start_time = time.time()
+            # Popularity vừa fit lại từ DB (đối soát) -> rebase bộ đếm và replay events
+            if POPULARITY_STREAMING and popularity_holder.is_ready and popularity_holder.version != popularity_version:
+                popularity_version = popularity_holder.version
+                popularity_stream.rebase(popularity_holder.get(), popularity_holder.trained_from)
             
-            # Cập nhật collaborative model
-            if collaborative_initialized and collaborative_recommender:
-                success = collaborative_recommender.update_user_item(
-                    event['user_id'],
-                    event['product_id'],
-                    weight
+            if event is not None:
+                # Log event details
+                logger.info(f"Processing event: {event}")
+                
+                # Cập nhật model dựa trên action
+                weight = {
+                    'view': 1,
+                    'cart': 2, 
+                    'purchase': 3
+                }.get(event['action'], 1)
+                
+                start_time = time.time()
+                
+                # Cập nhật collaborative model (bản working)
+                if working is not None:
+                    success = working.update_user_item(
+                        event['user_id'],
+                        event['product_id'],
+                        weight
+                    )
+                    if not success:
+                        logger.error("Failed to update collaborative model")
+                    recent_events.append((datetime.now(), event['user_id'], event['product_id'], weight))
+                    dirty = True
+
+                    # Fold-in đã đủ drift / user-item mới -> SVD lại khi queue rảnh
+                    if working.refactor_pending and event_queue.empty():
+                        working.refactorize()
+                
+                if POPULARITY_STREAMING:
+                    popularity_stream.record_event(event['product_id'], event['user_id'], event['action'])
+                
+                # Cập nhật trạng thái
+                training_status['total_events_processed'] += 1
+                training_status['last_train_time'] = datetime.now().isoformat()
+                training_status['training_time'] = round(time.time() - start_time, 3)
+                
+                logger.info(
+                    f"Processed event in {training_status['training_time']}s: "
+                    f"{event['action']} - Total: {training_status['total_events_processed']}"
                 )
-                if not success:
-                    logger.error("Failed to update collaborative model")
             
-            # Cập nhật trạng thái
-            training_status['total_events_processed'] += 1
-            training_status['model_version'] += 1
-            training_status['last_train_time'] = datetime.now().isoformat()
-            training_status['training_time'] = round(time.time() - start_time, 3)
+            # Publish snapshot của bản working (swap nguyên tử), tối đa 1 lần / EVENT_PUBLISH_INTERVAL
+            if dirty and time.time() - last_publish >= EVENT_PUBLISH_INTERVAL:
+                version = collaborative_holder.publish(
+                    working.snapshot(),
+                    trained_from=collaborative_holder.trained_from,
+                    expected_version=working_version
+                )
+                if version is not None:
+                    working_version = version
+                    dirty = False
+                last_publish = time.time()
             
-            logger.info(
-                f"Processed event in {training_status['training_time']}s: "
-                f"{event['action']} - Total: {training_status['total_events_processed']}"
-            )
+            # Publish popularity từ bộ đếm (sắp lại thứ hạng), không ghi đè bản vừa fit lại
+            if POPULARITY_STREAMING and time.time() - last_popularity_publish >= POPULARITY_PUBLISH_INTERVAL:
+                model = popularity_stream.build_model()
+                if model is not None:
+                    version = popularity_holder.publish(
+                        model,
+                        trained_from=popularity_holder.trained_from,
+                        expected_version=popularity_version
+                    )
+                    if version is not None:
+                        popularity_version = version
+                last_popularity_publish = time.time()
             
-        except queue.Empty:
-            continue
         except Exception as e:
             logger.error(f"Error processing event: {e}")
             logger.exception("Full traceback:")
 
-# Start background thread
-threading.Thread(target=process_events, daemon=True).start()
+def refresh_models():
+    """Background task train lại các model đã quá CACHE_SOFT_TTL"""
+    while True:
+        time.sleep(MODEL_REFRESH_CHECK_INTERVAL)
+        for holder in model_holders:
+            holder.refresh(MODEL_SOFT_TTLS.get(holder.name, CACHE_SOFT_TTL), TRAIN_RETRY_INTERVAL)
+
+def reconcile_interaction_counts():
+    """Background task đối soát bộ đếm tương tác với DB (sửa event bị mất / đếm dư)"""
+    while True:
+        time.sleep(INTERACTION_RECONCILE_INTERVAL)
+        try:
+            with get_connection() as conn:
+                interaction_counter.load(conn)
+        except Exception as e:
+            logger.error(f"Error reconciling interaction counts: {str(e)}")
+
+def sync_content_model():
+    """Background task đồng bộ sản phẩm thêm/sửa/xóa vào model content-based (chế độ hashing)"""
+    while True:
+        time.sleep(CONTENT_SYNC_INTERVAL)
+        # Đọc version trước model: nếu có bản mới chen vào thì CAS bên dưới sẽ bỏ qua
+        version = content_based_holder.version
+        current = content_based_holder.get()
+        if current is None or current.vectorizer_mode != 'hashing':
+            continue
+        try:
+            working = current.snapshot()
+            changes = working.update_incremental()
+            if working.needs_compaction():
+                working.compact()
+            elif not changes:
+                continue
+            # Không ghi đè nếu model vừa được train lại toàn bộ trong lúc cập nhật
+            content_based_holder.publish(
+                working,
+                trained_from=content_based_holder.trained_from,
+                expected_version=version
+            )
+        except Exception as e:
+            logger.error(f"Error syncing content-based model: {str(e)}")
+
+def refresh_hybrid_candidates():
+    """Background task tính sẵn candidate hybrid và ghép lại hybrid khi model thành phần đổi
+
+    Candidate được tính lại khi model thành phần đổi (event, đồng bộ content, train lại),
+    tối đa 1 lần / HYBRID_CANDIDATE_REFRESH_INTERVAL, rồi được lưu thành artifact của
+    release: worker của serve.py chỉ load (mmap), không tự tính. Hybrid được ghép lại mỗi
+    khi model thành phần hoặc candidate đổi để request lọc candidate theo ma trận mới nhất.
+    """
+    built_components = None
+    last_build = 0
+    while True:
+        time.sleep(HYBRID_CANDIDATE_CHECK_INTERVAL)
+        if not all(holder.is_ready for holder in hybrid_component_holders):
+            continue
+        try:
+            components = tuple(holder.version for holder in hybrid_component_holders)
+            if not candidates_holder.read_only and components != built_components and (
+                not candidates_holder.is_ready or time.time() - last_build >= HYBRID_CANDIDATE_REFRESH_INTERVAL
+            ):
+                if candidates_holder.train():
+                    built_components = components
+                last_build = time.time()
+            if not hybrid_holder.read_only:
+                compose_hybrid()
+        except Exception as e:
+            logger.error(f"Error refreshing hybrid candidates: {str(e)}")
+
+def start_background_tasks(warm_started=()):
+    """Start các background task (xử lý event, train lại, đồng bộ) của process train/phục vụ
+
+    Không chạy lúc import: serve.py fork process sau khi import app, và fork lúc đã có
+    thread khác đang giữ lock có thể làm process con treo. Các holder warm start từ
+    artifact được train lại từ DB ở background.
+    """
+    if warm_started:
+        threading.Thread(target=retrain_models, args=(warm_started,), daemon=True).start()
+    threading.Thread(target=process_events, daemon=True).start()
+    threading.Thread(target=refresh_models, daemon=True).start()
+    threading.Thread(target=reconcile_interaction_counts, daemon=True).start()
+    threading.Thread(target=sync_content_model, daemon=True).start()
+    threading.Thread(target=refresh_hybrid_candidates, daemon=True).start()
 
 def calculate_model_stats(conn):
     """Tính toán thống kê về dữ liệu training"""
@@ -898,11 +1235,12 @@ def calculate_model_stats(conn):
 
         # Tính matrix stats nếu model đã được khởi tạo
         matrix_stats = {}
-        if collaborative_initialized and collaborative_recommender is not None:
+        collaborative_recommender = collaborative_holder.get()
+        if collaborative_recommender is not None:
             try:
                 matrix_stats = {
-                    'users': len(collaborative_recommender.user_item_matrix.index),
-                    'items': len(collaborative_recommender.user_item_matrix.columns),
+                    'users': collaborative_recommender.user_item_matrix.n_users,
+                    'items': collaborative_recommender.user_item_matrix.n_items,
                     'sparsity': collaborative_recommender.calculate_sparsity()
                 }
             except Exception as e:
@@ -944,10 +1282,16 @@ def calculate_model_stats(conn):
 if __name__ == '__main__':
     # Đảm bảo init theo đúng thứ tự
     logger.info("Initializing recommenders...")
-    get_recommender()  # Popularity recommender
-    init_collaborative()  # Collaborative recommender
-    init_content_based()
-    init_hybrid()
+    # Model có artifact trên đĩa được phục vụ ngay rồi train lại ở background,
+    # model chưa có artifact thì train đồng bộ như trước
+    warm_started = init_models()
+    start_background_tasks(warm_started)
+    
+    # Warm cache thẻ sản phẩm bằng 1 query để request đầu không phải chờ DB
+    try:
+        get_product_cache().load_all()
+    except Exception as e:
+        logger.error(f"Error warming product cache: {str(e)}")
     
     logger.info("All recommenders initialized, starting server...")
     app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
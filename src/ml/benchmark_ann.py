@@ -0,0 +1,39 @@
+import argparse
+import logging
+import numpy as np
+from ann_index import IVFInnerProductIndex
+from benchmark_collaborative import generate_interactions
+from collaborative_recommender import CollaborativeRecommender
+
+# Cấu hình logging
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+def run_benchmark(n_interactions, n_users, n_items, engine, n_queries, k, n_lists):
+    """Recall@k và latency của IVF index so với chấm điểm chính xác trên item_factors"""
+    df = generate_interactions(n_interactions, n_users, n_items)
+    recommender = CollaborativeRecommender(engine=engine, ann_min_items=0)
+    recommender.fit_interactions(df)
+
+    index = IVFInnerProductIndex(n_lists=n_lists).build(recommender.item_factors)
+    rng = np.random.default_rng(0)
+    queries = recommender.user_factors[rng.choice(len(recommender.user_factors), n_queries, replace=False)]
+
+    print(f"Items: {len(recommender.item_factors):,}, factors: {recommender.item_factors.shape[1]}, "
+          f"lists: {len(index.centroids)}, queries: {n_queries}\n")
+    print(f"{'nprobe':>8}{f'recall@{k}':>12}{'latency (ms)':>15}")
+    for row in index.evaluate(queries, k=k):
+        print(f"{row['nprobe']:>8}{row['recall@k']:>12.4f}{row['latency_ms']:>15.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Recall/latency của ANN index trên collaborative item_factors')
+    parser.add_argument('--interactions', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--items', type=int, default=100_000)
+    parser.add_argument('--engine', default='svd')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--lists', type=int, default=None)
+    args = parser.parse_args()
+    run_benchmark(args.interactions, args.users, args.items, args.engine,
+                  args.queries, args.k, args.lists)
@@ -0,0 +1,102 @@
+import argparse
+import logging
+import time
+import numpy as np
+import pandas as pd
+from collaborative_recommender import CollaborativeRecommender
+
+# Cấu hình logging
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+def generate_interactions(n_interactions=1_000_000, n_users=100_000, n_items=20_000,
+                          n_clusters=50, seed=42):
+    """Sinh dữ liệu tương tác giả lập có cấu trúc cụm sở thích và item phổ biến lệch"""
+    rng = np.random.default_rng(seed)
+    user_cluster = rng.integers(0, n_clusters, n_users)
+    item_cluster = rng.integers(0, n_clusters, n_items)
+    items_by_cluster = [np.flatnonzero(item_cluster == c) for c in range(n_clusters)]
+
+    users = rng.integers(0, n_users, n_interactions)
+    # 80% tương tác trong cụm sở thích, còn lại theo phân phối phổ biến (Zipf)
+    in_cluster = rng.random(n_interactions) < 0.8
+    items = np.minimum(rng.zipf(1.3, n_interactions) - 1, n_items - 1)
+    for cluster in range(n_clusters):
+        mask = in_cluster & (user_cluster[users] == cluster)
+        candidates = items_by_cluster[cluster]
+        if len(candidates):
+            items[mask] = candidates[rng.integers(0, len(candidates), mask.sum())]
+
+    df = pd.DataFrame({'user_id': users + 1, 'product_id': items + 1})
+    df = df.drop_duplicates(['user_id', 'product_id'])
+    n = len(df)
+    df['view_count'] = rng.geometric(0.4, n)
+    df['purchase_count'] = (rng.random(n) < 0.1).astype(int)
+    df['review_count'] = ((df['purchase_count'] > 0) & (rng.random(n) < 0.5)).astype(int)
+    df['rating'] = np.where(df['review_count'] > 0, rng.integers(3, 6, n), 0)
+    return df.reset_index(drop=True)
+
+def split_leave_one_out(df, seed=42):
+    """Giữ lại 1 tương tác ngẫu nhiên của mỗi user có >= 2 tương tác để test"""
+    rng = np.random.default_rng(seed)
+    shuffled = df.iloc[rng.permutation(len(df))]
+    counts = shuffled.groupby('user_id')['product_id'].transform('size')
+    test_mask = (~shuffled.duplicated('user_id')) & (counts >= 2)
+    return shuffled[~test_mask], shuffled[test_mask]
+
+def evaluate(recommender, test_df, k=10, n_eval_users=2000, seed=42):
+    """HitRate@k và latency của recommend() trên một mẫu user"""
+    rng = np.random.default_rng(seed)
+    sample = test_df.iloc[rng.permutation(len(test_df))[:n_eval_users]]
+    hits = 0
+    latencies = []
+    for user_id, product_id in zip(sample['user_id'], sample['product_id']):
+        start = time.perf_counter()
+        recs = recommender.recommend(user_id, n_items=k)
+        latencies.append(time.perf_counter() - start)
+        hits += int(product_id in recs)
+    latencies = np.array(latencies) * 1000
+    return {
+        f'hit_rate@{k}': hits / max(1, len(sample)),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99))
+    }
+
+def run_benchmark(n_interactions, n_users, n_items, engines):
+    df = generate_interactions(n_interactions, n_users, n_items)
+    train_df, test_df = split_leave_one_out(df)
+    print(f"Interactions: {len(df):,} (train {len(train_df):,}, test users {len(test_df):,})")
+    print(f"Users: {df['user_id'].nunique():,}, items: {df['product_id'].nunique():,}\n")
+
+    # Chỉ giữ log WARNING của model để không ảnh hưởng latency đo được
+    logging.getLogger('collaborative_recommender').setLevel(logging.WARNING)
+
+    results = {}
+    for engine in engines:
+        recommender = CollaborativeRecommender(engine=engine)
+        start = time.perf_counter()
+        recommender.fit_interactions(train_df.copy())
+        fit_time = time.perf_counter() - start
+        results[engine] = {'fit_s': fit_time, **evaluate(recommender, test_df)}
+
+        # Chấm điểm hàng loạt toàn bộ user test bằng recommend_many
+        start = time.perf_counter()
+        recommender.recommend_many(test_df['user_id'].to_numpy(), n_items=10)
+        results[engine]['batch_users_per_s'] = len(test_df) / (time.perf_counter() - start)
+
+    print(f"{'engine':<8}{'fit (s)':>10}{'hit@10':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}{'batch users/s':>15}")
+    for engine, r in results.items():
+        print(
+            f"{engine:<8}{r['fit_s']:>10.2f}{r['hit_rate@10']:>10.4f}{r['p50_ms']:>10.2f}"
+            f"{r['p99_ms']:>10.2f}{r['batch_users_per_s']:>15,.0f}"
+        )
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark SVD vs implicit ALS trên dữ liệu giả lập')
+    parser.add_argument('--interactions', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--items', type=int, default=20_000)
+    parser.add_argument('--engines', nargs='+', default=['svd', 'als'])
+    args = parser.parse_args()
+    run_benchmark(args.interactions, args.users, args.items, args.engines)
@@ -0,0 +1,56 @@
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+# Đo trong process con để mỗi lần import đều là cold (không có sẵn trong sys.modules)
+PROBE = """
+import resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(f"RESULT {{elapsed:.4f}} {{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}", file=sys.stderr)
+"""
+
+def measure_import(module, cwd):
+    """Import module trong process mới với -X importtime -> (giây, max RSS KB, {package: µs})
+
+    Thời gian của package là tổng thời gian self của mọi module con, nên các
+    package cộng lại bằng tổng thời gian import, không bị đếm trùng.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE.format(module=module)],
+        cwd=cwd, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import {module} failed:\n{result.stderr[-2000:]}")
+
+    elapsed = rss = None
+    packages = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if line.startswith('RESULT '):
+            _, elapsed, rss = line.split()
+        elif line.startswith('import time:') and '|' in line:
+            self_us, _, name = line[len('import time:'):].split('|')
+            if not self_us.strip().isdigit():
+                continue  # dòng tiêu đề
+            packages[name.strip().split('.')[0]] += int(self_us)
+    return float(elapsed), int(rss), dict(packages)
+
+def run_benchmark(modules, top, cwd):
+    """Thời gian import, RSS và các package import chậm nhất của từng module"""
+    for module in modules:
+        elapsed, rss, packages = measure_import(module, cwd)
+        print(f"import {module}: {elapsed:.2f}s, max RSS {rss / 1024:.0f} MB")
+        print(f"{'package':>24}{'self (ms)':>12}")
+        for name, micros in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            print(f"{name:>24}{micros / 1000:>12.1f}")
+        print()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Thời gian import (python -X importtime) của module service')
+    parser.add_argument('modules', nargs='*', default=['app'])
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+    run_benchmark(args.modules, args.top, os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,147 @@
+import argparse
+import logging
+import time
+import numpy as np
+from popularity_recommender import PopularityRecommender
+from synthetic_data import generate_products
+
+# Cấu hình logging
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+def legacy_recommend(recommendations, limit=8):
+    """Cách recommend cũ: copy catalog, apply theo dòng rồi iterrows mỗi request"""
+    filtered_df = recommendations.copy()
+    filtered_df['price_segment'] = filtered_df.apply(
+        lambda x: next(
+            (segment for min_p, max_p, segment in PopularityRecommender.PRICE_SEGMENTS
+             if min_p <= x['min_price'] < max_p),
+            'Unknown'
+        ),
+        axis=1
+    )
+    diverse_results = []
+    seen_categories = set()
+    seen_brands = set()
+    for segment in ['Cao cấp', 'Tầm trung cao', 'Tầm trung thấp', 'Phổ thông']:
+        count = 0
+        for _, product in filtered_df[filtered_df['price_segment'] == segment].iterrows():
+            if len(diverse_results) >= limit or count >= PopularityRecommender.MAX_PER_SEGMENT:
+                break
+            if product['category_name'] not in seen_categories and product['brand_name'] not in seen_brands:
+                diverse_results.append(product)
+                seen_categories.add(product['category_name'])
+                seen_brands.add(product['brand_name'])
+                count += 1
+    return diverse_results
+
+def legacy_reason(row):
+    """Cách tạo reason cũ: format theo từng dòng bằng df.apply(axis=1) lúc fit"""
+    reasons = []
+    if row['total_views'] >= 122:
+        if row['unique_viewers'] >= 26:
+            reasons.append(f"Hot {row['total_views']:,} lượt xem • {row['unique_viewers']} người quan tâm")
+        else:
+            reasons.append(f"Hot {row['total_views']:,} lượt xem")
+    elif row['total_views'] >= 112:
+        reasons.append(f"Phổ biến với {row['total_views']:,} lượt xem")
+    if row['avg_rating'] >= 4.0 and row['review_count'] >= 15:
+        reasons.append(f"Đánh giá xuất sắc {row['avg_rating']:.1f}★ ({row['review_count']} đánh giá)")
+    elif row['avg_rating'] >= 3.5 and row['review_count'] >= 10:
+        reasons.append(f"Đánh giá tốt {row['avg_rating']:.1f}★ ({row['review_count']} đánh giá)")
+    if row['days_since_launch'] <= 30:
+        sales_per_day = row['sold_count'] / max(1, row['days_since_launch'])
+        if sales_per_day >= 2:
+            reasons.append(f"Bán {int(sales_per_day)} sản phẩm/ngày")
+        elif row['sold_count'] >= 29:
+            reasons.append(f"Mới & Bán chạy ({int(row['sold_count'])} đã bán)")
+    elif row['sold_count'] >= 100:
+        reasons.append(f"Best seller ({int(row['sold_count'])} đã bán)")
+    elif row['sold_count'] >= 50:
+        reasons.append(f"Bán chạy ({int(row['sold_count'])} đã bán)")
+    return " • ".join(reasons[:2])
+
+class LegacyReasonRecommender(PopularityRecommender):
+    """Fit như trước khi vectorize reason (để so sánh thời gian fit)"""
+
+    def _calculate_enhanced_popularity(self, df):
+        df = super()._calculate_enhanced_popularity(df)
+        df['reason'] = df.apply(legacy_reason, axis=1)
+        return df
+
+def run_fit_benchmark(sizes, repeats=3):
+    """Thời gian fit_products (không tính SQL) với reason theo dòng so với reason vectorized"""
+    print(f"{'products':>10}{'legacy fit (s)':>16}{'fit (s)':>10}{'speedup':>10}")
+    for n_products in sizes:
+        products = generate_products(n_products)
+        timings = []
+        for recommender_cls in (LegacyReasonRecommender, PopularityRecommender):
+            best = float('inf')
+            for _ in range(repeats):
+                start = time.perf_counter()
+                recommender_cls().fit_products(products.copy())
+                best = min(best, time.perf_counter() - start)
+            timings.append(best)
+        print(f"{n_products:>10,}{timings[0]:>16.3f}{timings[1]:>10.3f}{timings[0] / timings[1]:>9.1f}x")
+
+def _latency_ms(fn, n_requests):
+    start = time.perf_counter()
+    for _ in range(n_requests):
+        fn()
+    return (time.perf_counter() - start) / n_requests * 1000
+
+def _filter_combinations(n):
+    """n tổ hợp bộ lọc category/brand/khoảng giá khác nhau (giống tham số query string)"""
+    rng = np.random.default_rng(1)
+    combinations = []
+    for i in range(n):
+        filters = {}
+        if i % 2 == 0:
+            filters['category'] = f"Category {rng.integers(0, 30)}"
+        if i % 3 == 0:
+            filters['brand'] = f"Brand {rng.integers(0, 200)}"
+        if i % 4 != 3:
+            low = float(rng.choice([0, 1e6, 2e6, 5e6, 15e6]))
+            filters['min_price'] = str(low)
+            filters['max_price'] = str(low * 3 + 1e6)
+        combinations.append(filters)
+    return combinations
+
+def run_benchmark(sizes, n_requests, legacy_requests, limit):
+    """Latency mỗi request của recommend (cắt danh sách tính sẵn) so với cách cũ theo kích thước catalog
+
+    filtered miss: tổ hợp bộ lọc chưa có trong cache (tra index); filtered hit: lấy từ cache LRU.
+    """
+    filters = _filter_combinations(n_requests)
+    print(f"{'products':>10}{'fit (s)':>10}{'recommend (ms)':>17}{'filtered miss (ms)':>21}"
+          f"{'filtered hit (ms)':>20}{'legacy (ms)':>14}{'same result':>13}")
+    for n_products in sizes:
+        recommender = PopularityRecommender()
+        start = time.perf_counter()
+        recommender.fit_products(generate_products(n_products))
+        fit_time = time.perf_counter() - start
+
+        new_ms = _latency_ms(lambda: recommender.recommend(limit=limit), n_requests)
+        recommender.filter_cache_size = n_requests
+        requests = iter(filters)
+        miss_ms = _latency_ms(lambda: recommender.recommend(limit=limit, **next(requests)), n_requests)
+        requests = iter(filters)
+        hit_ms = _latency_ms(lambda: recommender.recommend(limit=limit, **next(requests)), n_requests)
+        legacy_ms = _latency_ms(lambda: legacy_recommend(recommender.recommendations, limit), legacy_requests)
+        same = ([int(p['product_id']) for p in recommender.recommend(limit=limit)] ==
+                [int(p['product_id']) for p in legacy_recommend(recommender.recommendations, limit)])
+        print(f"{n_products:>10,}{fit_time:>10.2f}{new_ms:>17.4f}{miss_ms:>21.4f}"
+              f"{hit_ms:>20.4f}{legacy_ms:>14.1f}{str(same):>13}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Latency popularity recommend theo kích thước catalog')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--legacy-requests', type=int, default=5)
+    parser.add_argument('--limit', type=int, default=8)
+    parser.add_argument('--fit', action='store_true', help='So sánh thời gian fit thay vì latency recommend')
+    args = parser.parse_args()
+    if args.fit:
+        run_fit_benchmark(args.sizes)
+    else:
+        run_benchmark(args.sizes, args.requests, args.legacy_requests, args.limit)
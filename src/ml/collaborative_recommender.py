@@ -4,23 +4,164 @@ from sklearn.metrics.pairwise import cosine_similarity
 from scipy.sparse.linalg import svds
 from sklearn.preprocessing import MinMaxScaler
 import logging
+import time
+import copy
+from concurrent.futures import ThreadPoolExecutor
 from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import LinearOperator
+from interaction_store import InteractionStore, grow_buffer
+from ann_index import IVFInnerProductIndex
+import config
 
 logger = logging.getLogger(__name__)
 
+def top_k_indices(scores, k):
+    """Index của k phần tử lớn nhất mỗi hàng (giảm dần), dùng argpartition thay vì argsort toàn bộ"""
+    scores = np.atleast_2d(scores)
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+class ImplicitALS:
+    """Weighted ALS cho implicit feedback (Hu, Koren & Volinsky 2008)
+
+    Mỗi half-step giải (Y^T C_u Y + reg I) x_u = Y^T C_u p_u bằng vài bước
+    conjugate gradient cho cả khối hàng cùng lúc (vectorized), các khối được
+    chia cho một thread pool. Ma trận confidence luôn ở dạng CSR.
+    """
+
+    def __init__(self, factors=30, regularization=0.05, iterations=10,
+                 cg_steps=3, n_threads=4, random_state=42):
+        self.factors = factors
+        self.regularization = regularization
+        self.iterations = iterations
+        self.cg_steps = cg_steps
+        self.n_threads = max(1, n_threads)
+        self.random_state = random_state
+
+    def fit(self, confidence):
+        """confidence: CSR users x items, data = alpha * strength (tức c_ui - 1)"""
+        confidence = csr_matrix(confidence, dtype=np.float64)
+        confidence_t = confidence.T.tocsr()
+        n_users, n_items = confidence.shape
+
+        rng = np.random.default_rng(self.random_state)
+        user_factors = rng.normal(0, 0.01, (n_users, self.factors))
+        item_factors = rng.normal(0, 0.01, (n_items, self.factors))
+
+        with ThreadPoolExecutor(max_workers=self.n_threads) as pool:
+            for iteration in range(self.iterations):
+                self._half_step(confidence, user_factors, item_factors, pool)
+                self._half_step(confidence_t, item_factors, user_factors, pool)
+                logger.debug(f"ALS iteration {iteration + 1}/{self.iterations} done")
+
+        return user_factors, item_factors
+
+    def _half_step(self, confidence, X, Y, pool):
+        """Cập nhật toàn bộ X với Y cố định, chia khối hàng cho thread pool"""
+        gram = Y.T.dot(Y) + self.regularization * np.eye(Y.shape[1])
+        n_blocks = min(len(X), self.n_threads * 4)
+        if n_blocks == 0:
+            return
+        bounds = np.linspace(0, len(X), n_blocks + 1).astype(int)
+        jobs = [
+            pool.submit(self._solve_block, confidence, X, Y, gram, start, end, self.cg_steps)
+            for start, end in zip(bounds[:-1], bounds[1:]) if end > start
+        ]
+        for job in jobs:
+            job.result()
+
+    def solve_rows(self, confidence, X, Y, rows, cg_steps=None):
+        """Giải lại một số hàng của X (dùng cho fold-in user/item mới)"""
+        gram = Y.T.dot(Y) + self.regularization * np.eye(Y.shape[1])
+        for row in rows:
+            self._solve_block(confidence, X, Y, gram, row, row + 1, cg_steps or 2 * self.cg_steps)
+
+    @staticmethod
+    def _solve_block(confidence, X, Y, gram, start, end, cg_steps):
+        """Conjugate gradient cho các hàng [start, end), bắt đầu từ giá trị X hiện tại"""
+        block = confidence[start:end]
+        block_rows = np.repeat(np.arange(end - start), np.diff(block.indptr))
+        cols = block.indices
+        x = X[start:end].copy()
+
+        def apply_a(v):
+            # A v = (Y^T Y + reg I) v + sum_i (c_ui - 1) (y_i . v) y_i
+            weights = block.data * np.einsum('ij,ij->i', v[block_rows], Y[cols])
+            weighted = csr_matrix((weights, cols, block.indptr), shape=block.shape)
+            return v.dot(gram) + weighted.dot(Y)
+
+        # b = Y^T C_u p_u = sum_i c_ui y_i (p_ui = 1 với mọi ô quan sát được)
+        b = csr_matrix((block.data + 1.0, cols, block.indptr), shape=block.shape).dot(Y)
+        r = b - apply_a(x)
+        p = r.copy()
+        rs_old = np.einsum('ij,ij->i', r, r)
+
+        for _ in range(cg_steps):
+            if rs_old.max() < 1e-20:
+                break
+            ap = apply_a(p)
+            denom = np.einsum('ij,ij->i', p, ap)
+            step = np.divide(rs_old, denom, out=np.zeros_like(rs_old), where=denom > 0)
+            x += step[:, None] * p
+            r -= step[:, None] * ap
+            rs_new = np.einsum('ij,ij->i', r, r)
+            beta = np.divide(rs_new, rs_old, out=np.zeros_like(rs_new), where=rs_old > 0)
+            p = r + beta[:, None] * p
+            rs_old = rs_new
+
+        X[start:end] = x
+
+
 class CollaborativeRecommender:
-    def __init__(self):
+    def __init__(self, incremental=True, refactor_drift_threshold=0.1,
+                 refactor_new_entities_threshold=100, fold_in_reg=0.01, engine=None,
+                 batch_chunk_size=1024, ann_min_items=None):
         self.user_item_matrix = None
         self.user_factors = None
         self.item_factors = None
         self.mean_ratings = None
-        self.conn = None
+        
+        # Cấu hình cập nhật incremental (fold-in) thay vì SVD lại mỗi event
+        self.incremental = incremental
+        self.refactor_drift_threshold = refactor_drift_threshold
+        self.refactor_new_entities_threshold = refactor_new_entities_threshold
+        self.fold_in_reg = fold_in_reg
+        self.refactor_pending = False
+        
+        # Số user được chấm điểm cùng lúc trong recommend_many (giới hạn bộ nhớ chunk x n_items)
+        self.batch_chunk_size = batch_chunk_size
+        
+        # Index ANN trên item_factors, chỉ build khi số item >= ann_min_items
+        self.ann_min_items = ann_min_items if ann_min_items is not None else config.ANN_CONFIG['min_items']
+        self.ann_index = None
+        
+        # 'svd' (explicit interaction_score) hoặc 'als' (implicit confidence)
+        self.engine = engine or config.COLLABORATIVE_ENGINE
+        if self.engine not in ('svd', 'als'):
+            raise ValueError(f"Unknown collaborative engine: {self.engine}")
+        self.als = None
+        if self.engine == 'als':
+            self.als = ImplicitALS(
+                factors=config.ALS_CONFIG['factors'],
+                regularization=config.ALS_CONFIG['regularization'],
+                iterations=config.ALS_CONFIG['iterations'],
+                cg_steps=config.ALS_CONFIG['cg_steps'],
+                n_threads=config.ALS_CONFIG['n_threads']
+            )
+        self._reset_fold_in_state()
         
     def fit(self, conn):
         """Train collaborative filtering model"""
         try:
-            self.conn = conn  # Lưu connection để dùng trong recommend()
-            
+            # Không giữ lại conn: connection mượn từ pool được trả lại sau khi fit
             query = """
                 SELECT 
                     upv.user_id,
@@ -44,6 +185,15 @@ class CollaborativeRecommender:
             # Add logging
             logger.info(f"Loaded interactions: {len(interactions_df)} rows")
             
+            return self.fit_interactions(interactions_df)
+            
+        except Exception as e:
+            logger.error(f"Error in collaborative fit: {str(e)}")
+            raise e
+
+    def fit_interactions(self, interactions_df):
+        """Train từ DataFrame (user_id, product_id, rating, purchase_count, view_count, review_count)"""
+        try:
             # Xử lý missing values và chuẩn hóa
             interactions_df = interactions_df.fillna({
                 'rating': 0,
@@ -52,6 +202,13 @@ class CollaborativeRecommender:
                 'review_count': 0
             })
             
+            # Implicit strength cho ALS (tính trên số liệu gốc, trước log/normalize)
+            interactions_df['strength'] = (
+                np.log1p(interactions_df['view_count']) +
+                config.ALS_CONFIG['purchase_weight'] * interactions_df['purchase_count'] +
+                config.ALS_CONFIG['review_weight'] * interactions_df['review_count']
+            )
+            
             # Normalize các features
             scaler = MinMaxScaler()
             if len(interactions_df) > 0:
@@ -74,41 +231,27 @@ class CollaborativeRecommender:
                 0.1 * interactions_df['view_norm']         # View ít quan trọng nhất
             )
             
-            # Tạo user-item matrix
-            self.user_item_matrix = interactions_df.pivot(
-                index='user_id',
-                columns='product_id',
-                values='interaction_score'
-            ).fillna(0)
+            # Tạo user-item matrix (CSR + id maps, không pivot dense)
+            value_column = 'strength' if self.engine == 'als' else 'interaction_score'
+            self.user_item_matrix = InteractionStore.from_interactions(
+                interactions_df['user_id'].to_numpy(),
+                interactions_df['product_id'].to_numpy(),
+                interactions_df[value_column].to_numpy()
+            )
             
             # Add logging
             logger.info(f"User-item matrix shape: {self.user_item_matrix.shape}")
-            logger.info(f"Unique users: {len(self.user_item_matrix.index)}")
-            logger.info(f"Unique items: {len(self.user_item_matrix.columns)}")
+            logger.info(f"Unique users: {self.user_item_matrix.n_users}")
+            logger.info(f"Unique items: {self.user_item_matrix.n_items}")
             
             # Kiểm tra ma trận có dữ liệu không
             if self.user_item_matrix.shape[0] > 0 and self.user_item_matrix.shape[1] > 0:
-                # Normalize và SVD
-                self.mean_ratings = self.user_item_matrix.mean(axis=1)
-                ratings_centered = self.user_item_matrix.sub(self.mean_ratings, axis=0)
-                
-                # Ensure matrix is numeric and convert to sparse
-                ratings_centered = ratings_centered.fillna(0)
-                sparse_ratings = csr_matrix(ratings_centered.values)
-                
-                # Perform SVD on sparse matrix
-                k = min(30, min(sparse_ratings.shape) - 1)
-                U, sigma, Vt = svds(sparse_ratings, k=k)
-                
-                # Áp dụng regularization
-                sigma = np.diag(sigma / (1 + 0.05 * np.sqrt(len(self.user_item_matrix))))
-                
-                self.user_factors = U.dot(sigma)
-                self.item_factors = Vt.T
+                self._factorize()
             else:
                 self.user_factors = np.array([])
                 self.item_factors = np.array([])
-                self.mean_ratings = pd.Series([])
+                self.mean_ratings = np.array([])
+                self._reset_fold_in_state()
             
             return self
             
@@ -119,51 +262,9 @@ class CollaborativeRecommender:
     def recommend(self, user_id, n_items=8):
         """Gợi ý sản phẩm cho user cụ thể"""
         try:
-            user_id = int(user_id)  # Convert to int
-            
-            # Debug logs
-            logger.info(f"Getting recommendations for user {user_id}")
-            logger.info(f"Matrix shape: {self.user_item_matrix.shape}")
-            logger.info(f"User factors shape: {self.user_factors.shape if self.user_factors is not None else 'None'}")
-            logger.info(f"Item factors shape: {self.item_factors.shape if self.item_factors is not None else 'None'}")
-            logger.info(f"User in matrix: {user_id in self.user_item_matrix.index}")
-            
-            if user_id not in self.user_item_matrix.index:
-                logger.warning(f"User {user_id} not in matrix")
-                return []
-            
-            if len(self.user_factors) == 0:
-                logger.warning("Model not trained (user_factors empty)")
-                return []
-            
-            # Get user index
-            user_idx = self.user_item_matrix.index.get_loc(user_id)
-            logger.info(f"User index in matrix: {user_idx}")
-            
-            # Calculate predictions
-            user_pred = self.user_factors[user_idx].dot(self.item_factors.T)
-            logger.info(f"Raw predictions shape: {user_pred.shape}")
-            logger.info(f"Predictions range: {user_pred.min():.2f} to {user_pred.max():.2f}")
-            
-            # Add mean rating
-            user_pred += self.mean_ratings[user_id]
-            logger.info(f"After adding mean: {user_pred.min():.2f} to {user_pred.max():.2f}")
-            
-            # Get user's interactions
-            user_interactions = self.user_item_matrix.loc[user_id].to_numpy()
-            already_interacted = np.where(user_interactions > 0)[0]
-            logger.info(f"User has interacted with {len(already_interacted)} items")
-            
-            # Set interacted items to -inf
-            user_pred[already_interacted] = -np.inf
-            logger.info(f"After filtering: {user_pred.min():.2f} to {user_pred.max():.2f}")
-            
-            # Get top items
-            top_items = user_pred.argsort()[-n_items:][::-1]
-            logger.info(f"Top items indices: {top_items}")
-            
-            recommendations = self.user_item_matrix.columns[top_items].tolist()
-            logger.info(f"Final recommendations: {recommendations}")
+            item_ids, _ = self.recommend_scored(user_id, n_items)
+            recommendations = [int(x) for x in item_ids]
+            logger.debug(f"Final recommendations: {recommendations}")
             
             return recommendations
             
@@ -172,17 +273,361 @@ class CollaborativeRecommender:
             logger.exception("Full traceback:")  # This will log the full stack trace
             return []
 
+    def recommend_scored(self, user_id, n_items=8):
+        """Top n_items dạng mảng (item_ids, scores) giảm dần theo điểm dự đoán, dùng cho rank fusion
+
+        Mảng rỗng nếu user không có trong ma trận hoặc model chưa train.
+        """
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+        user_id = int(user_id)  # Convert to int
+        
+        # Get user index
+        user_idx = self.user_item_matrix.user_index(user_id)
+        logger.debug(f"Getting recommendations for user {user_id} (index {user_idx})")
+        
+        if user_idx is None:
+            logger.warning(f"User {user_id} not in matrix")
+            return empty
+        
+        if len(self.user_factors) == 0:
+            logger.warning("Model not trained (user_factors empty)")
+            return empty
+        
+        already_interacted, _ = self.user_item_matrix.user_row(user_idx)
+        
+        if self.ann_index is not None:
+            # Catalog lớn: chỉ chấm điểm các item trong nprobe cụm gần nhất
+            top_items, top_scores = self.ann_index.search(
+                self.user_factors[user_idx], n_items, exclude=already_interacted
+            )
+            return self.user_item_matrix.item_ids[top_items], top_scores + self.mean_ratings[user_idx]
+        
+        # Calculate predictions + mean rating
+        user_pred = self.user_factors[user_idx].dot(self.item_factors.T)
+        user_pred += self.mean_ratings[user_idx]
+        
+        # Set interacted items to -inf
+        user_pred[already_interacted] = -np.inf
+        
+        # Get top items
+        top_items = top_k_indices(user_pred, n_items)[0]
+        top_items = top_items[np.isfinite(user_pred[top_items])]
+        return self.user_item_matrix.item_ids[top_items], user_pred[top_items]
+
+    def recommend_many(self, user_ids, n_items=8, chunk_size=None):
+        """Gợi ý cho nhiều user cùng lúc
+
+        Trả về (item_ids, scores) dạng mảng (len(user_ids), n_items): item_ids là
+        int32 với -1 ở các ô trống (user không có trong ma trận / không đủ item),
+        scores là float32 với -inf tương ứng. Bộ nhớ tạm giới hạn ở
+        chunk_size x số item.
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int64).ravel()
+        chunk_size = chunk_size or self.batch_chunk_size
+        result_items = np.full((len(user_ids), n_items), -1, dtype=np.int32)
+        result_scores = np.full((len(user_ids), n_items), -np.inf, dtype=np.float32)
+        
+        if self.user_factors is None or len(self.user_factors) == 0 or n_items <= 0:
+            return result_items, result_scores
+        
+        matrix = self.user_item_matrix
+        sparse_matrix = matrix.tocsr()
+        item_ids = matrix.item_ids
+        n_known_items = len(self.item_factors)
+        item_factors_t = self.item_factors.T
+        
+        # Map user_id -> hàng, bỏ qua các user chưa có trong ma trận
+        user_rows = np.array([
+            -1 if (idx := matrix.user_index(uid)) is None else idx for uid in user_ids
+        ], dtype=np.int64)
+        positions = np.flatnonzero(user_rows >= 0)
+        
+        for start in range(0, len(positions), chunk_size):
+            chunk_positions = positions[start:start + chunk_size]
+            rows = user_rows[chunk_positions]
+            
+            # 1 phép nhân ma trận cho cả chunk
+            scores = self.user_factors[rows].dot(item_factors_t)
+            scores += self.mean_ratings[rows][:, None]
+            
+            # Loại các item đã tương tác (lấy trực tiếp từ các hàng CSR)
+            interacted = sparse_matrix[rows]
+            interacted_rows = np.repeat(np.arange(len(rows)), np.diff(interacted.indptr))
+            keep = (interacted.indices < n_known_items) & (interacted.data != 0)
+            scores[interacted_rows[keep], interacted.indices[keep]] = -np.inf
+            
+            top_items = top_k_indices(scores, n_items)
+            top_scores = np.take_along_axis(scores, top_items, axis=1)
+            valid = np.isfinite(top_scores)
+            
+            width = top_items.shape[1]
+            result_items[chunk_positions, :width] = np.where(valid, item_ids[top_items], -1)
+            result_scores[chunk_positions, :width] = np.where(valid, top_scores, -np.inf)
+        
+        return result_items, result_scores
+
     def calculate_sparsity(self):
         """Tính độ thưa của ma trận user-item"""
         if self.user_item_matrix is None:
             return 0
             
-        total_cells = self.user_item_matrix.shape[0] * self.user_item_matrix.shape[1]
-        filled_cells = np.count_nonzero(~np.isnan(self.user_item_matrix))
+        # Tính tỷ lệ phần trăm các ô không có giá trị (dựa trên nnz, không densify)
+        return self.user_item_matrix.sparsity()
+
+    def _factorize(self):
+        """Train lại factors trên toàn bộ ma trận user-item theo engine đã chọn"""
+        if self.engine == 'als':
+            self._factorize_als()
+        else:
+            self._factorize_svd()
+
+    def _factorize_als(self):
+        """Implicit ALS trên ma trận confidence (không trừ mean)"""
+        confidence = self.user_item_matrix.tocsr() * config.ALS_CONFIG['alpha']
+        self.user_factors, self.item_factors = self.als.fit(confidence)
+        self.mean_ratings = np.zeros(self.user_item_matrix.n_users)
+        
+        self._build_ann_index()
+        self._reset_fold_in_state()
+        self._nnz_at_refactor = self.user_item_matrix.nnz
+
+    def _factorize_svd(self):
+        """Chuẩn hóa và chạy SVD trên toàn bộ ma trận user-item"""
+        sparse_ratings = self.user_item_matrix.tocsr()
+        self.mean_ratings = self.user_item_matrix.row_means()
+        
+        # Ma trận đã trừ mean là dense, nên SVD qua LinearOperator:
+        # (R - m 1^T) x = R x - m * sum(x),  (R - m 1^T)^T y = R^T y - 1 * (m . y)
+        mean_ratings = self.mean_ratings
+        ratings_centered = LinearOperator(
+            sparse_ratings.shape,
+            matvec=lambda x: sparse_ratings.dot(x).ravel() - mean_ratings * x.sum(),
+            rmatvec=lambda y: sparse_ratings.T.dot(y).ravel() - mean_ratings.dot(y).sum(),
+            dtype=np.float64
+        )
+        
+        # Perform SVD on sparse matrix
+        k = min(30, min(sparse_ratings.shape) - 1)
+        U, sigma, Vt = svds(ratings_centered, k=k)
+        
+        # Áp dụng regularization
+        sigma = np.diag(sigma / (1 + 0.05 * np.sqrt(sparse_ratings.shape[0])))
+        
+        self.user_factors = U.dot(sigma)
+        self.item_factors = Vt.T
+        
+        self._build_ann_index()
+        self._reset_fold_in_state()
+        self._nnz_at_refactor = self.user_item_matrix.nnz
+
+    def _build_ann_index(self):
+        """Build index IVF trên item_factors nếu catalog vượt ngưỡng"""
+        self.ann_index = None
+        if self.item_factors is None or len(self.item_factors) < max(1, self.ann_min_items):
+            return
+        start = time.time()
+        self.ann_index = IVFInnerProductIndex(
+            n_lists=config.ANN_CONFIG['n_lists'],
+            nprobe=config.ANN_CONFIG['nprobe']
+        ).build(self.item_factors)
+        logger.info(f"ANN index built in {time.time() - start:.2f}s")
+
+    def _reset_fold_in_state(self):
+        """Tính lại các đại lượng phụ dùng cho fold-in sau mỗi lần SVD đầy đủ"""
+        self.refactor_pending = False
+        self._updates_since_refactor = 0
+        self._new_entities_since_refactor = 0
+        self._nnz_at_refactor = 0
+        
+        # Buffer có dư chỗ để thêm user/item mới mà không copy toàn bộ factors
+        self._user_factor_buf = self.user_factors
+        self._item_factor_buf = self.item_factors
+        self._mean_buf = self.mean_ratings
+        
+        if self.item_factors is None or len(self.item_factors) == 0:
+            self._item_gram_inv = None
+            self._item_factor_sum = None
+            self._user_gram = None
+            self._user_mean_proj = None
+            return
+        
+        k = self.item_factors.shape[1]
+        reg = self.fold_in_reg * np.eye(k)
+        
+        # Các ma trận k x k / vector k được giữ cập nhật để fold-in chỉ tốn O(k^2 + nnz_u * k)
+        self._item_gram_inv = np.linalg.inv(self.item_factors.T.dot(self.item_factors) + reg)
+        self._item_factor_sum = self.item_factors.sum(axis=0)
+        self._user_gram = self.user_factors.T.dot(self.user_factors)
+        self._user_mean_proj = self.user_factors.T.dot(self.mean_ratings)
+
+    def refactor_drift(self):
+        """Tỷ lệ tương tác đã thay đổi kể từ lần SVD đầy đủ gần nhất"""
+        return self._updates_since_refactor / max(1, self._nnz_at_refactor)
+
+    def _append_user_factor(self):
+        """Thêm 1 hàng factor = 0 cho user mới (amortized O(k))"""
+        n = len(self.user_factors)
+        self._user_factor_buf = grow_buffer(self._user_factor_buf, n + 1)
+        self._mean_buf = grow_buffer(self._mean_buf, n + 1)
+        self._user_factor_buf[n] = 0.0
+        self._mean_buf[n] = 0.0
+        self.user_factors = self._user_factor_buf[:n + 1]
+        self.mean_ratings = self._mean_buf[:n + 1]
+
+    def _append_item_factor(self):
+        """Thêm 1 hàng factor = 0 cho item mới (amortized O(k))"""
+        n = len(self.item_factors)
+        self._item_factor_buf = grow_buffer(self._item_factor_buf, n + 1)
+        self._item_factor_buf[n] = 0.0
+        self.item_factors = self._item_factor_buf[:n + 1]
+
+    def _fold_in_als(self, factors, fixed_factors, idx, indices, values):
+        """Fold-in cho ALS = giải lại đúng 1 hàng của half-step"""
+        confidence = csr_matrix(
+            (values * config.ALS_CONFIG['alpha'], indices, [0, len(indices)]),
+            shape=(1, len(fixed_factors))
+        )
+        row = factors[idx:idx + 1]
+        self.als.solve_rows(confidence, row, fixed_factors, [0])
+
+    def _fold_in_user(self, user_idx):
+        """Chiếu lại 1 user lên item_factors hiện tại (least-squares fold-in)"""
+        interacted, values = self.user_item_matrix.user_row(user_idx)
+        if self.engine == 'als':
+            self._fold_in_als(self.user_factors, self.item_factors, user_idx, interacted, values)
+            return
+        
+        mean = values.sum() / max(1, self.user_item_matrix.n_items)
         
-        # Tính tỷ lệ phần trăm các ô có giá trị
-        sparsity = (total_cells - filled_cells) / total_cells * 100
-        return round(sparsity, 2)
+        # V^T (r - mean) = V^T r - mean * sum(V), chỉ cần duyệt các item user đã tương tác
+        rhs = values.dot(self.item_factors[interacted]) - mean * self._item_factor_sum
+        new_factor = self._item_gram_inv.dot(rhs)
+        
+        # Áp dụng cùng hệ số regularization như khi SVD
+        new_factor /= (1 + 0.05 * np.sqrt(len(self.user_factors)))
+        
+        old_factor = self.user_factors[user_idx]
+        old_mean = self.mean_ratings[user_idx]
+        self._user_gram += np.outer(new_factor, new_factor) - np.outer(old_factor, old_factor)
+        self._user_mean_proj += new_factor * mean - old_factor * old_mean
+        
+        self.user_factors[user_idx] = new_factor
+        self.mean_ratings[user_idx] = mean
+
+    def _fold_in_item(self, item_idx):
+        """Chiếu 1 item mới lên user_factors hiện tại (least-squares fold-in)"""
+        interacted, values = self.user_item_matrix.item_column(item_idx)
+        if self.engine == 'als':
+            self._fold_in_als(self.item_factors, self.user_factors, item_idx, interacted, values)
+            return
+        
+        # F^T (c - mean) = F^T c - F^T mean
+        rhs = values.dot(self.user_factors[interacted]) - self._user_mean_proj
+        k = self.item_factors.shape[1]
+        new_factor = np.linalg.solve(self._user_gram + self.fold_in_reg * np.eye(k), rhs)
+        
+        # user_factors đã chia hệ số regularization nên nghiệm lớn hơn đúng hệ số đó
+        new_factor /= (1 + 0.05 * np.sqrt(len(self.user_factors)))
+        
+        old_factor = self.item_factors[item_idx].copy()
+        self.item_factors[item_idx] = new_factor
+        self._item_factor_sum += new_factor - old_factor
+        # inv(V^T V + reg) cập nhật hạng 1 (Sherman-Morrison) thay vì nghịch đảo lại O(I k^2)
+        self._item_gram_inv = self._rank_one_update(self._item_gram_inv, new_factor, 1.0)
+        if old_factor.any():
+            self._item_gram_inv = self._rank_one_update(self._item_gram_inv, old_factor, -1.0)
+
+    @staticmethod
+    def _rank_one_update(inverse, vector, sign):
+        """inv(A + sign * v v^T) từ inv(A) theo Sherman-Morrison, O(k^2)"""
+        projected = inverse.dot(vector)
+        return inverse - sign * np.outer(projected, projected) / (1 + sign * vector.dot(projected))
+
+    def _check_refactor(self):
+        """Đánh dấu cần SVD lại khi drift hoặc số user/item mới vượt ngưỡng"""
+        if (self.refactor_drift() >= self.refactor_drift_threshold or
+                self._new_entities_since_refactor >= self.refactor_new_entities_threshold):
+            if not self.refactor_pending:
+                logger.info(
+                    f"Scheduling full refactorization - drift: {self.refactor_drift():.3f}, "
+                    f"new users/items: {self._new_entities_since_refactor}"
+                )
+            self.refactor_pending = True
+
+    def snapshot(self):
+        """Bản sao độc lập (ma trận, factors) để publish trong khi bản gốc tiếp tục nhận event"""
+        clone = copy.copy(self)
+        clone.user_item_matrix = copy.deepcopy(self.user_item_matrix)
+        for name in ('user_factors', 'item_factors', 'mean_ratings', '_item_gram_inv',
+                     '_item_factor_sum', '_user_gram', '_user_mean_proj'):
+            value = getattr(self, name)
+            setattr(clone, name, value.copy() if value is not None else None)
+        clone._user_factor_buf = clone.user_factors
+        clone._item_factor_buf = clone.item_factors
+        clone._mean_buf = clone.mean_ratings
+        # ann_index không bị sửa tại chỗ (chỉ build lại khi refactorize) nên dùng chung được
+        return clone
+
+    def to_artifact(self):
+        """Mảng + meta để lưu artifact (xem model_store.ArtifactStore)"""
+        store = self.user_item_matrix
+        arrays = {
+            'user_item': store.tocsr(),
+            'user_ids': store.user_ids,
+            'item_ids': store.item_ids,
+            'user_factors': self.user_factors,
+            'item_factors': self.item_factors,
+            'mean_ratings': self.mean_ratings
+        }
+        meta = {'engine': self.engine, 'ann': None}
+        if self.ann_index is not None:
+            arrays.update({
+                'ann_centroids': self.ann_index.centroids,
+                'ann_list_offsets': self.ann_index.list_offsets,
+                'ann_sorted_items': self.ann_index.sorted_items,
+                'ann_sorted_vectors': self.ann_index.sorted_vectors
+            })
+            meta['ann'] = {'n_lists': self.ann_index.n_lists, 'nprobe': self.ann_index.nprobe}
+        return arrays, meta
+
+    @classmethod
+    def from_artifact(cls, arrays, meta):
+        """Dựng lại model từ artifact; factors là mảng mmap chỉ đọc (fold-in chạy trên snapshot())"""
+        model = cls(engine=meta['engine'])
+        model.user_item_matrix = InteractionStore(arrays['user_item'], arrays['user_ids'], arrays['item_ids'])
+        model.user_factors = arrays['user_factors']
+        model.item_factors = arrays['item_factors']
+        model.mean_ratings = arrays['mean_ratings']
+        if meta['ann'] is not None:
+            index = IVFInnerProductIndex(n_lists=meta['ann']['n_lists'], nprobe=meta['ann']['nprobe'])
+            index.centroids = arrays['ann_centroids']
+            index.list_offsets = arrays['ann_list_offsets']
+            index.sorted_items = arrays['ann_sorted_items']
+            index.sorted_vectors = arrays['ann_sorted_vectors']
+            index.n_items = len(index.sorted_items)
+            model.ann_index = index
+        model._reset_fold_in_state()
+        model._nnz_at_refactor = model.user_item_matrix.nnz
+        return model
+
+    def refactorize(self):
+        """Chạy lại SVD đầy đủ trên ma trận hiện tại"""
+        try:
+            if self.user_item_matrix is None or min(self.user_item_matrix.shape) < 2:
+                return False
+            
+            start = time.time()
+            self._factorize()
+            logger.info(
+                f"Full refactorization done in {time.time() - start:.2f}s - "
+                f"Matrix shape: {self.user_item_matrix.shape}"
+            )
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error in collaborative refactorize: {str(e)}")
+            logger.exception("Full traceback:")
+            return False
 
     def update_user_item(self, user_id, item_id, weight):
         """Cập nhật ma trận user-item với tương tác mới"""
@@ -191,47 +636,60 @@ class CollaborativeRecommender:
             user_id = int(user_id)
             item_id = int(item_id)
             
-            logger.info(f"Updating matrix for user {user_id}, item {item_id}, weight {weight}")
+            logger.debug(f"Updating matrix for user {user_id}, item {item_id}, weight {weight}")
+            
+            can_fold_in = (
+                self.incremental and
+                self.user_factors is not None and len(self.user_factors) > 0
+            )
+            matrix = self.user_item_matrix
+            user_idx = matrix.user_index(user_id)
+            item_idx = matrix.item_index(item_id)
+            new_user = user_idx is None
+            new_item = item_idx is None
             
             # Kiểm tra user và item có trong ma trận không
-            if user_id not in self.user_item_matrix.index:
+            if new_user:
                 logger.warning(f"User {user_id} not in matrix, adding new row")
-                # Thêm user mới với toàn bộ giá trị 0
-                new_row = pd.Series(0, index=self.user_item_matrix.columns)
-                self.user_item_matrix.loc[user_id] = new_row
+                # Thêm user mới (hàng rỗng trong CSR)
+                user_idx = matrix.add_user(user_id)
+                if can_fold_in:
+                    self._append_user_factor()
                 
-            if item_id not in self.user_item_matrix.columns:
+            if new_item:
                 logger.warning(f"Item {item_id} not in matrix, adding new column")
-                # Thêm item mới với toàn bộ giá trị 0
-                self.user_item_matrix[item_id] = 0
+                # Thêm item mới (cột rỗng trong CSR)
+                item_idx = matrix.add_item(item_id)
+                if can_fold_in:
+                    self._append_item_factor()
                 
             # Cập nhật giá trị tương tác
-            current_value = self.user_item_matrix.loc[user_id, item_id]
-            # Sử dụng exponential decay để giảm ảnh hưởng của các tương tác cũ
-            decay_factor = 0.8
-            new_value = current_value * decay_factor + weight * (1 - decay_factor)
-            
-            self.user_item_matrix.loc[user_id, item_id] = new_value
-            
-            # Cập nhật mean ratings
-            self.mean_ratings = self.user_item_matrix.mean(axis=1)
-            
-            # Re-train model nếu có đủ dữ liệu mới
-            if len(self.user_item_matrix) > 0:
-                # Normalize và SVD
-                ratings_centered = self.user_item_matrix.sub(self.mean_ratings, axis=0)
-                ratings_centered = ratings_centered.fillna(0)
-                sparse_ratings = csr_matrix(ratings_centered.values)
-                
-                # Perform SVD
-                k = min(30, min(sparse_ratings.shape) - 1)
-                U, sigma, Vt = svds(sparse_ratings, k=k)
+            current_value = matrix.get(user_idx, item_idx)
+            if self.engine == 'als':
+                # Implicit: mỗi event cộng thêm vào strength (confidence tăng dần)
+                new_value = current_value + weight
+            else:
+                # Sử dụng exponential decay để giảm ảnh hưởng của các tương tác cũ
+                decay_factor = 0.8
+                new_value = current_value * decay_factor + weight * (1 - decay_factor)
+            
+            matrix.set(user_idx, item_idx, new_value)
+            
+            if can_fold_in:
+                # Chỉ cập nhật factor của user (và item mới), không SVD lại toàn bộ
+                self._fold_in_user(user_idx)
                 
-                # Áp dụng regularization
-                sigma = np.diag(sigma / (1 + 0.05 * np.sqrt(len(self.user_item_matrix))))
+                if new_item:
+                    self._fold_in_item(item_idx)
                 
-                self.user_factors = U.dot(sigma)
-                self.item_factors = Vt.T
+                self._updates_since_refactor += 1
+                self._new_entities_since_refactor += int(new_user) + int(new_item)
+                self._check_refactor()
+                return True
+            
+            # Re-train toàn bộ model (chế độ không incremental)
+            if min(self.user_item_matrix.shape) > 1:
+                self._factorize()
                 
                 logger.info(f"Model updated - Matrix shape: {self.user_item_matrix.shape}")
                 logger.info(f"Sparsity: {self.calculate_sparsity()}%")
@@ -241,4 +699,4 @@ class CollaborativeRecommender:
         except Exception as e:
             logger.error(f"Error updating user-item matrix: {str(e)}")
             logger.exception("Full traceback:")
-            return False
\ No newline at end of file
+            return False
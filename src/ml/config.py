@@ -0,0 +1,113 @@
+# src/ml/config.py
+import os
+
+# Engine cho collaborative filtering: 'svd' (explicit, mặc định) hoặc 'als' (implicit ALS)
+COLLABORATIVE_ENGINE = os.environ.get('COLLABORATIVE_ENGINE', 'svd')
+
+# Cấu hình implicit ALS
+ALS_CONFIG = {
+    'factors': 30,
+    'regularization': 0.05,
+    'alpha': 20.0,            # confidence = 1 + alpha * strength
+    'iterations': 10,
+    'cg_steps': 3,            # Số bước conjugate gradient mỗi half-step
+    'n_threads': os.cpu_count() or 4,
+    # strength = log1p(views) + purchase_weight * purchases + review_weight * reviews
+    'purchase_weight': 3.0,
+    'review_weight': 2.0
+}
+
+# Index ANN (IVF) trên item_factors, chỉ dùng khi catalog đủ lớn
+ANN_CONFIG = {
+    'min_items': 50000,       # Số item tối thiểu để build index lúc fit
+    'n_lists': None,          # None = sqrt(n_items)
+    'nprobe': 8               # Số cụm duyệt mỗi request (tăng để tăng recall)
+}
+
+# Kết nối MySQL dùng chung cho mọi module
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'user': os.environ.get('DB_USER', 'root'),
+    'password': os.environ.get('DB_PASSWORD', '100103'),
+    'database': os.environ.get('DB_NAME', 'NLCN'),
+    'port': int(os.environ.get('DB_PORT', 3307)),
+    'auth_plugin': 'mysql_native_password'
+}
+
+# Pool connection (db_pool.py)
+DB_POOL_CONFIG = {
+    'min_size': 2,                 # Số connection nhàn rỗi tối thiểu được giữ lại
+    'max_size': 10,                # Số connection mở tối đa
+    'checkout_timeout': 5.0,       # Giây chờ tối đa khi pool hết connection
+    'health_check_interval': 30,   # Connection nhàn rỗi lâu hơn thì ping trước khi dùng
+    'max_lifetime': 3600,          # Connection sống lâu hơn thì mở lại
+    'idle_timeout': 300            # Connection nhàn rỗi (vượt min_size) quá lâu thì đóng
+}
+
+# Cache thẻ sản phẩm dùng chung (product_cache.py)
+PRODUCT_CACHE_CONFIG = {
+    'ttl': 600,          # Giây trước khi thẻ sản phẩm (giá, rating, đã bán) được lấy lại
+    'max_batch': 500     # Số id tối đa trong 1 query IN (...)
+}
+
+# Content-based: bảng top-K hàng xóm thay cho ma trận similarity dense
+CONTENT_CONFIG = {
+    'neighbors_k': 200,       # Số hàng xóm giữ lại cho mỗi sản phẩm
+    'chunk_size': 512,        # Số dòng mỗi block (bộ nhớ đỉnh ~ chunk_size x n_products x 4 bytes)
+    'n_jobs': 1,              # > 1: tính các block bằng process pool
+    'neighbors_path': os.environ.get('CONTENT_NEIGHBORS_PATH'),  # File .npz lưu bảng hàng xóm (None = không lưu)
+    # 'tfidf': TfidfVectorizer fit lại toàn bộ; 'hashing': HashingVectorizer + DF duy trì, cập nhật incremental
+    'vectorizer': os.environ.get('CONTENT_VECTORIZER', 'tfidf'),
+    'hashing_features': 2 ** 18,
+    'min_df': 2,                    # Term xuất hiện ở ít hơn min_df sản phẩm bị bỏ qua
+    'max_df': 0.9,                  # Term xuất hiện ở hơn max_df sản phẩm bị bỏ qua
+    'sync_interval': 60,            # Giây giữa 2 lần đồng bộ sản phẩm thay đổi (products.updated_at)
+    'compaction_updates': 500,      # Compact sau số sản phẩm thay đổi này
+    'compaction_dead_ratio': 0.2    # ... hoặc khi tỉ lệ dòng chết vượt ngưỡng
+}
+
+# Popularity: lọc category/brand/giá bằng index tính sẵn lúc fit
+POPULARITY_CONFIG = {
+    'filter_cache_size': 1024,   # Số tổ hợp bộ lọc giữ trong cache LRU
+    'scan_chunk': 256,           # Số dòng mỗi lần quét ứng viên (dừng sớm khi đủ limit)
+    # Cập nhật popularity theo event /api/track (popularity_stream.py); fit từ DB chỉ để đối soát
+    'streaming': os.environ.get('POPULARITY_STREAMING', '1') != '0',
+    'half_life_hours': 24,       # Bộ đếm quy về lúc build: event (và số liệu DB từ lúc fit) cũ 1 half_life còn nửa trọng số
+    'hll_precision': 10,         # HyperLogLog 2^10 thanh ghi mỗi sản phẩm có view (~3% sai số)
+    'publish_interval': 10,      # Giây tối thiểu giữa 2 lần publish model từ stream
+    'reconcile_interval': 6 * 3600   # Giây giữa 2 lần fit lại từ DB khi bật streaming
+}
+
+# Hybrid: gọi song song các recommender thành phần với deadline mỗi request
+HYBRID_CONFIG = {
+    'deadline': 0.5,      # Giây chờ tối đa các nguồn; nguồn trễ bị bỏ, lấp bằng popularity
+    'max_workers': 8,     # Số thread tối đa của pool dùng chung
+    'fit_processes': True,  # fit: train collaborative/content-based trong process riêng
+    'fit_start_method': 'spawn',  # Không fork process đang có thread (xem HybridRecommender.fit)
+    'candidates': 100,    # Số candidate lấy từ mỗi nguồn để gộp (rank_fusion.py)
+    'fusion': 'weighted', # weighted (tổng điểm min-max có trọng số) hoặc rrf (reciprocal rank fusion)
+    'rrf_k': 60,
+    'weights': {'content': 0.5, 'collaborative': 0.4, 'popularity': 0.1},
+    # Candidate tính sẵn cho request chỉ có user_id / product_id (hybrid_candidates.py)
+    'candidate_users': 20000,            # Số user nhiều tương tác nhất được tính sẵn
+    'candidate_products': 20000,         # Số sản phẩm phổ biến nhất được tính sẵn
+    'candidate_refresh_interval': 300    # Giây tối thiểu giữa 2 lần tính lại khi model thành phần đổi
+}
+
+# Artifact model trên đĩa (model_store.py): warm start bằng mmap thay vì train lại lúc khởi động
+ARTIFACT_CONFIG = {
+    'enabled': os.environ.get('MODEL_ARTIFACTS', '1') != '0',
+    'root': os.environ.get('MODEL_ARTIFACT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'artifacts')),
+    'keep_versions': 3,   # Số version giữ lại cho mỗi model
+    'mmap': True          # np.load(mmap_mode='r'): các process cùng đọc 1 bản trong page cache
+}
+
+# Chạy nhiều worker process (serve.py): process cha train + publish release, worker mmap artifact
+SERVING_CONFIG = {
+    'host': os.environ.get('ML_HOST', '0.0.0.0'),
+    'port': int(os.environ.get('ML_PORT', 5001)),
+    'workers': int(os.environ.get('ML_WORKERS', 4)),
+    'release_interval': 10,       # Giây giữa 2 lần kiểm tra model thay đổi để publish release mới
+    'activate_delay': 2.0,        # Giây từ lúc publish release tới lúc mọi worker cùng swap
+    'release_poll_interval': 5    # Worker tự kiểm tra RELEASE nếu lỡ tín hiệu SIGHUP
+}
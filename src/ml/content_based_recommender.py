@@ -1,19 +1,94 @@
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import mysql.connector
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from sklearn.preprocessing import normalize
+from scipy.sparse import vstack
+from concurrent.futures import ProcessPoolExecutor
 import logging
+import time
+import copy
+from datetime import datetime
+from db_pool import get_connection
+from model_store import frame_to_arrays, frame_from_arrays, encode_strings, decode_strings
+import config
 import re
 
 logger = logging.getLogger(__name__)
 
+# Ma trận TF-IDF của process worker (set 1 lần bởi initializer, tránh pickle mỗi block)
+_worker_matrix = None
+
+def _init_neighbor_worker(matrix):
+    global _worker_matrix
+    _worker_matrix = matrix
+
+def _neighbor_block_worker(start, end, k):
+    return top_k_neighbors_block(_worker_matrix, start, end, k)
+
+def top_k_neighbors_block(matrix, start, end, k):
+    """Top-k hàng xóm (cosine) của các dòng start:end; không tính chính nó
+
+    Nhân sparse x sparse cho 1 block dòng rồi cắt top-k từng dòng, nên bộ nhớ
+    đỉnh chỉ cỡ (end - start) x n_products thay vì n_products x n_products.
+    """
+    block = (matrix[start:end] @ matrix.T).toarray()
+    rows = np.arange(end - start)
+    block[rows, rows + start] = -np.inf
+    k = min(k, block.shape[1] - 1)
+    if k <= 0:
+        return np.empty((end - start, 0), dtype=np.int32), np.empty((end - start, 0), dtype=np.float32)
+    top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    scores = np.take_along_axis(block, top, axis=1)
+    order = np.argsort(-scores, axis=1, kind='stable')
+    return (
+        np.take_along_axis(top, order, axis=1).astype(np.int32),
+        np.take_along_axis(scores, order, axis=1).astype(np.float32)
+    )
+
 class ContentBasedRecommender:
     def __init__(self):
-        self.conn = self._connect_db()
         self.product_features = None
         self.tfidf_matrix = None
-        self.similarity_matrix = None
+        # Bảng top-K hàng xóm (sparse) thay cho ma trận similarity dense N x N
+        self.neighbor_indices = None   # (n_products, K) int32, sắp xếp giảm dần theo score
+        self.neighbor_scores = None    # (n_products, K) float32 cosine
+        self.neighbors_k = config.CONTENT_CONFIG['neighbors_k']
+        self.chunk_size = config.CONTENT_CONFIG['chunk_size']
+        self.n_jobs = config.CONTENT_CONFIG['n_jobs']
+        self.neighbors_path = config.CONTENT_CONFIG['neighbors_path']
+        # Mảng tính sẵn lúc fit cho re-scoring (xem _build_feature_arrays)
+        self.category_codes = None
+        self.brand_codes = None
+        self.prices = None
+        self.product_types = None
+        self.keyword_masks = {}
+        self.accessory_bonus = {}
+        self.category_lookup = {}
+        self.brand_lookup = {}
+        self.id_to_row = {}
+        self.new_products = {}
+        
+        # Chế độ vectorizer: 'tfidf' (fit lại toàn bộ) hoặc 'hashing' (cập nhật incremental)
+        self.vectorizer_mode = config.CONTENT_CONFIG['vectorizer']
+        if self.vectorizer_mode not in ('tfidf', 'hashing'):
+            raise ValueError(f"Unknown content vectorizer: {self.vectorizer_mode}")
+        self.hashing = HashingVectorizer(
+            n_features=config.CONTENT_CONFIG['hashing_features'],
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm=None
+        )
+        self.min_df = config.CONTENT_CONFIG['min_df']
+        self.max_df = config.CONTENT_CONFIG['max_df']
+        self.compaction_updates = config.CONTENT_CONFIG['compaction_updates']
+        self.compaction_dead_ratio = config.CONTENT_CONFIG['compaction_dead_ratio']
+        self.tf_matrix = None          # hashing: số lần xuất hiện term của từng dòng
+        self.doc_freq = None           # hashing: số dòng còn sống chứa mỗi term
+        self.idf = None                # hashing: idf đang dùng để weight các dòng mới
+        self.alive = None              # False = dòng đã bị thay thế/xóa, chờ compaction
+        self.last_synced_at = None     # products.updated_at lớn nhất đã đồng bộ
+        self.updates_since_compaction = 0
+        self.compacted_at = None
         self.tfidf = TfidfVectorizer(
             stop_words='english',
             ngram_range=(1, 2),
@@ -48,25 +123,6 @@ class ContentBasedRecommender:
             }
         }
     
-    def _connect_db(self):
-        """Kết nối đến MySQL database"""
-        try:
-            connection = mysql.connector.connect(
-                host='localhost',
-                database='NLCN',  # Tên database của bạn
-                user='root',           # Username MySQL của bạn
-                password='100103',           # Password MySQL của bạn
-                port=3307             # Port MySQL (mặc định là 3306)
-            )
-            
-            if connection.is_connected():
-                logger.info("Successfully connected to MySQL database")
-                return connection
-
-        except Exception as e:
-            logger.error(f"Error connecting to MySQL: {str(e)}")
-            raise e
-            
     def _preprocess_text(self, text):
         """Tiền xử lý text tiếng Việt"""
         if not isinstance(text, str):
@@ -99,48 +155,72 @@ class ContentBasedRecommender:
             JOIN productvariants pv ON p.id = pv.product_id
             GROUP BY p.id, c.name, b.name
         """
-        self.product_features = pd.read_sql(query, self.conn)
+        with get_connection() as conn:
+            self.product_features = pd.read_sql(query, conn)
 
-    def _extract_text_features(self):
-        """Trích xuất features từ text với trọng số"""
+    def _text_features(self, features):
+        """Text có trọng số (đã tiền xử lý) và product type cho các dòng của features"""
         # Tạo text features với trọng số chi tiết hơn
-        self.product_features['text_features'] = (
+        text_features = (
             # Tên sản phẩm (x6)
-            (self.product_features['name'].fillna('') + ' ') * 6 +
+            (features['name'].fillna('') + ' ') * 6 +
             # Category (x8)
-            (self.product_features['category_name'].fillna('') + ' ') * 8 +
+            (features['category_name'].fillna('') + ' ') * 8 +
             # Brand (x4)
-            (self.product_features['brand_name'].fillna('') + ' ') * 4 +
+            (features['brand_name'].fillna('') + ' ') * 4 +
             # Description
-            self.product_features['description'].fillna('')
+            features['description'].fillna('')
         )
         
         # Thêm product type detection
-        self.product_features['product_type'] = self.product_features['name'].apply(
+        product_type = features['name'].apply(
             lambda x: self._detect_product_type(x.lower())
         )
         
         # Boost similarity cho cùng product type
-        self.product_features['text_features'] = (
-            self.product_features.apply(
-                lambda x: x['text_features'] + ' ' + x['product_type'] * 5,
-                axis=1
-            )
-        )
+        text_features = text_features + ' ' + product_type * 5
         
         # Tiền xử lý text
-        self.product_features['text_features'] = (
-            self.product_features['text_features']
-            .apply(self._preprocess_text)
-        )
+        return text_features.apply(self._preprocess_text), product_type
+
+    def _current_idf(self):
+        """IDF (smooth, như TfidfVectorizer) từ doc_freq; term quá hiếm/quá phổ biến có idf = 0"""
+        n_docs = int(self.alive.sum())
+        idf = np.log((1 + n_docs) / (1 + self.doc_freq)) + 1
+        idf[(self.doc_freq < self.min_df) | (self.doc_freq > self.max_df * n_docs)] = 0
+        return idf
+
+    def _weight(self, tf_rows):
+        """TF-IDF chuẩn hóa L2 từ term count đã hash, dùng self.idf"""
+        weighted = tf_rows.multiply(self.idf).tocsr()
+        weighted.eliminate_zeros()
+        return normalize(weighted)
+
+    def _transform(self, text_features):
+        """Vector hóa text của sản phẩm mới bằng vectorizer đã fit"""
+        if self.vectorizer_mode == 'hashing':
+            return self._weight(self.hashing.transform(text_features))
+        return self.tfidf.transform(text_features)
+
+    def _extract_text_features(self):
+        """Trích xuất features từ text với trọng số"""
+        (
+            self.product_features['text_features'],
+            self.product_features['product_type']
+        ) = self._text_features(self.product_features)
+        self.alive = np.ones(len(self.product_features), dtype=bool)
+        
+        if self.vectorizer_mode == 'hashing':
+            # Hashing không cần fit vocabulary; DF được duy trì để cập nhật incremental
+            self.tf_matrix = self.hashing.transform(self.product_features['text_features']).tocsr()
+            self.doc_freq = np.bincount(self.tf_matrix.indices, minlength=self.tf_matrix.shape[1]).astype(np.int64)
+            self.idf = self._current_idf()
+            self.tfidf_matrix = self._weight(self.tf_matrix)
+            logger.info(f"Created hashed TF-IDF matrix with shape: {self.tfidf_matrix.shape}")
+            return
         
         # TF-IDF đơn giản
-        self.tfidf = TfidfVectorizer(
-            ngram_range=(1, 2),  # Chỉ dùng unigrams và bigrams
-            max_features=1000,   # Giảm số features
-            min_df=2,           # Bỏ qua từ hiếm
-            max_df=0.9          # Bỏ qua từ quá phổ biến
-        )
+        self.tfidf = self._make_tfidf()
         
         # Tạo TF-IDF matrix
         self.tfidf_matrix = self.tfidf.fit_transform(
@@ -149,6 +229,15 @@ class ContentBasedRecommender:
         
         logger.info(f"Created TF-IDF matrix with shape: {self.tfidf_matrix.shape}")
 
+    @staticmethod
+    def _make_tfidf():
+        return TfidfVectorizer(
+            ngram_range=(1, 2),  # Chỉ dùng unigrams và bigrams
+            max_features=1000,   # Giảm số features
+            min_df=2,           # Bỏ qua từ hiếm
+            max_df=0.9          # Bỏ qua từ quá phổ biến
+        )
+
     def _detect_product_type(self, name):
         """Phát hiện loại sản phẩm chi tiết hơn"""
         types = {
@@ -173,143 +262,414 @@ class ContentBasedRecommender:
                 return type_name
         return 'other'
 
+    @staticmethod
+    def _encode(lookup, values):
+        """Mã hóa giá trị thành code số nguyên, giá trị mới được thêm vào lookup"""
+        return np.array([lookup.setdefault(value, len(lookup)) for value in values], dtype=np.int64)
+
+    def _feature_arrays(self, features):
+        """Các mảng re-score cho các dòng của features (category/brand code, giá, type, mask keyword)"""
+        arrays = {
+            'category_codes': self._encode(self.category_lookup, features['category_name'].fillna('')),
+            'brand_codes': self._encode(self.brand_lookup, features['brand_name'].fillna('')),
+            'prices': pd.to_numeric(features['min_price'], errors='coerce').fillna(0).to_numpy(dtype=np.float64),
+            'product_types': features['product_type'].to_numpy()
+        }
+        
+        # Mask theo từng keyword phụ kiện (tên hoặc mô tả chứa keyword)
+        names = features['name'].fillna('').str.lower()
+        descriptions = features['description'].fillna('').str.lower()
+        keywords = {
+            keyword
+            for accessories in self.related_accessories.values()
+            for group in ('primary', 'secondary')
+            for keyword in accessories[group]
+        }
+        keyword_masks = {
+            keyword: (
+                names.str.contains(keyword, regex=False) |
+                descriptions.str.contains(keyword, regex=False)
+            ).to_numpy(dtype=bool)
+            for keyword in keywords
+        }
+        
+        # Bonus phụ kiện theo loại sản phẩm gốc: secondary (+0.07) ghi đè primary (+0.10)
+        accessory_bonus = {}
+        for product_type, accessories in self.related_accessories.items():
+            primary = np.logical_or.reduce([keyword_masks[kw] for kw in accessories['primary']])
+            secondary = np.logical_or.reduce([keyword_masks[kw] for kw in accessories['secondary']])
+            accessory_bonus[product_type] = np.where(secondary, 0.07, np.where(primary, 0.10, 0.0))
+        return arrays, keyword_masks, accessory_bonus
+
+    def _build_feature_arrays(self):
+        """Tính sẵn các mảng NumPy dùng để re-score trong recommend()"""
+        features = self.product_features
+        self.category_lookup = {}
+        self.brand_lookup = {}
+        arrays, self.keyword_masks, self.accessory_bonus = self._feature_arrays(features)
+        for name, values in arrays.items():
+            setattr(self, name, values)
+        # Hash map product id -> dòng trong product_features / tfidf_matrix
+        self.id_to_row = {
+            int(product_id): row
+            for row, product_id in enumerate(features['id'])
+            if self.alive is None or self.alive[row]
+        }
+        # Sản phẩm thêm sau lần fit gần nhất, được vector hóa khi được hỏi tới
+        self.new_products = {}
+
+    def _append_feature_arrays(self, features):
+        """Nối mảng re-score của các dòng mới vào cuối"""
+        arrays, keyword_masks, accessory_bonus = self._feature_arrays(features)
+        for name, values in arrays.items():
+            setattr(self, name, np.concatenate([getattr(self, name), values]))
+        for keyword, mask in keyword_masks.items():
+            self.keyword_masks[keyword] = np.concatenate([self.keyword_masks[keyword], mask])
+        for product_type, bonus in accessory_bonus.items():
+            self.accessory_bonus[product_type] = np.concatenate([self.accessory_bonus[product_type], bonus])
+
     def _calculate_similarity(self):
-        """Tính toán similarity matrix"""
+        """Tính bảng top-K hàng xóm theo từng block dòng (có thể chạy song song bằng process pool)"""
         try:
-            self.similarity_matrix = cosine_similarity(self.tfidf_matrix)
-            logger.info(f"Created similarity matrix with shape: {self.similarity_matrix.shape}")
+            start_time = time.time()
+            matrix = self.tfidf_matrix.tocsr().astype(np.float32)
+            n = matrix.shape[0]
+            blocks = [(start, min(start + self.chunk_size, n)) for start in range(0, n, self.chunk_size)]
+            
+            if self.n_jobs > 1 and len(blocks) > 1:
+                with ProcessPoolExecutor(
+                    max_workers=self.n_jobs,
+                    initializer=_init_neighbor_worker,
+                    initargs=(matrix,)
+                ) as executor:
+                    futures = [executor.submit(_neighbor_block_worker, start, end, self.neighbors_k)
+                               for start, end in blocks]
+                    results = [future.result() for future in futures]
+            else:
+                results = [top_k_neighbors_block(matrix, start, end, self.neighbors_k)
+                           for start, end in blocks]
+            
+            self.neighbor_indices = np.vstack([indices for indices, _ in results])
+            self.neighbor_scores = np.vstack([scores for _, scores in results])
+            logger.info(
+                f"Created top-{self.neighbor_indices.shape[1]} neighbor table for {n} products "
+                f"in {time.time() - start_time:.2f}s"
+            )
+            
+            if self.neighbors_path:
+                self.save_neighbors(self.neighbors_path)
         except Exception as e:
             logger.error(f"Error calculating similarity: {str(e)}")
             raise e
 
-    def recommend(self, product_id, n_items=8):
-        try:
-            product = self._get_product_details(product_id)
-            if not product:
-                return {}
-            
-            # Ensure all fields exist
-            product = {
-                'id': product.get('id', 0),
-                'name': product.get('name', ''),
-                'category_name': product.get('category_name', ''),
-                'brand_name': product.get('brand_name', ''),
-                'min_price': product.get('min_price', 0),
-                'description': product.get('description', '')
-            }
-            
-            # Detect product type early
-            product_type = self._detect_product_type(product['name'])
+    def save_neighbors(self, path):
+        """Lưu bảng hàng xóm ra file .npz (kèm product id để kiểm tra khi load)"""
+        np.savez(
+            path,
+            product_ids=self.product_features['id'].to_numpy(),
+            neighbor_indices=self.neighbor_indices,
+            neighbor_scores=self.neighbor_scores
+        )
+        logger.info(f"Saved neighbor table to {path}")
 
-            idx = self.product_features[
-                self.product_features['id'] == product_id
-            ].index[0]
-            
-            # Tính base similarity
-            base_similarities = cosine_similarity(
-                self.tfidf_matrix[idx:idx+1], 
-                self.tfidf_matrix
-            ).flatten()
-            
-            # Tạo DataFrame để xử lý scores
-            scores_df = pd.DataFrame({
-                'index': range(len(base_similarities)),
-                'similarity': base_similarities,
-                'category': self.product_features['category_name'].fillna(''),
-                'brand': self.product_features['brand_name'].fillna(''),
-                'price': self.product_features['min_price'].fillna(0),
-                'name': self.product_features['name'].fillna(''),
-                'description': self.product_features['description'].fillna('')
-            })
-            
-            # Loại bỏ sản phẩm gốc
-            scores_df = scores_df[scores_df['index'] != idx].copy()
-            
-            # Normalize initial similarities to 0-0.3 range
-            max_sim = scores_df['similarity'].max()
-            if max_sim > 0:
-                scores_df['similarity'] = scores_df['similarity'] / max_sim * 0.3
-            
-            # Add bonuses sequentially with normalization after each step
-            
-            # 1. Category bonus (max 0.3)
-            scores_df.loc[scores_df['category'] == product['category_name'], 'similarity'] += 0.3
-            scores_df['similarity'] = scores_df['similarity'].clip(0, 0.6)
+    def load_neighbors(self, path):
+        """Load bảng hàng xóm đã lưu; False nếu danh sách sản phẩm không khớp"""
+        with np.load(path) as data:
+            if not np.array_equal(data['product_ids'], self.product_features['id'].to_numpy()):
+                logger.warning(f"Neighbor table {path} does not match current products, ignoring")
+                return False
+            self.neighbor_indices = data['neighbor_indices']
+            self.neighbor_scores = data['neighbor_scores']
+        logger.info(f"Loaded neighbor table from {path}")
+        return True
+
+    def to_artifact(self):
+        """Mảng + meta để lưu artifact (xem model_store.ArtifactStore)"""
+        features = self.product_features.drop(columns=['text_features'], errors='ignore')
+        arrays, frame_spec = frame_to_arrays(features, 'product_')
+        arrays.update({
+            'tfidf_matrix': self.tfidf_matrix,
+            'neighbor_indices': self.neighbor_indices,
+            'neighbor_scores': self.neighbor_scores,
+            'category_codes': self.category_codes,
+            'brand_codes': self.brand_codes,
+            'prices': self.prices,
+            'alive': self.alive
+        })
+        keywords = sorted(self.keyword_masks)
+        product_types = sorted(self.accessory_bonus)
+        for i, keyword in enumerate(keywords):
+            arrays[f"keyword_mask_{i}"] = self.keyword_masks[keyword]
+        for i, product_type in enumerate(product_types):
+            arrays[f"accessory_bonus_{i}"] = self.accessory_bonus[product_type]
+        
+        if self.vectorizer_mode == 'hashing':
+            arrays.update({'tf_matrix': self.tf_matrix, 'doc_freq': self.doc_freq, 'idf': self.idf})
+        else:
+            # Vocabulary + idf của TfidfVectorizer để vector hóa sản phẩm mới sau khi load
+            vocabulary = self.tfidf.vocabulary_
+            terms = sorted(vocabulary, key=vocabulary.get)
+            arrays['tfidf_terms_blob'], arrays['tfidf_terms_offsets'], arrays['tfidf_terms_nulls'] = encode_strings(terms)
+            arrays['tfidf_idf'] = self.tfidf.idf_
+        
+        return arrays, {
+            'vectorizer': self.vectorizer_mode,
+            'product_features': frame_spec,
+            'keywords': keywords,
+            'accessory_types': product_types,
+            'categories': sorted(self.category_lookup, key=self.category_lookup.get),
+            'brands': sorted(self.brand_lookup, key=self.brand_lookup.get),
+            'last_synced_at': self.last_synced_at.isoformat() if self.last_synced_at is not None else None,
+            'updates_since_compaction': self.updates_since_compaction,
+            'compacted_at': self.compacted_at
+        }
+
+    @classmethod
+    def from_artifact(cls, arrays, meta):
+        """Dựng lại model từ artifact; ma trận/bảng hàng xóm là mảng mmap chỉ đọc
+
+        Cập nhật incremental luôn chạy trên snapshot() nên không ghi vào mảng mmap.
+        """
+        model = cls()
+        model.vectorizer_mode = meta['vectorizer']
+        model.product_features = frame_from_arrays(arrays, meta['product_features'])
+        model.tfidf_matrix = arrays['tfidf_matrix']
+        model.neighbor_indices = arrays['neighbor_indices']
+        model.neighbor_scores = arrays['neighbor_scores']
+        model.category_codes = arrays['category_codes']
+        model.brand_codes = arrays['brand_codes']
+        model.prices = arrays['prices']
+        model.product_types = model.product_features['product_type'].to_numpy(dtype=object)
+        model.alive = arrays['alive']
+        model.keyword_masks = {
+            keyword: arrays[f"keyword_mask_{i}"] for i, keyword in enumerate(meta['keywords'])
+        }
+        model.accessory_bonus = {
+            product_type: arrays[f"accessory_bonus_{i}"] for i, product_type in enumerate(meta['accessory_types'])
+        }
+        model.category_lookup = {value: code for code, value in enumerate(meta['categories'])}
+        model.brand_lookup = {value: code for code, value in enumerate(meta['brands'])}
+        model.id_to_row = {
+            int(product_id): row
+            for row, product_id in enumerate(model.product_features['id'])
+            if model.alive[row]
+        }
+        
+        if model.vectorizer_mode == 'hashing':
+            model.tf_matrix = arrays['tf_matrix']
+            model.doc_freq = arrays['doc_freq']
+            model.idf = arrays['idf']
+        else:
+            terms = decode_strings(
+                arrays['tfidf_terms_blob'], arrays['tfidf_terms_offsets'], arrays['tfidf_terms_nulls']
+            )
+            model.tfidf = model._make_tfidf()
+            model.tfidf.vocabulary_ = {term: i for i, term in enumerate(terms)}
+            model.tfidf.idf_ = np.asarray(arrays['tfidf_idf'])
+        
+        if meta['last_synced_at']:
+            model.last_synced_at = datetime.fromisoformat(meta['last_synced_at'])
+        model.updates_since_compaction = meta['updates_since_compaction']
+        model.compacted_at = meta['compacted_at']
+        return model
+
+    def _query_attributes(self, idx):
+        """(category code, brand code, giá, product type) của sản phẩm ở dòng idx"""
+        return self.category_codes[idx], self.brand_codes[idx], self.prices[idx], self.product_types[idx]
+
+    def _rescore(self, similarity, query, max_sim, rows=None):
+        """Điểm cuối từ cosine + bonus category/brand/giá/phụ kiện so với sản phẩm gốc
+
+        query là (category code, brand code, giá, product type) của sản phẩm gốc;
+        similarity là cosine của các sản phẩm rows (None = toàn bộ catalog).
+        Điểm tăng đơn điệu theo cosine.
+        """
+        if rows is None:
+            rows = slice(None)
+        category_code, brand_code, base_price, product_type = query
+        
+        # Normalize initial similarities to 0-0.3 range
+        if max_sim > 0:
+            similarity = similarity / max_sim * 0.3
+        else:
+            similarity = similarity.copy()
+        
+        # Add bonuses sequentially with normalization after each step
+        
+        # 1. Category bonus (max 0.3)
+        similarity += np.where(self.category_codes[rows] == category_code, 0.3, 0.0)
+        np.clip(similarity, 0, 0.6, out=similarity)
+        
+        # 2. Brand bonus (max 0.2)
+        similarity += np.where(self.brand_codes[rows] == brand_code, 0.2, 0.0)
+        np.clip(similarity, 0, 0.8, out=similarity)
+        
+        # 3. Price range bonuses (max 0.15)
+        if base_price > 0:
+            price_diff = np.abs(self.prices[rows] - base_price) / base_price
             
-            # 2. Brand bonus (max 0.2)
-            scores_df.loc[scores_df['brand'] == product['brand_name'], 'similarity'] += 0.2
-            scores_df['similarity'] = scores_df['similarity'].clip(0, 0.8)
+            # Tăng bonus cho khoảng giá phù hợp: <=0.2 very close, <=0.3 close, <=0.5 moderate
+            similarity += np.select(
+                [price_diff <= 0.2, price_diff <= 0.3, price_diff <= 0.5],
+                [0.15, 0.13, 0.10],
+                0.0
+            )
             
-            # 3. Price range bonuses (max 0.15)
-            base_price = product['min_price']
-            if base_price > 0:
-                price_diff = abs(scores_df['price'] - base_price) / base_price
-                
-                # Tăng bonus cho khoảng giá phù hợp
-                scores_df.loc[price_diff <= 0.2, 'similarity'] += 0.15  # Very close
-                scores_df.loc[(price_diff > 0.2) & (price_diff <= 0.3), 'similarity'] += 0.13  # Close
-                scores_df.loc[(price_diff > 0.3) & (price_diff <= 0.5), 'similarity'] += 0.10  # Moderate
-                
-                # Tăng penalty cho khoảng giá xa
-                scores_df.loc[price_diff > 0.5, 'similarity'] *= 0.5  # -50% for far prices
-                
-            # Normalize to 0.9 after price bonuses
-            scores_df['similarity'] = scores_df['similarity'].clip(0, 0.9)
+            # Tăng penalty cho khoảng giá xa (-50%)
+            similarity *= np.where(price_diff > 0.5, 0.5, 1.0)
             
-            # 4. Accessory bonuses
-            if product_type in self.related_accessories:
-                acc_bonus = np.zeros(len(scores_df))
-                
-                # Tăng bonus cho phụ kiện
-                for keyword in self.related_accessories[product_type]['primary']:
-                    mask = (
-                        scores_df['name'].str.lower().str.contains(keyword, na=False) |
-                        scores_df['description'].str.lower().str.contains(keyword, na=False)
-                    )
-                    acc_bonus = np.where(mask, 0.10, acc_bonus)  # +0.10 for primary
-                    
-                for keyword in self.related_accessories[product_type]['secondary']:
-                    mask = (
-                        scores_df['name'].str.lower().str.contains(keyword, na=False) |
-                        scores_df['description'].str.lower().str.contains(keyword, na=False)
-                    )
-                    acc_bonus = np.where(mask, 0.07, acc_bonus)  # +0.07 for secondary
-                    
-                # Add accessory bonuses
-                scores_df['similarity'] = scores_df['similarity'] + acc_bonus
+        # Normalize to 0.9 after price bonuses
+        np.clip(similarity, 0, 0.9, out=similarity)
+        
+        # 4. Accessory bonuses (+0.10 primary, +0.07 secondary), tính sẵn lúc fit
+        accessory_bonus = self.accessory_bonus.get(product_type)
+        if accessory_bonus is not None:
+            similarity += accessory_bonus[rows]
                 
-                # Boost accessories in similar price range
-                if base_price > 0:
-                    price_diff = abs(scores_df['price'] - base_price) / base_price
-                    acc_bonus = np.where(price_diff <= 0.5, acc_bonus * 1.2, acc_bonus)
-                    
-            # Final normalization
-            scores_df['similarity'] = scores_df['similarity'].clip(0, 0.95)
-            
-            # Sort by similarity
-            scores_df = scores_df.sort_values('similarity', ascending=False)
-            
-            # Get top recommendations
-            recommendations = self.product_features.iloc[scores_df.head(n_items)['index']]
-            
-            return [{
-                'id': int(row['id']),
-                'name': row['name'],
-                'category': row['category_name'],
-                'brand': row['brand_name'],
-                'price': float(row['min_price']),
-                'similarity_score': float(scores_df.loc[
-                    scores_df['index'] == row.name, 
-                    'similarity'
-                ].iloc[0])
-            } for _, row in recommendations.iterrows()]
+        # Final normalization
+        return np.clip(similarity, 0, 0.95, out=similarity)
+
+    def recommend(self, product_id, n_items=8):
+        try:
+            scores = self._product_scores(product_id, n_items)
+            if scores is None:
+                return {}
+            return self._top_recommendations(scores, n_items)
 
         except Exception as e:
             logger.error(f"Error in recommend: {str(e)}")
             return {}
 
+    def recommend_scored(self, product_id, n_items=8):
+        """Top n_items dạng mảng (product ids, scores) giảm dần, dùng cho rank fusion (không dựng dict)"""
+        scores = self._product_scores(product_id, n_items)
+        if scores is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        top = self._top_rows(scores, n_items)
+        return self.product_features['id'].to_numpy()[top].astype(np.int64), scores[top]
+
+    def _product_scores(self, product_id, n_items):
+        """Điểm gợi ý của mọi dòng cho product_id (-inf = loại); None nếu không vector hóa được sản phẩm"""
+        idx = self.id_to_row.get(int(product_id))
+        if idx is None:
+            # Sản phẩm thêm sau lần fit gần nhất
+            return self._new_product_scores(int(product_id))
+        
+        n_products = len(self.product_features)
+        query = self._query_attributes(idx)
+        neighbors = self.neighbor_indices[idx]
+        neighbor_scores = np.maximum(self.neighbor_scores[idx].astype(np.float64), 0)
+        # Bảng hàng xóm sắp xếp giảm dần và không chứa chính nó -> hàng xóm còn sống đầu tiên là max
+        alive_scores = neighbor_scores[self.alive[neighbors]]
+        max_sim = alive_scores[0] if len(alive_scores) else 0.0
+        
+        # Cận dưới: sản phẩm ngoài top-K coi như cosine = 0
+        similarity = np.zeros(n_products)
+        similarity[neighbors] = neighbor_scores
+        scores = self._rescore(similarity, query, max_sim)
+        
+        # Loại bỏ sản phẩm gốc và các dòng đã bị thay thế (chờ compaction)
+        scores[idx] = -np.inf
+        scores[~self.alive] = -np.inf
+        
+        n_items = min(n_items, n_products - 1)
+        
+        # Điểm re-score tăng đơn điệu theo cosine, nên sản phẩm ngoài top-K chỉ có thể
+        # vào top n_items nếu cận trên (cosine = hàng xóm thứ K) vượt ngưỡng hiện tại;
+        # chỉ các sản phẩm đó được tính cosine chính xác
+        if n_items > 0 and len(neighbors) < n_products - 1:
+            similarity[:] = neighbor_scores[-1] if len(neighbor_scores) else 0.0
+            similarity[neighbors] = neighbor_scores
+            upper = self._rescore(similarity, query, max_sim)
+            threshold = np.partition(scores, n_products - n_items)[n_products - n_items]
+            uncertain = (upper >= threshold) & self.alive
+            uncertain[neighbors] = False
+            uncertain[idx] = False
+            uncertain = np.flatnonzero(uncertain)
+            if len(uncertain):
+                exact = (self.tfidf_matrix[uncertain] @ self.tfidf_matrix[idx].T).toarray().ravel()
+                scores[uncertain] = self._rescore(exact, query, max_sim, rows=uncertain)
+        
+        return scores
+
+    def _top_rows(self, scores, n_items):
+        """Dòng của top n_items theo scores (giảm dần, hòa điểm thì dòng nhỏ trước)"""
+        n_items = min(n_items, int(np.isfinite(scores).sum()))
+        if n_items <= 0:
+            return np.empty(0, dtype=np.int64)
+        # Giữ mọi dòng hòa điểm thứ n_items để tách hòa theo dòng trên đủ ứng viên
+        kth = -np.partition(-scores, n_items - 1)[n_items - 1]
+        top = np.flatnonzero(scores >= kth)
+        return top[np.lexsort((top, -scores[top]))][:n_items]
+
+    def _top_recommendations(self, scores, n_items):
+        """Top n_items theo scores, format kết quả trả về"""
+        top = self._top_rows(scores, n_items)
+        if len(top) == 0:
+            return []
+        recommendations = self.product_features.iloc[top]
+        
+        return [{
+            'id': int(row['id']),
+            'name': row['name'],
+            'category': row['category_name'],
+            'brand': row['brand_name'],
+            'price': float(row['min_price']),
+            'similarity_score': float(score)
+        } for (_, row), score in zip(recommendations.iterrows(), scores[top])]
+
+    def _new_product_scores(self, product_id):
+        """Sản phẩm chưa có lúc fit: vector hóa riêng sản phẩm đó rồi tính cosine trực tiếp"""
+        new_product = self._vectorize_new_product(product_id)
+        if new_product is None:
+            return None
+        
+        similarity = (self.tfidf_matrix @ new_product['vector'].T).toarray().ravel()
+        similarity[~self.alive] = 0
+        max_sim = similarity.max() if len(similarity) else 0.0
+        scores = self._rescore(similarity, new_product['query'], max_sim)
+        scores[~self.alive] = -np.inf
+        return scores
+
+    def _vectorize_new_product(self, product_id):
+        """Load (1 query) và vector hóa bằng TF-IDF đã fit; cache lại tới lần fit sau"""
+        new_product = self.new_products.get(product_id)
+        if new_product is not None:
+            return new_product
+        
+        details = self._load_product_row(product_id)
+        if details is None:
+            return None
+        
+        row = pd.DataFrame([details])
+        text_features, product_type = self._text_features(row)
+        new_product = {
+            'details': details,
+            'vector': self._transform(text_features),
+            # Category/brand chưa có lúc fit -> code -1, không khớp sản phẩm nào
+            'query': (
+                self.category_lookup.get(details.get('category_name') or '', -1),
+                self.brand_lookup.get(details.get('brand_name') or '', -1),
+                float(pd.to_numeric(details.get('min_price'), errors='coerce') or 0),
+                product_type.iloc[0]
+            )
+        }
+        self.new_products[product_id] = new_product
+        logger.info(f"Vectorized product {product_id} added after fit")
+        return new_product
+
     def _get_product_details(self, product_id):
-        """Lấy chi tiết sản phẩm từ database"""
+        """Lấy chi tiết sản phẩm từ catalog trong bộ nhớ (DB chỉ với sản phẩm mới)"""
+        idx = self.id_to_row.get(int(product_id))
+        if idx is not None:
+            return self.product_features.iloc[idx].to_dict()
+        new_product = self.new_products.get(int(product_id))
+        if new_product is not None:
+            return new_product['details']
+        return self._load_product_row(product_id)
+
+    def _load_product_row(self, product_id):
+        """Lấy chi tiết 1 sản phẩm từ database"""
         query = """
             SELECT 
                 p.*,
@@ -324,32 +684,227 @@ class ContentBasedRecommender:
             WHERE p.id = %s
             GROUP BY p.id, c.name, b.name
         """
-        result = pd.read_sql(query, self.conn, params=[product_id])
+        with get_connection() as conn:
+            result = pd.read_sql(query, conn, params=[product_id])
         return result.iloc[0].to_dict() if not result.empty else None
 
-    def _format_recommendations(self, recommendations):
-        """Format kết quả trả về"""
-        return [{
-            'id': int(row['id']),
-            'name': row['name'],
-            'category': row['category_name'],
-            'brand': row['brand_name'],
-            'price': float(row['min_price']),
-            'similarity_score': float(self.similarity_matrix[row.name][0])
-        } for _, row in recommendations.iterrows()]
-
     def fit(self):
         """Train model"""
         try:
             self._load_product_features()
+            if self.vectorizer_mode == 'hashing':
+                self.last_synced_at = self._load_last_updated_at()
             self._extract_text_features()
+            self._build_feature_arrays()
             self._calculate_similarity()
+            self.updates_since_compaction = 0
+            self.compacted_at = time.time()
             logger.info(f"Model trained on {len(self.product_features)} products")
             return self
         except Exception as e:
             logger.error(f"Error in fit: {str(e)}")
             raise e
 
+    def _load_last_updated_at(self):
+        """products.updated_at lớn nhất hiện tại (mốc cho lần đồng bộ incremental sau)"""
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MAX(updated_at) FROM products")
+            result = cursor.fetchone()
+            cursor.close()
+        return result[0] if result else None
+
+    def _load_changed_products(self):
+        """Sản phẩm có updated_at sau lần đồng bộ gần nhất, và toàn bộ id còn trong DB"""
+        query = """
+            SELECT 
+                p.id,
+                p.name,
+                p.description,
+                c.name as category_name,
+                b.name as brand_name,
+                MIN(pv.price) as min_price,
+                MAX(pv.price) as max_price,
+                p.updated_at
+            FROM products p
+            JOIN categories c ON p.category_id = c.id
+            JOIN brands b ON p.brand_id = b.id
+            JOIN productvariants pv ON p.id = pv.product_id
+            WHERE p.updated_at > %s
+            GROUP BY p.id, c.name, b.name
+        """
+        with get_connection() as conn:
+            changed = pd.read_sql(query, conn, params=[self.last_synced_at])
+            product_ids = pd.read_sql("SELECT id FROM products", conn)['id']
+        return changed, set(product_ids.astype(int))
+
+    def snapshot(self):
+        """Bản sao để cập nhật incremental trong khi bản gốc vẫn đang phục vụ request"""
+        clone = copy.copy(self)
+        for name in ('neighbor_indices', 'neighbor_scores', 'doc_freq', 'idf', 'alive'):
+            value = getattr(self, name)
+            setattr(clone, name, value.copy() if value is not None else None)
+        for name in ('id_to_row', 'category_lookup', 'brand_lookup', 'new_products',
+                     'keyword_masks', 'accessory_bonus'):
+            setattr(clone, name, dict(getattr(self, name)))
+        return clone
+
+    def update_incremental(self):
+        """Đồng bộ sản phẩm thêm/sửa/xóa từ DB (chỉ chế độ hashing); trả về số sản phẩm thay đổi"""
+        if self.vectorizer_mode != 'hashing':
+            logger.info("Incremental update requires hashing vectorizer, skipping")
+            return 0
+        changed, product_ids = self._load_changed_products()
+        deleted = [product_id for product_id in self.id_to_row if product_id not in product_ids]
+        return self.apply_product_changes(changed, deleted)
+
+    def apply_product_changes(self, changed, deleted_ids=()):
+        """Chèn sản phẩm mới/đã sửa vào ma trận và bảng hàng xóm, đánh dấu dòng cũ/bị xóa
+
+        Dòng cũ chỉ bị đánh dấu (alive = False), được loại bỏ khi compact().
+        Dòng mới được weight bằng idf hiện tại; dòng cũ giữ idf lúc được thêm
+        cho tới lần compaction sau (xem drift_report).
+        """
+        changed_ids = [int(product_id) for product_id in changed['id']] if len(changed) else []
+        for product_id in list(deleted_ids) + changed_ids:
+            row = self.id_to_row.pop(int(product_id), None)
+            self.new_products.pop(int(product_id), None)
+            if row is not None and self.alive[row]:
+                self.alive[row] = False
+                self.doc_freq[self.tf_matrix[row].indices] -= 1
+        
+        if changed_ids:
+            changed = changed.reset_index(drop=True).copy()
+            changed['text_features'], changed['product_type'] = self._text_features(changed)
+            tf_rows = self.hashing.transform(changed['text_features']).tocsr()
+            np.add.at(self.doc_freq, tf_rows.indices, 1)
+            
+            start = len(self.product_features)
+            self.alive = np.concatenate([self.alive, np.ones(len(changed), dtype=bool)])
+            self.idf = self._current_idf()
+            self.tf_matrix = vstack([self.tf_matrix, tf_rows]).tocsr()
+            self.tfidf_matrix = vstack([self.tfidf_matrix, self._weight(tf_rows)]).tocsr()
+            self.product_features = pd.concat(
+                [self.product_features, changed.drop(columns=['updated_at'], errors='ignore')],
+                ignore_index=True
+            )
+            self._append_feature_arrays(changed)
+            for offset, product_id in enumerate(changed_ids):
+                self.id_to_row[product_id] = start + offset
+            self._insert_neighbors(np.arange(start, start + len(changed)))
+            
+            if 'updated_at' in changed and changed['updated_at'].notna().any():
+                latest = changed['updated_at'].max()
+                self.last_synced_at = latest if self.last_synced_at is None else max(self.last_synced_at, latest)
+        
+        n_changes = len(changed_ids) + len(deleted_ids)
+        self.updates_since_compaction += n_changes
+        if n_changes:
+            logger.info(f"Applied {len(changed_ids)} changed and {len(deleted_ids)} deleted products incrementally")
+        return n_changes
+
+    def _insert_neighbors(self, rows):
+        """Tính top-K hàng xóm cho các dòng mới và chèn chúng vào danh sách của dòng cũ"""
+        n_rows = self.tfidf_matrix.shape[0]
+        k = self.neighbor_indices.shape[1]
+        if k < min(self.neighbors_k, n_rows - 1):
+            # Catalog nhỏ hơn K: bảng chưa đủ rộng, tính lại toàn bộ
+            self._calculate_similarity()
+            return
+        
+        start = rows[0]
+        similarity = (self.tfidf_matrix[rows] @ self.tfidf_matrix.T).toarray()
+        similarity[:, ~self.alive] = -np.inf
+        similarity[np.arange(len(rows)), rows] = -np.inf
+        
+        # Danh sách hàng xóm của dòng mới
+        top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(similarity, top, axis=1)
+        order = np.argsort(-scores, axis=1, kind='stable')
+        self.neighbor_indices = np.vstack([
+            self.neighbor_indices[:start], np.take_along_axis(top, order, axis=1).astype(np.int32)
+        ])
+        self.neighbor_scores = np.vstack([
+            self.neighbor_scores[:start], np.take_along_axis(scores, order, axis=1).astype(np.float32)
+        ])
+        
+        # Chèn dòng mới vào danh sách của dòng cũ nếu vượt hàng xóm thứ K hiện tại
+        for offset, row in enumerate(rows):
+            column = similarity[offset, :start]
+            targets = np.flatnonzero(column > self.neighbor_scores[:start, -1])
+            if not len(targets):
+                continue
+            indices = self.neighbor_indices[targets]
+            scores = self.neighbor_scores[targets]
+            indices[:, -1] = row
+            scores[:, -1] = column[targets]
+            order = np.argsort(-scores, axis=1, kind='stable')
+            self.neighbor_indices[targets] = np.take_along_axis(indices, order, axis=1)
+            self.neighbor_scores[targets] = np.take_along_axis(scores, order, axis=1)
+
+    def needs_compaction(self):
+        """Đủ số cập nhật hoặc tỉ lệ dòng chết để compact"""
+        if self.vectorizer_mode != 'hashing' or self.alive is None:
+            return False
+        dead_ratio = 1 - self.alive.mean()
+        return (self.updates_since_compaction >= self.compaction_updates or
+                dead_ratio >= self.compaction_dead_ratio)
+
+    def compact(self):
+        """Bỏ dòng chết, weight lại toàn bộ bằng idf hiện tại và tính lại bảng hàng xóm
+
+        Chỉ dùng term count đã lưu nên không phải load/tokenize lại; kết quả
+        tương đương fit lại từ đầu trên cùng catalog.
+        """
+        start_time = time.time()
+        rows = np.flatnonzero(self.alive)
+        self.product_features = self.product_features.iloc[rows].reset_index(drop=True)
+        self.tf_matrix = self.tf_matrix[rows]
+        self.alive = np.ones(len(rows), dtype=bool)
+        self.doc_freq = np.bincount(self.tf_matrix.indices, minlength=self.tf_matrix.shape[1]).astype(np.int64)
+        self.idf = self._current_idf()
+        self.tfidf_matrix = self._weight(self.tf_matrix)
+        self._build_feature_arrays()
+        self._calculate_similarity()
+        self.updates_since_compaction = 0
+        self.compacted_at = time.time()
+        logger.info(f"Compacted content model to {len(rows)} products in {time.time() - start_time:.2f}s")
+        return self
+
+    def drift_report(self, sample_size=100, n_items=8, seed=42):
+        """Độ lệch kết quả của model incremental hiện tại so với fit lại toàn bộ
+
+        Bản tham chiếu là một bản sao đã compact (tương đương fit lại trên cùng catalog).
+        """
+        if self.vectorizer_mode != 'hashing':
+            return {'error': 'Drift report requires hashing vectorizer'}
+        
+        reference = self.snapshot().compact()
+        rng = np.random.default_rng(seed)
+        product_ids = list(self.id_to_row)
+        sample = rng.choice(product_ids, min(sample_size, len(product_ids)), replace=False)
+        
+        overlaps, exact_matches, score_diffs = [], 0, []
+        for product_id in sample:
+            current = self.recommend(int(product_id), n_items)
+            expected = reference.recommend(int(product_id), n_items)
+            current_ids = [rec['id'] for rec in current]
+            expected_ids = [rec['id'] for rec in expected]
+            overlaps.append(len(set(current_ids) & set(expected_ids)) / max(1, len(expected_ids)))
+            exact_matches += int(current_ids == expected_ids)
+            score_diffs.extend(
+                abs(a['similarity_score'] - b['similarity_score']) for a, b in zip(current, expected)
+            )
+        
+        return {
+            'sample_size': len(sample),
+            f'overlap@{n_items}': round(float(np.mean(overlaps)), 4) if overlaps else None,
+            'exact_match_rate': round(exact_matches / max(1, len(sample)), 4),
+            'mean_score_diff': round(float(np.mean(score_diffs)), 6) if score_diffs else 0.0,
+            'dead_rows': int((~self.alive).sum()),
+            'updates_since_compaction': self.updates_since_compaction
+        }
+
     def _filter_by_price(self, recommendations, base_price, threshold=0.5):
         """Lọc recommendations theo khoảng giá"""
         min_price = base_price * (1 - threshold)  # -50%
@@ -0,0 +1,239 @@
+import os
+import threading
+import logging
+import time
+from collections import deque
+import mysql.connector
+import config
+
+logger = logging.getLogger(__name__)
+
+class PoolTimeoutError(Exception):
+    """Không lấy được connection trong thời gian checkout_timeout"""
+
+class PooledConnection:
+    """Connection mượn từ pool; close() (hoặc thoát khối with) trả connection về pool"""
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    def __getattr__(self, name):
+        entry = self.__dict__.get('_entry')
+        if entry is None:
+            raise AttributeError(f"Connection already returned to pool ({name})")
+        return getattr(entry[0], name)
+
+    def close(self):
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool._release(entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Lưới an toàn: caller quên close() thì vẫn trả connection về pool
+        if self.__dict__.get('_entry') is not None:
+            logger.warning("Pooled connection was garbage collected without close()")
+            self.close()
+
+class ConnectionPool:
+    """Pool MySQL connection dùng chung cho toàn process (thread-safe)
+
+    - Tối đa max_size connection mở cùng lúc; khi hết, checkout chờ tối đa
+      checkout_timeout giây rồi raise PoolTimeoutError.
+    - Connection nhàn rỗi quá health_check_interval giây được ping trước khi
+      giao ra; connection chết hoặc quá max_lifetime được mở lại.
+    - Giữ tối đa min_size connection nhàn rỗi quá idle_timeout, phần dư được đóng.
+    - Khi trả về pool, transaction đang mở được rollback để lần checkout sau
+      đọc được dữ liệu mới (InnoDB REPEATABLE READ).
+    """
+
+    def __init__(self, db_config, min_size=2, max_size=10, checkout_timeout=5.0,
+                 health_check_interval=30, max_lifetime=3600, idle_timeout=300):
+        self.db_config = db_config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        # Connection (socket) chỉ dùng được trong process đã mở nó
+        self._pid = os.getpid()
+        # Mỗi entry: [connection, created_at, last_used]
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._metrics = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'closed': 0,
+            'health_check_failures': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0
+        }
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self.db_config)
+        now = time.time()
+        with self._cond:
+            self._metrics['created'] += 1
+        return [conn, now, now]
+
+    def _close(self, entry):
+        try:
+            entry[0].close()
+        except Exception:
+            pass
+        with self._cond:
+            self._metrics['closed'] += 1
+
+    def _is_healthy(self, entry, now):
+        """Ping connection nếu đã nhàn rỗi lâu; False nếu chết hoặc quá max_lifetime"""
+        if now - entry[1] > self.max_lifetime:
+            return False
+        if now - entry[2] <= self.health_check_interval:
+            return True
+        try:
+            entry[0].ping(reconnect=False)
+            return True
+        except Exception:
+            with self._cond:
+                self._metrics['health_check_failures'] += 1
+            return False
+
+    def get_connection(self, timeout=None):
+        """Mượn 1 connection; dùng với `with` hoặc gọi close() để trả lại pool"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.time()
+        deadline = start + timeout
+        entry = None
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    # LIFO: dùng lại connection vừa trả, connection cũ tự hết hạn idle
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self._metrics['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f"Timed out after {timeout}s waiting for a DB connection "
+                        f"(pool size {self.max_size})"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+            wait_ms = (time.time() - start) * 1000
+            self._metrics['checkouts'] += 1
+            if waited:
+                self._metrics['waits'] += 1
+                self._metrics['total_wait_ms'] += wait_ms
+                self._metrics['max_wait_ms'] = max(self._metrics['max_wait_ms'], wait_ms)
+
+        try:
+            if entry is not None and not self._is_healthy(entry, time.time()):
+                self._close(entry)
+                entry = None
+            if entry is None:
+                entry = self._connect()
+        except Exception:
+            # Không mở được connection -> nhả slot cho request khác
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, entry)
+
+    def connection(self, timeout=None):
+        """Alias của get_connection cho cú pháp `with pool.connection() as conn`"""
+        return self.get_connection(timeout)
+
+    def _release(self, entry):
+        if os.getpid() != self._pid:
+            # Pool kế thừa qua fork: không rollback/đóng trên socket của process cha
+            return
+        healthy = True
+        try:
+            entry[0].rollback()
+        except Exception:
+            healthy = False
+
+        now = time.time()
+        expired = []
+        with self._cond:
+            if healthy:
+                entry[2] = now
+                self._idle.append(entry)
+            else:
+                self._size -= 1
+            # Đóng bớt connection nhàn rỗi quá idle_timeout, giữ lại min_size
+            while len(self._idle) > self.min_size and now - self._idle[0][2] > self.idle_timeout:
+                expired.append(self._idle.popleft())
+                self._size -= 1
+            self._cond.notify()
+
+        if not healthy:
+            self._close(entry)
+        for old in expired:
+            self._close(old)
+
+    def close_all(self):
+        """Đóng toàn bộ connection nhàn rỗi (connection đang mượn đóng khi được trả)"""
+        if os.getpid() != self._pid:
+            return
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        for entry in idle:
+            self._close(entry)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._metrics)
+            stats.update({
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.max_size,
+                'avg_wait_ms': round(stats['total_wait_ms'] / stats['waits'], 3) if stats['waits'] else 0.0
+            })
+        stats['total_wait_ms'] = round(stats['total_wait_ms'], 3)
+        stats['max_wait_ms'] = round(stats['max_wait_ms'], 3)
+        return stats
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Pool dùng chung cho toàn process, tạo lần đầu từ config.DB_CONFIG / DB_POOL_CONFIG"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(config.DB_CONFIG, **config.DB_POOL_CONFIG)
+    return _pool
+
+def _reset_after_fork():
+    """Process con (fork) tạo pool riêng khi cần; pool của process cha bị bỏ qua"""
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_connection(timeout=None):
+    """Mượn connection từ pool dùng chung"""
+    return get_pool().get_connection(timeout)
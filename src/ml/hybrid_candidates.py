@@ -0,0 +1,154 @@
+import logging
+import time
+from datetime import datetime
+import numpy as np
+import config
+
+logger = logging.getLogger(__name__)
+
+class CandidateTable:
+    """Candidate tính sẵn của từng key (user hoặc sản phẩm) cho hybrid
+
+    Lưu dạng 2 mảng (n_keys, n_candidates): item_ids int32 với -1 ở ô trống và
+    scores float32 với -inf tương ứng (giống recommend_many), kèm dict key -> hàng,
+    nên mỗi request chỉ là 1 lần tra dict + cắt hàng.
+    """
+
+    def __init__(self, keys, item_ids, scores, build_duration=None, built_at=None):
+        self.keys = np.asarray(keys, dtype=np.int64)
+        self.item_ids = item_ids
+        self.scores = scores
+        self._rows = {int(key): row for row, key in enumerate(self.keys)}
+        self.built_at = built_at or datetime.now()
+        self.build_duration = build_duration
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return int(key) in self._rows
+
+    def get(self, key, n=None):
+        """(item_ids, scores) của key theo điểm giảm dần, None nếu key chưa được tính sẵn"""
+        row = self._rows.get(int(key))
+        if row is None:
+            return None
+        scores = self.scores[row, :n]
+        valid = np.isfinite(scores)
+        return self.item_ids[row, :n][valid].astype(np.int64), scores[valid].astype(np.float64)
+
+    @property
+    def nbytes(self):
+        return self.item_ids.nbytes + self.scores.nbytes
+
+    def stats(self):
+        return {
+            'keys': len(self),
+            'candidates': self.item_ids.shape[1],
+            'memory_mb': round(self.nbytes / 1024 ** 2, 1),
+            'built_at': self.built_at.isoformat(),
+            'build_duration': self.build_duration
+        }
+
+    @classmethod
+    def for_users(cls, collaborative, user_ids, n_candidates):
+        """Top n_candidates collaborative của các user (nhân ma trận theo chunk qua recommend_many)"""
+        start = time.time()
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        item_ids, scores = collaborative.recommend_many(user_ids, n_items=n_candidates)
+        table = cls(user_ids, item_ids, scores, build_duration=round(time.time() - start, 3))
+        logger.info(f"Precomputed collaborative candidates for {len(table)} users in {table.build_duration}s")
+        return table
+
+    @classmethod
+    def for_products(cls, content_based, product_ids, n_candidates):
+        """Top n_candidates content-based của các sản phẩm (recommend_scored từng sản phẩm)"""
+        start = time.time()
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        item_ids = np.full((len(product_ids), n_candidates), -1, dtype=np.int32)
+        scores = np.full((len(product_ids), n_candidates), -np.inf, dtype=np.float32)
+        for row, product_id in enumerate(product_ids):
+            try:
+                ids, product_scores = content_based.recommend_scored(product_id, n_items=n_candidates)
+            except Exception as e:
+                logger.error(f"Error precomputing candidates for product {product_id}: {str(e)}")
+                continue
+            item_ids[row, :len(ids)] = ids
+            scores[row, :len(ids)] = product_scores
+        table = cls(product_ids, item_ids, scores, build_duration=round(time.time() - start, 3))
+        logger.info(f"Precomputed content candidates for {len(table)} products in {table.build_duration}s")
+        return table
+
+class HybridCandidates:
+    """Bộ candidate tính sẵn của hybrid: collaborative theo user và content-based theo sản phẩm
+
+    Tính 1 lần ở process train (build) rồi lưu thành artifact như các model khác,
+    nên các worker của serve.py chỉ load (mmap) chứ không tự tính lại.
+    """
+
+    TABLES = ('users', 'products')
+
+    def __init__(self, users=None, products=None):
+        self.users = users
+        self.products = products
+
+    @classmethod
+    def build(cls, content_based, collaborative, popularity, max_users=None, max_products=None, n_candidates=None):
+        """Tính candidate cho max_users user nhiều tương tác nhất và max_products sản phẩm phổ biến nhất
+
+        Mặc định theo HYBRID_CONFIG; key không có trong bảng được gọi trực tiếp lúc request.
+        """
+        hybrid_config = config.HYBRID_CONFIG
+        max_users = hybrid_config['candidate_users'] if max_users is None else max_users
+        max_products = hybrid_config['candidate_products'] if max_products is None else max_products
+        n_candidates = n_candidates or hybrid_config['candidates']
+        candidates = cls()
+
+        matrix = getattr(collaborative, 'user_item_matrix', None)
+        if matrix is not None and max_users > 0 and matrix.n_users:
+            order = np.argsort(-matrix.row_nnz(), kind='stable')[:max_users]
+            candidates.users = CandidateTable.for_users(collaborative, matrix.user_ids[order], n_candidates)
+
+        product_features = getattr(content_based, 'product_features', None)
+        if product_features is not None and max_products > 0 and len(product_features):
+            known = content_based.id_to_row
+            # Sản phẩm phổ biến trước, phần còn lại theo thứ tự catalog
+            ranked = popularity.top_products(len(product_features))[0]
+            product_ids = [pid for pid in ranked if int(pid) in known]
+            if len(product_ids) < max_products:
+                seen = set(product_ids)
+                product_ids += [pid for pid in product_features['id'] if pid not in seen]
+            candidates.products = CandidateTable.for_products(content_based, product_ids[:max_products], n_candidates)
+        return candidates
+
+    def stats(self):
+        return {name: table.stats() if table is not None else None
+                for name, table in ((name, getattr(self, name)) for name in self.TABLES)}
+
+    def to_artifact(self):
+        """(arrays, meta) để lưu bằng ArtifactStore"""
+        arrays, meta = {}, {}
+        for name in self.TABLES:
+            table = getattr(self, name)
+            if table is None:
+                meta[name] = None
+                continue
+            arrays[f"{name}_keys"] = table.keys
+            arrays[f"{name}_item_ids"] = table.item_ids
+            arrays[f"{name}_scores"] = table.scores
+            meta[name] = {'built_at': table.built_at.isoformat(), 'build_duration': table.build_duration}
+        return arrays, meta
+
+    @classmethod
+    def from_artifact(cls, arrays, meta):
+        """Dựng lại từ artifact; mảng candidate dùng thẳng bản mmap"""
+        candidates = cls()
+        for name in cls.TABLES:
+            info = meta.get(name)
+            if info is None:
+                continue
+            setattr(candidates, name, CandidateTable(
+                arrays[f"{name}_keys"], arrays[f"{name}_item_ids"], arrays[f"{name}_scores"],
+                build_duration=info['build_duration'], built_at=datetime.fromisoformat(info['built_at'])
+            ))
+        return candidates
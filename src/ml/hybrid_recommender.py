@@ -1,254 +1,412 @@
 import numpy as np
-import pandas as pd
 from content_based_recommender import ContentBasedRecommender
 from collaborative_recommender import CollaborativeRecommender
 from popularity_recommender import PopularityRecommender
 import logging
-import mysql.connector
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from db_pool import get_connection
+from product_cache import get_product_cache
+from rank_fusion import fuse
+import config
 
 logger = logging.getLogger(__name__)
 
+_executor = None
+_executor_lock = threading.Lock()
+
+# Số call đã trễ hạn nhưng vẫn đang chạy trong pool của từng nguồn: nguồn còn call như
+# vậy bị bỏ qua ở các request sau thay vì chiếm thêm thread của pool
+_late_calls = {}
+_late_calls_lock = threading.Lock()
+
+def get_executor():
+    """Thread pool dùng chung (giới hạn max_workers) để gọi song song các recommender thành phần"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=config.HYBRID_CONFIG['max_workers'], thread_name_prefix='hybrid'
+                )
+    return _executor
+
+def _reset_after_fork():
+    # Thread của pool không sống qua fork: process con tạo pool mới khi cần
+    global _executor, _executor_lock, _late_calls, _late_calls_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+    _late_calls = {}
+    _late_calls_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+# Model thành phần của hybrid: collaborative (SVD/ALS) và content-based (TF-IDF + bảng hàng xóm)
+# nặng CPU, popularity chủ yếu chờ SQL
+COMPONENTS = ('collaborative', 'content_based', 'popularity')
+CPU_BOUND_COMPONENTS = ('collaborative', 'content_based')
+
+def _train_component(name, conn=None):
+    """Train 1 model thành phần mới, mượn connection riêng từ pool nếu không truyền conn"""
+    if name == 'content_based':
+        # Content-based tự mượn connection khi load dữ liệu
+        return ContentBasedRecommender().fit()
+    if conn is None:
+        with get_connection() as own_conn:
+            return _train_component(name, own_conn)
+    if name == 'collaborative':
+        return CollaborativeRecommender().fit(conn)
+    model = PopularityRecommender()
+    if not model.fit(conn):
+        raise RuntimeError("Popularity recommender fit failed")
+    return model
+
+def _timed_train(train_fn, name, conn=None):
+    start = time.time()
+    model = train_fn(name, conn)
+    return model, time.time() - start
+
+def _train_component_artifact(train_fn, name):
+    """Chạy trong process con: train rồi trả về (arrays, meta, giây) để dựng lại model ở process cha
+
+    Model được chuyển qua to_artifact/from_artifact (giống artifact trên đĩa) thay vì pickle
+    nguyên object.
+    """
+    model, duration = _timed_train(train_fn, name)
+    arrays, meta = model.to_artifact()
+    return arrays, meta, duration
+
 class HybridRecommender:
+    # Hàm train 1 model thành phần theo tên (module-level để process con import được)
+    component_trainer = staticmethod(_train_component)
+
     def __init__(self):
         self.content_based = ContentBasedRecommender()
         self.collaborative = CollaborativeRecommender()
         self.popularity = PopularityRecommender()
-        self.db_config = {
-            'host': 'localhost',
-            'user': 'root',
-            'password': '100103',
-            'database': 'NLCN',
-            'port': 3307,
-            'auth_plugin': 'mysql_native_password'
-        }
+        self.fit_report = {}
+        # Candidate tính sẵn cho request chỉ có user_id / product_id (use_candidates)
+        self.use_candidates(None)
         
-    def fit(self, conn=None):
-        """Khởi tạo và train các recommender thành phần"""
-        try:
-            # Nếu không có connection được truyền vào, tạo connection mới
-            if conn is None:
-                conn = mysql.connector.connect(**self.db_config)
-                should_close = True
-            else:
-                should_close = False
+    @classmethod
+    def from_components(cls, content_based, collaborative, popularity, candidates=None):
+        """Hybrid dùng lại các model thành phần và candidate đã train/load sẵn (không train lại)"""
+        model = cls.__new__(cls)
+        model.content_based = content_based
+        model.collaborative = collaborative
+        model.popularity = popularity
+        model.fit_report = {name: {'status': 'reused', 'duration': 0.0} for name in COMPONENTS}
+        return model.use_candidates(candidates)
+
+    def use_candidates(self, candidates):
+        """Gắn bộ candidate tính sẵn (HybridCandidates, None = không có) cho request chỉ có user_id / product_id"""
+        self.candidates = candidates
+        self.user_candidates = candidates.users if candidates is not None else None
+        self.product_candidates = candidates.products if candidates is not None else None
+        return self
 
-            # Train các recommender thành phần
-            logger.info("Training collaborative recommender...")
-            self.collaborative.fit(conn)
+    def _cached_user_candidates(self, user_id, n_candidates):
+        """Candidate tính sẵn của user, bỏ các item user đã tương tác sau lúc tính bảng
 
-            logger.info("Training content-based recommender...")
-            self.content_based.fit()
+        Lọc theo hàng hiện tại của user trong ma trận collaborative đang phục vụ
+        (đã cập nhật theo event). None nếu user không có trong bảng.
+        """
+        cached = self.user_candidates.get(user_id, n_candidates) if self.user_candidates is not None else None
+        matrix = getattr(self.collaborative, 'user_item_matrix', None)
+        if cached is None or matrix is None:
+            return cached
+        row = matrix.user_index(user_id)
+        if row is None:
+            return cached
+        interacted, _ = matrix.user_row(row)
+        if len(interacted) == 0:
+            return cached
+        item_ids, scores = cached
+        keep = ~np.isin(item_ids, matrix.item_ids[interacted])
+        return item_ids[keep], scores[keep]
 
-            logger.info("Training popularity recommender...")
-            self.popularity.fit(conn)
+    def fit(self, conn=None, reuse=None):
+        """Train song song các recommender thành phần
 
-            if should_close:
-                conn.close()
+        - Collaborative và content-based train trong process riêng (HYBRID_CONFIG['fit_processes']),
+          popularity train trong thread; mỗi model mượn connection riêng từ pool (conn nếu
+          truyền vào chỉ dùng cho popularity).
+        - reuse = {tên: model đã train} (vd. model app đang phục vụ) được dùng lại thay vì train.
+        - Model lỗi không làm dừng các model khác: model train xong vẫn được giữ lại,
+          self.fit_report ghi trạng thái/thời gian từng model.
+        Trả về True nếu mọi model thành phần đều sẵn sàng.
+        """
+        start = time.time()
+        reuse = reuse or {}
+        self.fit_report = {}
+        pending = []
+        for name in COMPONENTS:
+            if reuse.get(name) is not None:
+                setattr(self, name, reuse[name])
+                self.fit_report[name] = {'status': 'reused', 'duration': 0.0}
+            else:
+                pending.append(name)
 
-            return True
+        use_processes = config.HYBRID_CONFIG['fit_processes']
+        process_jobs = [name for name in pending if use_processes and name in CPU_BOUND_COMPONENTS]
+        thread_jobs = [name for name in pending if name not in process_jobs]
+        futures = {}
+        process_pool = ProcessPoolExecutor(
+            max_workers=len(process_jobs),
+            # fit chạy trên thread nền của app: fork lúc có thread khác đang giữ lock (cache,
+            # holder, BLAS) có thể làm process con treo, nên process con được start mới
+            mp_context=multiprocessing.get_context(config.HYBRID_CONFIG['fit_start_method'])
+        ) if process_jobs else None
+        thread_pool = ThreadPoolExecutor(
+            max_workers=len(thread_jobs), thread_name_prefix='hybrid-fit'
+        ) if thread_jobs else None
+        try:
+            for name in process_jobs:
+                logger.info(f"Training {name} recommender in a subprocess...")
+                futures[name] = process_pool.submit(_train_component_artifact, self.component_trainer, name)
+            for name in thread_jobs:
+                logger.info(f"Training {name} recommender...")
+                futures[name] = thread_pool.submit(
+                    _timed_train, self.component_trainer, name, conn if name == 'popularity' else None
+                )
 
-        except Exception as e:
-            logger.error(f"Error in hybrid fit: {str(e)}")
-            logger.exception("Full traceback:")
-            return False
+            for name, future in futures.items():
+                try:
+                    if name in process_jobs:
+                        arrays, meta, duration = future.result()
+                        model = type(getattr(self, name)).from_artifact(arrays, meta)
+                    else:
+                        model, duration = future.result()
+                    setattr(self, name, model)
+                    self.fit_report[name] = {'status': 'ok', 'duration': round(duration, 3)}
+                    logger.info(f"Trained {name} recommender in {duration:.2f}s")
+                except Exception as e:
+                    logger.error(f"Error training {name} recommender: {str(e)}")
+                    self.fit_report[name] = {'status': 'error', 'error': str(e)}
+        finally:
+            for pool in (process_pool, thread_pool):
+                if pool is not None:
+                    pool.shutdown(wait=True)
+
+        elapsed = time.time() - start
+        failed = [name for name, report in self.fit_report.items() if report['status'] == 'error']
+        logger.info(
+            f"Hybrid fit finished in {elapsed:.2f}s (sum of components "
+            f"{sum(report.get('duration', 0) for report in self.fit_report.values()):.2f}s)"
+            + (f", failed: {failed}" if failed else "")
+        )
+        return not failed
 
     def _get_db_connection(self):
-        """Tạo connection mới đến database"""
+        """Mượn connection từ pool dùng chung (close() trả lại pool)"""
         try:
-            return mysql.connector.connect(**self.db_config)
+            return get_connection()
         except Exception as e:
             logger.error(f"Error connecting to database: {str(e)}")
             return None
 
-    def recommend(self, user_id=None, product_id=None, n_items=8):
+    def _fan_out(self, calls, deadline):
+        """Chạy song song {name: fn} trên pool dùng chung, chờ tối đa deadline giây
+
+        Trả về (results, sources): results chỉ gồm các call xong đúng hạn; call trễ
+        bị bỏ (chạy nốt trong pool nhưng không dùng kết quả), call lỗi được log.
+        Nguồn còn call trễ chưa chạy xong thì không được gọi lại (status timeout,
+        skipped) cho tới khi call đó xong.
+        sources[name] = {'status': ok/error/timeout, 'elapsed_ms', 'items'}.
+        """
+        timings = {}
+        finished, late = set(), set()
+
+        def timed(name, fn):
+            start = time.perf_counter()
+            try:
+                return fn()
+            finally:
+                timings[name] = time.perf_counter() - start
+                with _late_calls_lock:
+                    finished.add(name)
+                    if name in late:
+                        _late_calls[name] -= 1
+
+        results, sources = {}, {}
+        with _late_calls_lock:
+            busy = {name for name in calls if _late_calls.get(name)}
+        for name in busy:
+            sources[name] = {'status': 'timeout', 'elapsed_ms': 0.0, 'items': 0, 'skipped': True}
+            logger.warning(f"Hybrid source {name} skipped: a previous call is still running past its deadline")
+
+        executor = get_executor()
+        futures = {executor.submit(timed, name, fn): name for name, fn in calls.items() if name not in busy}
+        done, _ = wait(futures, timeout=deadline)
+
+        for future, name in futures.items():
+            if future not in done:
+                with _late_calls_lock:
+                    # Call đã chạy (không cancel được) mà chưa xong: tính là call trễ đang chiếm thread
+                    if not future.cancel() and name not in finished:
+                        late.add(name)
+                        _late_calls[name] = _late_calls.get(name, 0) + 1
+                sources[name] = {'status': 'timeout', 'elapsed_ms': round(deadline * 1000, 1), 'items': 0}
+                logger.warning(f"Hybrid source {name} missed the {deadline * 1000:.0f}ms deadline")
+                continue
+            elapsed_ms = round(timings.get(name, 0) * 1000, 1)
+            try:
+                results[name] = future.result()
+                # Nguồn dạng mảng (item_ids, scores) -> đếm số item
+                items = results[name][0] if isinstance(results[name], tuple) else results[name] or []
+                sources[name] = {'status': 'ok', 'elapsed_ms': elapsed_ms, 'items': len(items)}
+            except Exception as e:
+                logger.error(f"Error in hybrid source {name}: {str(e)}")
+                sources[name] = {'status': 'error', 'elapsed_ms': elapsed_ms, 'items': 0, 'error': str(e)}
+        return results, sources
+
+    def recommend(self, user_id=None, product_id=None, n_items=8, deadline=None):
         """Kết hợp recommendations từ các models"""
+        return self.recommend_with_metadata(user_id, product_id, n_items, deadline)[0]
+
+    def recommend_with_metadata(self, user_id=None, product_id=None, n_items=8, deadline=None):
+        """Như recommend, kèm metadata thời gian/timeout của từng nguồn
+
+        Chỉ cần 1 trong user_id (collaborative + popularity) hoặc product_id (content +
+        popularity); có cả 2 thì gộp cả 3 nguồn. Mỗi nguồn trả về HYBRID_CONFIG['candidates']
+        candidate dạng mảng (item_ids, scores), lấy từ bảng tính sẵn hoặc gọi song song với
+        deadline chung cho cả request (mặc định HYBRID_CONFIG['deadline']), rồi gộp bằng
+        rank_fusion.fuse. Nguồn trễ hạn hoặc lỗi bị bỏ và trọng số của nó chuyển sang popularity.
+        """
+        hybrid_config = config.HYBRID_CONFIG
+        deadline = hybrid_config['deadline'] if deadline is None else deadline
+        start = time.perf_counter()
+        metadata = {'deadline_ms': round(deadline * 1000, 1), 'sources': {}, 'fallback': False}
         try:
             logger.info(f"\n=== Starting hybrid recommendations ===")
             logger.info(f"Parameters: user_id={user_id}, product_id={product_id}, n_items={n_items}")
             
-            recommendations = []
-            
-            # Case 1: Có cả user_id và product_id
-            if user_id and product_id:
-                # Get content-based recommendations first (vì đang xem sản phẩm)
-                logger.info("Getting content-based recommendations...")
-                content_recs = self.content_based.recommend(product_id, n_items=n_items)
-                logger.info(f"Got {len(content_recs)} content-based recs")
-                
-                if content_recs:
-                    for i, rec in enumerate(content_recs[:n_items//2]):  # Lấy một nửa từ content-based
-                        weight = 0.5 * (1.0 - i/len(content_recs) * 0.3)
-                        recommendations.append({
-                            'product_id': int(rec['id']),
-                            'weight': weight,
-                            'reason': 'content',
-                            'source': 'content'
-                        })
-
-                # Get collaborative recommendations
-                logger.info("Getting collaborative recommendations...")
-                collab_recs = self.collaborative.recommend(user_id, n_items=n_items)
-                logger.info(f"Got {len(collab_recs)} collaborative recs")
-                
-                if collab_recs:
-                    for i, rec in enumerate(collab_recs[:n_items//2]):  # Lấy một nửa từ collaborative
-                        weight = 0.4 * (1.0 - i/len(collab_recs) * 0.3)
-                        recommendations.append({
-                            'product_id': int(rec),
-                            'weight': weight,
-                            'reason': 'collaborative',
-                            'source': 'collaborative'
-                        })
-
-                # Get popularity recommendations nếu chưa đủ số lượng
-                if len(recommendations) < n_items:
-                    logger.info("Getting popularity recommendations...")
-                    popular_recs = self.popularity.recommend(limit=n_items//4)  # Lấy 1/4 từ popularity
-                    logger.info(f"Got popularity recs: {popular_recs}")
-                    
-                    if popular_recs:
-                        for i, rec in enumerate(popular_recs):
-                            weight = 0.1 * (1.0 - i/len(popular_recs) * 0.3)
-                            recommendations.append({
-                                'product_id': int(rec['product_id']),
-                                'weight': weight,
-                                'reason': 'popularity',
-                                'source': 'popularity'
-                            })
-
-                # Tạo connection mới và lấy thông tin chi tiết sản phẩm
-                conn = self._get_db_connection()
-                if conn:
-                    try:
-                        product_details = self._get_product_details(conn, [rec['product_id'] for rec in recommendations])
-                        final_recs = self._combine_recommendations(recommendations, n_items, product_details)
-                        logger.info(f"Final recommendations: {len(final_recs)} items")
-                        return final_recs
-                    finally:
-                        conn.close()
+            if user_id or product_id:
+                n_candidates = max(hybrid_config['candidates'], n_items)
+                metadata['mode'] = 'user_product' if user_id and product_id else 'user' if user_id else 'product'
+                results = {}
+                calls = {}
+                # Chỉ có user_id (trang chủ) / product_id (khách chưa đăng nhập): lấy candidate tính
+                # sẵn nếu có, key chưa có trong bảng thì gọi model (song song, có deadline)
+                if product_id:
+                    cached = self.product_candidates.get(product_id, n_candidates) if self.product_candidates is not None else None
+                    if cached is not None:
+                        results['content'] = cached
+                    else:
+                        calls['content'] = lambda: self.content_based.recommend_scored(product_id, n_items=n_candidates)
+                if user_id:
+                    cached = self._cached_user_candidates(user_id, n_candidates)
+                    if cached is not None:
+                        results['collaborative'] = cached
+                    else:
+                        calls['collaborative'] = lambda: self.collaborative.recommend_scored(user_id, n_items=n_candidates)
+                for name, (item_ids, _) in results.items():
+                    metadata['sources'][name] = {'status': 'ok', 'elapsed_ms': 0.0, 'items': len(item_ids), 'cached': True}
+                if calls:
+                    live_results, live_sources = self._fan_out(calls, deadline)
+                    results.update(live_results)
+                    metadata['sources'].update(live_sources)
+                # Popularity đã sắp sẵn lúc fit: lấy trực tiếp đầu danh sách
+                results['popularity'] = self.popularity.top_products(n_candidates)
+                metadata['sources']['popularity'] = {
+                    'status': 'ok', 'elapsed_ms': 0.0, 'items': len(results['popularity'][0]), 'cached': True
+                }
 
-            return []
+                # Nguồn trễ hạn/lỗi -> trọng số của nó chuyển sang popularity tính sẵn (không tốn thêm query)
+                weights = dict(hybrid_config['weights'])
+                failed = [name for name, source in metadata['sources'].items() if source['status'] != 'ok']
+                if failed:
+                    metadata['fallback'] = True
+                    for name in failed:
+                        weights['popularity'] += weights.pop(name)
+                logger.info("Got candidates: " + ", ".join(
+                    f"{name}={len(item_ids)}" for name, (item_ids, _) in results.items()
+                ))
+
+                # Lấy dư candidate phòng sản phẩm không còn trong cache
+                fused_ids, fused_scores, fused_sources = fuse(
+                    results, n_items * 2, weights=weights,
+                    method=hybrid_config['fusion'], rrf_k=hybrid_config['rrf_k']
+                )
+
+                # Lấy thông tin chi tiết sản phẩm từ cache dùng chung
+                details_start = time.perf_counter()
+                product_details = self._get_product_details([int(pid) for pid in fused_ids])
+                metadata['details_ms'] = round((time.perf_counter() - details_start) * 1000, 1)
+                final_recs = self._format_recommendations(
+                    fused_ids, fused_scores, fused_sources, n_items, product_details, exclude=product_id
+                )
+                logger.info(f"Final recommendations: {len(final_recs)} items")
+                metadata['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+                return final_recs, metadata
+
+            metadata['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            return [], metadata
 
         except Exception as e:
             logger.error(f"Error in hybrid recommend: {str(e)}")
             logger.exception("Full traceback:")
-            return []
+            metadata['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            return [], metadata
 
-    def _get_product_details(self, conn, product_ids):
-        """Lấy thông tin chi tiết sản phẩm từ DB"""
-        query = """
-            SELECT 
-                p.id as product_id,
-                p.name,
-                p.image_url,
-                b.name as brand_name,
-                c.name as category_name,
-                COALESCE(pv.min_price, 0) as min_price,
-                COALESCE(pv.max_price, 0) as max_price
-            FROM products p
-            LEFT JOIN brands b ON p.brand_id = b.id 
-            LEFT JOIN categories c ON p.category_id = c.id
-            LEFT JOIN (
-                SELECT 
-                    product_id,
-                    MIN(price) as min_price,
-                    MAX(price) as max_price
-                FROM productvariants
-                GROUP BY product_id
-            ) pv ON p.id = pv.product_id
-            WHERE p.id IN (%s)
-        """ % ','.join(['%s'] * len(product_ids))
-        
-        df = pd.read_sql(query, conn, params=product_ids)
-        return df.set_index('product_id').to_dict('index')
+    def _get_product_details(self, product_ids, conn=None):
+        """Lấy thông tin chi tiết sản phẩm từ cache (miss được lấy bằng 1 query gộp)"""
+        return {
+            card['product_id']: card
+            for card in get_product_cache().get_many(product_ids, conn)
+        }
+
+    @staticmethod
+    def _reason(source, weight):
+        """Reason theo nguồn đóng góp nhiều nhất và điểm đã chuẩn hóa"""
+        if source == 'collaborative':
+            if weight > 0.85:
+                return "Rất phù hợp với sở thích của bạn"
+            elif weight > 0.75:
+                return "Phù hợp với sở thích của bạn"
+            return "Có thể bạn sẽ thích"
+        elif source == 'content':
+            if weight > 0.85:
+                return "Rất tương tự với sản phẩm bạn đang xem"
+            elif weight > 0.75:
+                return "Tương tự với sản phẩm bạn đang xem"
+            return "Sản phẩm liên quan"
+        else:  # popularity
+            if weight > 0.85:
+                return "Đang rất thịnh hành"
+            elif weight > 0.75:
+                return "Đang thịnh hành"
+            return "Được nhiều người quan tâm"
 
-    def _combine_recommendations(self, recommendations, n_items, product_details):
-        """Kết hợp và format kết quả cuối cùng"""
+    def _format_recommendations(self, item_ids, scores, sources, n_items, product_details, exclude=None):
+        """Format top n_items đã gộp (bỏ sản phẩm đang xem và sản phẩm không có thông tin chi tiết)"""
         try:
-            # Tạo dict để lưu product details theo id
-            details_dict = {str(pid): details for pid, details in product_details.items()}
-            
-            # Tính weight cho mỗi sản phẩm và lưu source
-            product_info = {}
-            for rec in recommendations:
-                pid = str(rec['product_id'])
-                if pid not in product_info:
-                    product_info[pid] = {
-                        'weight': rec['weight'],
-                        'source': rec['source']
-                    }
-                else:
-                    # Nếu sản phẩm xuất hiện từ nhiều nguồn, lấy weight cao nhất
-                    if rec['weight'] > product_info[pid]['weight']:
-                        product_info[pid] = {
-                            'weight': rec['weight'],
-                            'source': rec['source']
-                        }
-                    
-            # Chuẩn hóa weights
-            max_weight = max(info['weight'] for info in product_info.values()) if product_info else 1.0
-            for pid in product_info:
-                product_info[pid]['weight'] /= max_weight
-
-            # Format kết quả cuối
+            # Chuẩn hóa điểm theo item cao nhất
+            max_score = scores[0] if len(scores) and scores[0] > 0 else 1.0
             final_recs = []
-            seen_products = set()
-            
-            for rec in recommendations:
-                pid = str(rec['product_id'])
-                
-                if pid in seen_products:
+            for pid, score, source in zip(item_ids.tolist(), (scores / max_score).tolist(), sources):
+                product = product_details.get(pid)
+                if product is None or pid == exclude:
                     continue
-                    
-                seen_products.add(pid)
-                
-                if pid in details_dict:
-                    product = details_dict[pid]
-                    info = product_info[pid]
-                    weight = info['weight']
-                    source = info['source']
-                    
-                    # Xác định reason dựa trên nguồn và weight
-                    if source == 'collaborative':
-                        if weight > 0.85:
-                            reason = "Rất phù hợp với sở thích của bạn"
-                        elif weight > 0.75:
-                            reason = "Phù hợp với sở thích của bạn"
-                        else:
-                            reason = "Có thể bạn sẽ thích"
-                    elif source == 'content':
-                        if weight > 0.85:
-                            reason = "Rất tương tự với sản phẩm bạn đang xem"
-                        elif weight > 0.75:
-                            reason = "Tương tự với sản phẩm bạn đang xem"
-                        else:
-                            reason = "Sản phẩm liên quan"
-                    else:  # popularity
-                        if weight > 0.85:
-                            reason = "Đang rất thịnh hành"
-                        elif weight > 0.75:
-                            reason = "Đang thịnh hành"
-                        else:
-                            reason = "Được nhiều người quan tâm"
-                    
-                    final_recs.append({
-                        'product_id': int(pid),
-                        'name': product['name'],
-                        'image_url': product['image_url'],
-                        'brand_name': product['brand_name'],
-                        'category_name': product['category_name'],
-                        'min_price': float(product['min_price']),
-                        'max_price': float(product['max_price']),
-                        'reason': reason,
-                        'score': round(weight, 2)
-                    })
-                    
-                    if len(final_recs) >= n_items:
-                        break
-                        
+                final_recs.append({
+                    'product_id': pid,
+                    'name': product['name'],
+                    'image_url': product['image_url'],
+                    'brand_name': product['brand_name'],
+                    'category_name': product['category_name'],
+                    'min_price': float(product['min_price']),
+                    'max_price': float(product['max_price']),
+                    'reason': self._reason(source, score),
+                    'score': round(score, 2)
+                })
+                if len(final_recs) >= n_items:
+                    break
             return final_recs
 
         except Exception as e:
-            logger.error(f"Error combining recommendations: {str(e)}")
+            logger.error(f"Error formatting recommendations: {str(e)}")
             logger.exception("Full traceback:")
-            return [] 
\ No newline at end of file
+            return []
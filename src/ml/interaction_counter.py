@@ -0,0 +1,145 @@
+import threading
+import logging
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+class InteractionCounter:
+    """Số tương tác (view, review, order) của từng user, giữ trong bộ nhớ
+
+    Được load bằng 1 query gộp theo user lúc fit, tăng dần theo event từ
+    /api/track và đối soát định kỳ với DB. Kiểm tra ngưỡng là 1 lần tra dict,
+    thay cho query UNION ALL mỗi request.
+    """
+
+    BULK_QUERY = """
+        SELECT user_id, COUNT(*) as interaction_count
+        FROM (
+            SELECT user_id FROM user_product_views
+            UNION ALL
+            SELECT user_id FROM reviews
+            UNION ALL
+            SELECT user_id FROM orders
+        ) interactions
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id
+    """
+
+    # Cặp (user, sản phẩm) đã xem: user_product_views unique theo cặp này, xem lại chỉ
+    # tăng view_count nên không thêm dòng
+    VIEWS_QUERY = """
+        SELECT user_id, product_id
+        FROM user_product_views
+        WHERE user_id IS NOT NULL
+    """
+
+    # Action từ /api/track tương ứng với 1 dòng mới trong các bảng được đếm
+    # (view chỉ tính lần đầu user xem sản phẩm)
+    COUNTED_ACTIONS = {'view', 'review', 'purchase'}
+
+    def __init__(self):
+        self._counts = {}
+        # user_id -> set product_id đã xem
+        self._viewed = {}
+        self._lock = threading.Lock()
+        # Event nhận được trong lúc đang load lại từ DB, cộng lại sau khi swap
+        self._pending = None
+        self._pending_views = None
+        self.loaded_at = None
+        self.last_load_duration = None
+        self.last_drift = None
+
+    @property
+    def is_loaded(self):
+        return self.loaded_at is not None
+
+    def load(self, conn):
+        """Load lại toàn bộ số đếm từ DB (1 query) rồi swap; trả về số user lệch so với bản cũ"""
+        start = time.time()
+        with self._lock:
+            self._pending = {}
+            self._pending_views = set()
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self.BULK_QUERY)
+            counts = {int(user_id): int(count) for user_id, count in cursor.fetchall()}
+            cursor.execute(self.VIEWS_QUERY)
+            viewed = {}
+            for user_id, product_id in cursor.fetchall():
+                viewed.setdefault(int(user_id), set()).add(int(product_id))
+            cursor.close()
+        except Exception:
+            with self._lock:
+                self._pending = None
+                self._pending_views = None
+            raise
+
+        with self._lock:
+            # Event trong lúc query có thể đã nằm trong kết quả DB; cộng lại có thể
+            # đếm dư vài tương tác, lần đối soát sau sẽ sửa
+            for user_id, n in self._pending.items():
+                counts[user_id] = counts.get(user_id, 0) + n
+            # View chưa có trong kết quả DB mới được cộng (khớp đúng với DB)
+            for user_id, product_id in self._pending_views:
+                products = viewed.setdefault(user_id, set())
+                if product_id not in products:
+                    products.add(product_id)
+                    counts[user_id] = counts.get(user_id, 0) + 1
+            self._pending = None
+            self._pending_views = None
+            drift = sum(1 for user_id in counts.keys() | self._counts.keys()
+                        if self._counts.get(user_id) != counts.get(user_id))
+            self._counts = counts
+            self._viewed = viewed
+
+        self.last_drift = drift if self.is_loaded else None
+        self.loaded_at = datetime.now()
+        self.last_load_duration = round(time.time() - start, 3)
+        logger.info(
+            f"Loaded interaction counts for {len(counts)} users in {self.last_load_duration}s"
+            + (f" ({drift} users reconciled)" if self.last_drift is not None else "")
+        )
+        return drift
+
+    def increment(self, user_id, n=1):
+        user_id = int(user_id)
+        with self._lock:
+            self._counts[user_id] = self._counts.get(user_id, 0) + n
+            if self._pending is not None:
+                self._pending[user_id] = self._pending.get(user_id, 0) + n
+
+    def record_event(self, user_id, product_id, action):
+        """Cập nhật theo event /api/track; bỏ qua action không được lưu vào các bảng đếm
+
+        View chỉ được đếm lần đầu user xem sản phẩm, giống số dòng user_product_views.
+        """
+        if action not in self.COUNTED_ACTIONS:
+            return
+        if action != 'view':
+            self.increment(user_id)
+            return
+        user_id, product_id = int(user_id), int(product_id)
+        with self._lock:
+            products = self._viewed.setdefault(user_id, set())
+            if product_id in products:
+                return
+            products.add(product_id)
+            self._counts[user_id] = self._counts.get(user_id, 0) + 1
+            if self._pending_views is not None:
+                self._pending_views.add((user_id, product_id))
+
+    def count(self, user_id):
+        return self._counts.get(int(user_id), 0)
+
+    def has_min_interactions(self, user_id, min_interactions):
+        return self._counts.get(int(user_id), 0) >= min_interactions
+
+    def stats(self):
+        return {
+            'users': len(self._counts),
+            'loaded_at': self.loaded_at.isoformat() if self.loaded_at else None,
+            'last_load_duration': self.last_load_duration,
+            'last_drift': self.last_drift
+        }
@@ -0,0 +1,262 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, coo_matrix
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def grow_buffer(buffer, size):
+    """Trả về buffer có sức chứa >= size (nhân đôi khi thiếu) để append hàng O(1) amortized"""
+    if len(buffer) >= size:
+        return buffer
+    new_buffer = np.zeros((max(size, 2 * len(buffer), 16),) + buffer.shape[1:], dtype=buffer.dtype)
+    new_buffer[:len(buffer)] = buffer
+    return new_buffer
+
+
+class InteractionStore:
+    """Ma trận user-item dạng CSR kèm map id -> hàng/cột liên tục (int32)
+
+    Các ô mới (chưa có trong cấu trúc CSR) được giữ trong một buffer nhỏ theo
+    từng hàng/cột và gộp vào CSR khi gọi compact(), nên không bao giờ cần
+    dựng ma trận dense U x I.
+    """
+
+    def __init__(self, matrix=None, user_ids=None, item_ids=None, compact_threshold=10000):
+        if matrix is None:
+            matrix = csr_matrix((0, 0), dtype=np.float64)
+        self._matrix = csr_matrix(matrix, dtype=np.float64)
+        self._matrix.sum_duplicates()
+        self._matrix.sort_indices()
+
+        user_ids = np.asarray(user_ids if user_ids is not None else [], dtype=np.int32)
+        item_ids = np.asarray(item_ids if item_ids is not None else [], dtype=np.int32)
+        self.n_users = len(user_ids)
+        self.n_items = len(item_ids)
+        self._user_ids = user_ids.copy()
+        self._item_ids = item_ids.copy()
+        self._user_index = {int(uid): idx for idx, uid in enumerate(user_ids)}
+        self._item_index = {int(iid): idx for idx, iid in enumerate(item_ids)}
+
+        self._row_sums = grow_buffer(np.asarray(self._matrix.sum(axis=1)).ravel(), self.n_users)
+        self._nnz = int(self._matrix.count_nonzero())
+
+        # Các ô nằm ngoài cấu trúc CSR hiện tại: {row: {col: value}} và {col: {row: value}}
+        self._pending_rows = {}
+        self._pending_cols = {}
+        self._pending_count = 0
+        self.compact_threshold = compact_threshold
+
+    @classmethod
+    def from_interactions(cls, user_ids, item_ids, values, **kwargs):
+        """Tạo store từ 3 mảng song song (user_id, item_id, value)"""
+        user_ids = np.asarray(user_ids)
+        item_ids = np.asarray(item_ids)
+        unique_users, rows = np.unique(user_ids, return_inverse=True)
+        unique_items, cols = np.unique(item_ids, return_inverse=True)
+
+        matrix = coo_matrix(
+            (np.asarray(values, dtype=np.float64), (rows.astype(np.int32), cols.astype(np.int32))),
+            shape=(len(unique_users), len(unique_items))
+        ).tocsr()
+        return cls(matrix, unique_users, unique_items, **kwargs)
+
+    # ------------------------------------------------------------------ #
+    # Id maps
+    # ------------------------------------------------------------------ #
+    @property
+    def shape(self):
+        return (self.n_users, self.n_items)
+
+    @property
+    def nnz(self):
+        return self._nnz
+
+    @property
+    def user_ids(self):
+        return self._user_ids[:self.n_users]
+
+    @property
+    def item_ids(self):
+        return self._item_ids[:self.n_items]
+
+    def user_index(self, user_id):
+        """Hàng của user trong ma trận, None nếu chưa có"""
+        return self._user_index.get(int(user_id))
+
+    def item_index(self, item_id):
+        """Cột của item trong ma trận, None nếu chưa có"""
+        return self._item_index.get(int(item_id))
+
+    def has_user(self, user_id):
+        return int(user_id) in self._user_index
+
+    def has_item(self, item_id):
+        return int(item_id) in self._item_index
+
+    def add_user(self, user_id):
+        """Thêm user mới (hàng rỗng), trả về index"""
+        user_id = int(user_id)
+        if user_id in self._user_index:
+            return self._user_index[user_id]
+        idx = self.n_users
+        self._user_ids = grow_buffer(self._user_ids, idx + 1)
+        self._row_sums = grow_buffer(self._row_sums, idx + 1)
+        self._user_ids[idx] = user_id
+        self._row_sums[idx] = 0.0
+        self._user_index[user_id] = idx
+        self.n_users += 1
+        return idx
+
+    def add_item(self, item_id):
+        """Thêm item mới (cột rỗng), trả về index"""
+        item_id = int(item_id)
+        if item_id in self._item_index:
+            return self._item_index[item_id]
+        idx = self.n_items
+        self._item_ids = grow_buffer(self._item_ids, idx + 1)
+        self._item_ids[idx] = item_id
+        self._item_index[item_id] = idx
+        self.n_items += 1
+        return idx
+
+    # ------------------------------------------------------------------ #
+    # Truy cập ô / hàng / cột
+    # ------------------------------------------------------------------ #
+    def _base_position(self, row, col):
+        """Vị trí của ô trong mảng data của CSR, None nếu ô không có trong cấu trúc"""
+        if row >= self._matrix.shape[0] or col >= self._matrix.shape[1]:
+            return None
+        start, end = self._matrix.indptr[row], self._matrix.indptr[row + 1]
+        pos = start + np.searchsorted(self._matrix.indices[start:end], col)
+        if pos < end and self._matrix.indices[pos] == col:
+            return pos
+        return None
+
+    def get(self, row, col):
+        pos = self._base_position(row, col)
+        if pos is not None:
+            return float(self._matrix.data[pos])
+        return self._pending_rows.get(row, {}).get(col, 0.0)
+
+    def set(self, row, col, value):
+        """Gán giá trị cho ô (row, col)"""
+        value = float(value)
+        old_value = self.get(row, col)
+
+        pos = self._base_position(row, col)
+        if pos is not None:
+            self._matrix.data[pos] = value
+        else:
+            if col not in self._pending_rows.setdefault(row, {}):
+                self._pending_count += 1
+            self._pending_rows[row][col] = value
+            self._pending_cols.setdefault(col, {})[row] = value
+
+        self._row_sums[row] += value - old_value
+        self._nnz += int(value != 0) - int(old_value != 0)
+
+        if self._pending_count >= self.compact_threshold:
+            self.compact()
+
+    def user_row(self, row):
+        """(indices, values) các item có giá trị khác 0 của 1 user"""
+        if row < self._matrix.shape[0]:
+            start, end = self._matrix.indptr[row], self._matrix.indptr[row + 1]
+            indices = self._matrix.indices[start:end]
+            values = self._matrix.data[start:end]
+        else:
+            indices = np.empty(0, dtype=np.int32)
+            values = np.empty(0, dtype=np.float64)
+
+        pending = self._pending_rows.get(row)
+        if pending:
+            indices = np.concatenate([indices, np.fromiter(pending.keys(), dtype=np.int32)])
+            values = np.concatenate([values, np.fromiter(pending.values(), dtype=np.float64)])
+
+        nonzero = values != 0
+        return indices[nonzero], values[nonzero]
+
+    def item_column(self, col):
+        """(indices, values) các user có giá trị khác 0 của 1 item"""
+        if col < self._matrix.shape[1]:
+            column = self._matrix.getcol(col).tocoo()
+            indices, values = column.row.astype(np.int32), column.data
+        else:
+            indices = np.empty(0, dtype=np.int32)
+            values = np.empty(0, dtype=np.float64)
+
+        pending = self._pending_cols.get(col)
+        if pending:
+            indices = np.concatenate([indices, np.fromiter(pending.keys(), dtype=np.int32)])
+            values = np.concatenate([values, np.fromiter(pending.values(), dtype=np.float64)])
+
+        nonzero = values != 0
+        return indices[nonzero], values[nonzero]
+
+    def user_vector(self, row):
+        """Vector dense độ dài n_items của 1 user (chỉ 1 hàng)"""
+        vector = np.zeros(self.n_items)
+        indices, values = self.user_row(row)
+        vector[indices] = values
+        return vector
+
+    def row_means(self):
+        """Trung bình mỗi hàng tính cả các ô 0 (giống pivot().fillna(0).mean(axis=1))"""
+        return self._row_sums[:self.n_users] / max(1, self.n_items)
+
+    def row_nnz(self):
+        """Số item có tương tác của mỗi user"""
+        return np.diff(self.tocsr().indptr)
+
+    def sparsity(self):
+        """Tỷ lệ % ô không có tương tác"""
+        total_cells = self.n_users * self.n_items
+        if total_cells == 0:
+            return 0
+        return round((total_cells - self._nnz) / total_cells * 100, 2)
+
+    # ------------------------------------------------------------------ #
+    # Gộp / xuất dữ liệu
+    # ------------------------------------------------------------------ #
+    def compact(self):
+        """Gộp các ô pending vào CSR và mở rộng shape theo user/item mới"""
+        if self._pending_count == 0 and self._matrix.shape == self.shape:
+            return self._matrix
+
+        base = self._matrix.tocoo()
+        rows = [base.row]
+        cols = [base.col]
+        data = [base.data]
+        for row, entries in self._pending_rows.items():
+            rows.append(np.full(len(entries), row, dtype=np.int32))
+            cols.append(np.fromiter(entries.keys(), dtype=np.int32))
+            data.append(np.fromiter(entries.values(), dtype=np.float64))
+
+        self._matrix = coo_matrix(
+            (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+            shape=self.shape
+        ).tocsr()
+        self._matrix.eliminate_zeros()
+        self._matrix.sort_indices()
+        self._nnz = int(self._matrix.nnz)
+
+        self._pending_rows = {}
+        self._pending_cols = {}
+        self._pending_count = 0
+        logger.debug(f"Compacted interaction store: shape {self.shape}, nnz {self._nnz}")
+        return self._matrix
+
+    def tocsr(self):
+        """CSR đầy đủ (đã gộp pending), shape = (n_users, n_items)"""
+        return self.compact()
+
+    def to_dataframe(self, max_users=None, max_items=None):
+        """DataFrame dense (user_id x item_id) - chỉ dùng cho phân tích/visualize trên mẫu nhỏ"""
+        matrix = self.tocsr()[:max_users, :max_items]
+        return pd.DataFrame(
+            matrix.toarray(),
+            index=self.user_ids[:max_users],
+            columns=self.item_ids[:max_items]
+        )
@@ -0,0 +1,145 @@
+import threading
+import logging
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+class ModelHolder:
+    """Giữ version model đang phục vụ, train version mới ở background rồi swap
+
+    Version đang phục vụ được lưu trong một tuple duy nhất
+    (model, version, published_at, trained_from) và chỉ bị thay bằng một phép
+    gán tham chiếu, nên request luôn thấy trọn vẹn version cũ hoặc version mới.
+    Model đã publish không bao giờ bị sửa tại chỗ.
+    """
+
+    def __init__(self, name, train_fn):
+        self.name = name
+        self._train_fn = train_fn
+        self._published = None
+        self._publish_lock = threading.Lock()
+        self._train_lock = threading.Lock()
+        self.training_started_at = None
+        self.last_error = None
+        self.last_failed_at = None
+        self.last_train_duration = None
+        # True: holder chỉ nhận version được publish từ bên ngoài (vd. worker
+        # load từ release), không tự train
+        self.read_only = False
+
+    def get(self):
+        """Model đang phục vụ (None nếu chưa có version nào)"""
+        published = self._published
+        return published[0] if published else None
+
+    @property
+    def version(self):
+        published = self._published
+        return published[1] if published else None
+
+    @property
+    def published_at(self):
+        published = self._published
+        return published[2] if published else None
+
+    @property
+    def trained_from(self):
+        """Thời điểm bắt đầu load dữ liệu cho version đang phục vụ"""
+        published = self._published
+        return published[3] if published else None
+
+    @property
+    def is_ready(self):
+        return self._published is not None
+
+    @property
+    def is_training(self):
+        return self._train_lock.locked()
+
+    def age(self):
+        """Số giây kể từ lúc load dữ liệu cho version đang phục vụ (None nếu chưa có)"""
+        trained_from = self.trained_from
+        if trained_from is None:
+            return None
+        return (datetime.now() - trained_from).total_seconds()
+
+    def publish(self, model, trained_from=None, expected_version=None):
+        """Swap nguyên tử sang model mới, trả về version mới
+
+        Nếu truyền expected_version mà version hiện tại đã khác (vd. vừa có bản
+        train lại được publish) thì không swap và trả về None.
+        """
+        with self._publish_lock:
+            if expected_version is not None and self.version != expected_version:
+                return None
+            version = (self.version or 0) + 1
+            self._published = (model, version, datetime.now(), trained_from or datetime.now())
+        logger.info(f"Published {self.name} model version {version}")
+        return version
+
+    def train(self, wait=False):
+        """Train version mới (đồng bộ) rồi publish
+
+        Chỉ 1 lượt train chạy tại một thời điểm (single-flight). Nếu đang có
+        lượt train khác: wait=False thì bỏ qua và trả về False, wait=True thì
+        chờ lượt đó xong và trả về is_ready thay vì train thêm lần nữa.
+        """
+        if self.read_only:
+            logger.info(f"{self.name} model holder is read-only, skipping training")
+            return self.is_ready if wait else False
+        if not self._train_lock.acquire(blocking=False):
+            if not wait:
+                logger.info(f"{self.name} model is already training, skipping")
+                return False
+            with self._train_lock:
+                return self.is_ready
+        try:
+            self.training_started_at = datetime.now()
+            start = time.time()
+            model = self._train_fn()
+            self.last_train_duration = round(time.time() - start, 3)
+            self.publish(model, trained_from=self.training_started_at)
+            self.last_error = None
+            return True
+        except Exception as e:
+            self.last_error = str(e)
+            self.last_failed_at = datetime.now()
+            logger.error(f"Error training {self.name} model: {str(e)}")
+            logger.exception("Full traceback:")
+            return False
+        finally:
+            self.training_started_at = None
+            self._train_lock.release()
+
+    def train_async(self):
+        """Train ở background thread; request vẫn dùng version cũ cho tới khi swap"""
+        if self.is_training:
+            return False
+        threading.Thread(target=self.train, name=f"train-{self.name}", daemon=True).start()
+        return True
+
+    def refresh(self, soft_ttl, retry_interval=60):
+        """Stale-while-revalidate: version quá soft_ttl thì train lại ở background
+
+        Request vẫn nhận version cũ ngay lập tức. Sau một lượt train lỗi thì
+        chờ retry_interval giây mới thử lại, tránh dồn tải lên DB.
+        """
+        age = self.age()
+        if self.read_only or age is None or age <= soft_ttl or self.is_training:
+            return False
+        if self.last_failed_at and (datetime.now() - self.last_failed_at).total_seconds() < retry_interval:
+            return False
+        return self.train_async()
+
+    def status(self):
+        age = self.age()
+        return {
+            'version': self.version,
+            'published_at': self.published_at.isoformat() if self.published_at else None,
+            'age': round(age, 1) if age is not None else None,
+            'training': self.is_training,
+            'read_only': self.read_only,
+            'last_train_duration': self.last_train_duration,
+            'last_error': self.last_error
+        }
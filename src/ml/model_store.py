@@ -0,0 +1,277 @@
+import os
+import json
+import shutil
+import threading
+import logging
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, issparse
+import config
+
+logger = logging.getLogger(__name__)
+
+# Tăng khi định dạng artifact thay đổi; artifact khác version bị bỏ qua (train lại từ DB)
+ARTIFACT_FORMAT_VERSION = 1
+
+def encode_strings(values):
+    """Cột chuỗi -> (blob UTF-8 uint8, offsets int64, mask null) để lưu .npy mmap được"""
+    encoded = [value.encode('utf-8') if isinstance(value, str) else b'' for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    nulls = np.array([not isinstance(value, str) for value in values], dtype=bool)
+    return blob, offsets, nulls
+
+def decode_strings(blob, offsets, nulls):
+    """Ngược lại của encode_strings, trả về mảng object"""
+    data = np.asarray(blob).tobytes()
+    values = np.empty(len(offsets) - 1, dtype=object)
+    values[:] = [data[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+    values[np.asarray(nulls)] = None
+    return values
+
+def frame_to_arrays(df, prefix):
+    """DataFrame -> (dict mảng, spec cột) cho artifact; chuỗi/Decimal/datetime được chuyển sang dạng số"""
+    arrays, columns = {}, []
+    for i, name in enumerate(df.columns):
+        key = f"{prefix}{i}"
+        column = df[name]
+        if pd.api.types.is_datetime64_any_dtype(column):
+            arrays[key] = column.to_numpy(dtype='datetime64[ns]').view(np.int64)
+            kind = 'datetime'
+        elif pd.api.types.is_bool_dtype(column) or pd.api.types.is_numeric_dtype(column):
+            arrays[key] = column.to_numpy()
+            kind = 'numeric'
+        else:
+            values = column.to_numpy(dtype=object)
+            is_text = all(isinstance(value, str) or value is None or value is pd.NA or
+                          (isinstance(value, float) and np.isnan(value)) for value in values)
+            if not is_text:
+                # Decimal từ MySQL (AVG, SUM...) -> float
+                numeric = pd.to_numeric(column, errors='coerce')
+                if numeric.notna().sum() == column.notna().sum():
+                    arrays[key] = numeric.to_numpy(dtype=np.float64)
+                    columns.append({'name': name, 'key': key, 'kind': 'numeric'})
+                    continue
+                values = np.array([str(value) if value is not None else None for value in values], dtype=object)
+            arrays[f"{key}_blob"], arrays[f"{key}_offsets"], arrays[f"{key}_nulls"] = encode_strings(values)
+            kind = 'string'
+        columns.append({'name': name, 'key': key, 'kind': kind})
+    return arrays, {'columns': columns}
+
+def frame_from_arrays(arrays, spec):
+    """Dựng lại DataFrame từ frame_to_arrays"""
+    data = {}
+    for column in spec['columns']:
+        key = column['key']
+        if column['kind'] == 'datetime':
+            data[column['name']] = pd.to_datetime(np.asarray(arrays[key]).view('datetime64[ns]'))
+        elif column['kind'] == 'string':
+            data[column['name']] = decode_strings(
+                arrays[f"{key}_blob"], arrays[f"{key}_offsets"], arrays[f"{key}_nulls"]
+            )
+        else:
+            data[column['name']] = np.asarray(arrays[key])
+    return pd.DataFrame(data)
+
+def _timestamp(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+class ArtifactStore:
+    """Lưu/load model đã train dưới dạng artifact có version trên đĩa
+
+    Mỗi version là 1 thư mục <root>/<name>/<version>/ gồm manifest.json và
+    1 file .npy cho mỗi mảng (ma trận CSR = 3 file data/indices/indptr), nên
+    khi load có thể mmap (np.load(mmap_mode='r')) thay vì đọc toàn bộ vào RAM.
+    File <root>/<name>/CURRENT trỏ tới version mới nhất và được thay nguyên tử.
+
+    Model cần có to_artifact() -> (arrays, meta) và classmethod
+    from_artifact(arrays, meta); meta phải serialize được bằng JSON.
+    """
+
+    def __init__(self, root, keep_versions=3, mmap=True):
+        self.root = root
+        self.keep_versions = keep_versions
+        self.mmap = mmap
+
+    def _model_dir(self, name):
+        return os.path.join(self.root, name)
+
+    def current_version(self, name):
+        try:
+            with open(os.path.join(self._model_dir(name), 'CURRENT')) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def versions(self, name):
+        """Các version đã lưu, cũ -> mới"""
+        model_dir = self._model_dir(name)
+        if not os.path.isdir(model_dir):
+            return []
+        return sorted(
+            entry for entry in os.listdir(model_dir)
+            if not entry.startswith('.') and os.path.isfile(os.path.join(model_dir, entry, 'manifest.json'))
+        )
+
+    def manifest(self, name, version=None):
+        version = version or self.current_version(name)
+        if version is None:
+            return None
+        try:
+            with open(os.path.join(self._model_dir(name), version, 'manifest.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, name, model, trained_from=None):
+        """Ghi 1 version mới cho model và trỏ CURRENT tới nó; trả về tên version"""
+        start = time.time()
+        arrays, meta = model.to_artifact()
+        version = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+        model_dir = self._model_dir(name)
+        tmp_dir = os.path.join(model_dir, f".{version}.tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        try:
+            entries = {}
+            for key, value in arrays.items():
+                if value is None:
+                    continue
+                if issparse(value):
+                    value = csr_matrix(value)
+                    entries[key] = {'type': 'csr', 'shape': list(value.shape), 'parts': {}}
+                    for part in ('data', 'indices', 'indptr'):
+                        file_name = f"{key}.{part}.npy"
+                        array = getattr(value, part)
+                        np.save(os.path.join(tmp_dir, file_name), array)
+                        entries[key]['parts'][part] = {
+                            'file': file_name, 'dtype': str(array.dtype), 'shape': list(array.shape)
+                        }
+                else:
+                    array = np.asarray(value)
+                    file_name = f"{key}.npy"
+                    np.save(os.path.join(tmp_dir, file_name), array, allow_pickle=False)
+                    entries[key] = {
+                        'type': 'ndarray', 'file': file_name,
+                        'dtype': str(array.dtype), 'shape': list(array.shape)
+                    }
+
+            manifest = {
+                'format_version': ARTIFACT_FORMAT_VERSION,
+                'name': name,
+                'class': type(model).__name__,
+                'version': version,
+                'created_at': datetime.now().isoformat(),
+                'trained_from': _timestamp(trained_from),
+                'arrays': entries,
+                'meta': meta
+            }
+            with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f, default=_timestamp)
+
+            os.rename(tmp_dir, os.path.join(model_dir, version))
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        # Đổi CURRENT nguyên tử: process khác đọc được version cũ hoặc mới, không bao giờ file dở
+        current_tmp = os.path.join(model_dir, '.CURRENT.tmp')
+        with open(current_tmp, 'w') as f:
+            f.write(version)
+        os.replace(current_tmp, os.path.join(model_dir, 'CURRENT'))
+        self._prune(name)
+
+        logger.info(f"Saved {name} artifact {version} ({len(entries)} arrays) in {time.time() - start:.2f}s")
+        return version
+
+    def _load_array(self, version_dir, entry):
+        mmap_mode = 'r' if self.mmap and int(np.prod(entry['shape'])) > 0 else None
+        array = np.load(os.path.join(version_dir, entry['file']), mmap_mode=mmap_mode, allow_pickle=False)
+        if list(array.shape) != entry['shape'] or str(array.dtype) != entry['dtype']:
+            raise ValueError(f"Array {entry['file']} does not match manifest")
+        return array
+
+    def load(self, name, model_cls, version=None):
+        """Load version hiện tại (mmap) thành model; trả về (model, manifest) hoặc None"""
+        start = time.time()
+        manifest = self.manifest(name, version)
+        if manifest is None:
+            return None
+        if manifest.get('format_version') != ARTIFACT_FORMAT_VERSION or manifest.get('class') != model_cls.__name__:
+            logger.warning(f"Ignoring incompatible {name} artifact {manifest.get('version')}")
+            return None
+
+        version_dir = os.path.join(self._model_dir(name), manifest['version'])
+        arrays = {}
+        for key, entry in manifest['arrays'].items():
+            if entry['type'] == 'csr':
+                parts = {part: self._load_array(version_dir, info) for part, info in entry['parts'].items()}
+                # Dùng thẳng mảng mmap, không copy (scipy giữ nguyên khi dtype hợp lệ)
+                arrays[key] = csr_matrix(
+                    (parts['data'], parts['indices'], parts['indptr']), shape=tuple(entry['shape']), copy=False
+                )
+            else:
+                arrays[key] = self._load_array(version_dir, entry)
+
+        model = model_cls.from_artifact(arrays, manifest['meta'])
+        logger.info(f"Loaded {name} artifact {manifest['version']} in {time.time() - start:.3f}s")
+        return model, manifest
+
+    def _prune(self, name):
+        """Giữ keep_versions version mới nhất (file đang được mmap vẫn đọc được sau khi xóa)"""
+        keep = {self.current_version(name)}
+        release = self.read_release()
+        if release is not None:
+            # Version đang được các worker dùng theo release hiện tại
+            keep.add(release['versions'].get(name))
+        for version in self.versions(name)[:-self.keep_versions or None]:
+            if version not in keep:
+                shutil.rmtree(os.path.join(self._model_dir(name), version), ignore_errors=True)
+
+    def read_release(self):
+        """Release hiện tại (bộ version các model được phục vụ cùng nhau), None nếu chưa có"""
+        try:
+            with open(os.path.join(self.root, 'RELEASE')) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def publish_release(self, versions, activate_delay=0.0):
+        """Ghi release mới ghim versions = {name: version}; trả về release
+
+        Các process phục vụ load trước các version này rồi cùng swap tại activate_at,
+        nên mọi worker chuyển sang bộ model mới gần như cùng lúc.
+        """
+        previous = self.read_release()
+        release = {
+            'generation': (previous['generation'] if previous else 0) + 1,
+            'versions': dict(versions),
+            'created_at': time.time(),
+            'activate_at': time.time() + activate_delay
+        }
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, '.RELEASE.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(release, f)
+        os.replace(tmp_path, os.path.join(self.root, 'RELEASE'))
+        logger.info(f"Published release {release['generation']}: {release['versions']}")
+        return release
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_artifact_store():
+    """Artifact store dùng chung cho toàn process (cấu hình từ config.ARTIFACT_CONFIG)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ArtifactStore(
+                    config.ARTIFACT_CONFIG['root'],
+                    keep_versions=config.ARTIFACT_CONFIG['keep_versions'],
+                    mmap=config.ARTIFACT_CONFIG['mmap']
+                )
+    return _store
@@ -0,0 +1,138 @@
+# src/ml/popularity_analytics.py
+"""Biểu đồ phân tích popularity (matplotlib, seaborn, plotly)
+
+Tách khỏi popularity_recommender.py và app.py để đường phục vụ request không phải
+import các thư viện vẽ: module này chỉ được import khi gọi hàm analytics.
+"""
+import matplotlib.pyplot as plt
+import seaborn as sns
+import plotly.express as px
+import plotly.graph_objects as go
+
+def plot_analytics(recommendations):
+    """Tạo dashboard phân tích (matplotlib/seaborn), lưu popularity_analytics.png"""
+    
+    # Set up the matplotlib figure
+    plt.style.use('seaborn')
+    fig = plt.figure(figsize=(20, 12))
+    
+    # 1. Popularity Score Distribution
+    plt.subplot(2, 3, 1)
+    sns.histplot(data=recommendations, x='popularity_score', bins=20)
+    plt.title('Phân phối Popularity Score')
+    
+    # 2. Top 10 Popular Products
+    plt.subplot(2, 3, 2)
+    top_10 = recommendations.head(10)
+    sns.barplot(data=top_10, y='name', x='popularity_score')
+    plt.title('Top 10 Sản phẩm phổ biến nhất')
+    
+    # 3. Category Distribution
+    plt.subplot(2, 3, 3)
+    category_counts = recommendations['category_name'].value_counts()
+    plt.pie(category_counts.values, labels=category_counts.index, autopct='%1.1f%%')
+    plt.title('Phân phối theo danh mục')
+    
+    # 4. Metrics Correlation
+    plt.subplot(2, 3, 4)
+    metrics = ['total_views', 'sold_count', 'unique_viewers', 'avg_rating']
+    sns.heatmap(recommendations[metrics].corr(), annot=True, cmap='coolwarm')
+    plt.title('Tương quan giữa các metrics')
+    
+    # 5. Views vs Sales
+    plt.subplot(2, 3, 5)
+    plt.scatter(recommendations['total_views'], 
+               recommendations['sold_count'])
+    plt.xlabel('Tổng lượt xem')
+    plt.ylabel('Số lượng bán')
+    plt.title('Mối quan hệ Views - Sales')
+    
+    # 6. Price Distribution
+    plt.subplot(2, 3, 6)
+    sns.boxplot(data=recommendations, y='category_name', x='min_price')
+    plt.title('Phân phối giá theo danh mục')
+    
+    plt.tight_layout()
+    plt.savefig('popularity_analytics.png')
+    plt.show()
+
+def create_interactive_dashboard(recommendations):
+    """Tạo dashboard tương tác với Plotly"""
+    
+    # 1. Popularity Score Distribution
+    fig1 = px.histogram(recommendations, 
+                       x='popularity_score',
+                       title='Phân phối Popularity Score')
+    
+    # 2. Top Products
+    fig2 = px.bar(recommendations.head(10),
+                  x='name', y='popularity_score',
+                  title='Top 10 Sản phẩm phổ biến nhất')
+    
+    # 3. Category Distribution
+    fig3 = px.pie(recommendations,
+                  names='category_name',
+                  title='Phân phối theo danh mục')
+    
+    # 4. Metrics Scatter Plot
+    fig4 = px.scatter(recommendations,
+                     x='total_views', y='sold_count',
+                     size='popularity_score',
+                     color='category_name',
+                     hover_data=['name'],
+                     title='Phân tích đa chiều Metrics')
+    
+    # Show all plots
+    fig1.show()
+    fig2.show()
+    fig3.show()
+    fig4.show()
+
+def show_analytics(recommendations):
+    """Figure analytics cho /api/analytics/popularity (hiển thị trong cửa sổ mới)"""
+    # Tạo figure với subplot layout
+    plt.style.use('seaborn')  # Sử dụng style đẹp hơn
+    fig = plt.figure(figsize=(20, 12))
+    
+    # 1. Phân phối Popularity Score
+    plt.subplot(2, 3, 1)
+    sns.histplot(data=recommendations, x='popularity_score', bins=20)
+    plt.title('Phân phối Popularity Score', fontsize=12, pad=10)
+    
+    # 2. Top 10 sản phẩm phổ biến
+    plt.subplot(2, 3, 2)
+    top_10 = recommendations.head(10)
+    sns.barplot(data=top_10, y='name', x='popularity_score')
+    plt.title('Top 10 Sản phẩm phổ biến nhất', fontsize=12, pad=10)
+    
+    # 3. Ph��n phối theo danh mục
+    plt.subplot(2, 3, 3)
+    category_counts = recommendations['category_name'].value_counts()
+    plt.pie(category_counts.values, labels=category_counts.index, autopct='%1.1f%%')
+    plt.title('Phân phối theo danh mục', fontsize=12, pad=10)
+    
+    # 4. Tương quan giữa các metrics
+    plt.subplot(2, 3, 4)
+    metrics = ['total_views', 'sold_count', 'unique_viewers', 'avg_rating']
+    sns.heatmap(recommendations[metrics].corr(), annot=True, cmap='coolwarm')
+    plt.title('Tương quan giữa các metrics', fontsize=12, pad=10)
+    
+    # 5. Mối quan hệ Views - Sales
+    plt.subplot(2, 3, 5)
+    plt.scatter(recommendations['total_views'], 
+               recommendations['sold_count'],
+               alpha=0.6)
+    plt.xlabel('Tổng lượt xem')
+    plt.ylabel('Số lượng bán')
+    plt.title('Mối quan hệ Views - Sales', fontsize=12, pad=10)
+    
+    # 6. Phân phối giá theo danh mục
+    plt.subplot(2, 3, 6)
+    sns.boxplot(data=recommendations, y='category_name', x='min_price')
+    plt.title('Phân phối giá theo danh mục', fontsize=12, pad=10)
+    
+    # Điều chỉnh layout
+    plt.tight_layout()
+    
+    # Hiển thị figure trong cửa sổ mới
+    plt.show()
@@ -1,22 +1,60 @@
 # src/ml/popularity_recommender.py
+import threading
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import MinMaxScaler
 from datetime import datetime
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-import matplotlib.pyplot as plt
-import seaborn as sns
-import plotly.express as px
-import plotly.graph_objects as go
+from model_store import frame_to_arrays, frame_from_arrays
+import config
 
 class PopularityRecommender:
+    # Phân khúc giá theo min_price: (từ, đến, tên)
+    PRICE_SEGMENTS = [
+        (0, 2000000, 'Phổ thông'),
+        (2000000, 5000000, 'Tầm trung thấp'),
+        (5000000, 15000000, 'Tầm trung cao'),
+        (15000000, float('inf'), 'Cao cấp')
+    ]
+    PRICE_BOUNDS = np.array([min_p for min_p, _, _ in PRICE_SEGMENTS], dtype=np.float64)
+    # Thứ tự duyệt phân khúc khi đa dạng hóa (mã = index trong PRICE_SEGMENTS)
+    SEGMENT_ORDER = [3, 2, 1, 0]
+    MAX_PER_SEGMENT = 2
+    # Trọng số các metric (đã chuẩn hóa min-max) trong popularity_score
+    SCORE_WEIGHTS = {
+        'total_views': 0.25,
+        'sold_count': 0.20,
+        'unique_viewers': 0.15,
+        'avg_rating': 0.15,
+        'recency': 0.15,
+        'review_count': 0.10
+    }
+
     def __init__(self):
         self.recommendations = None
         self.products_df = None
         self.tfidf_matrix = None
         self.feature_names = None
         self.last_train_time = None
+        self.segment_codes = None
+        self.category_codes = None
+        self.brand_codes = None
+        self.reason_codes = None
+        self._diverse_results = []
+        # Index cho bộ lọc: tên -> mã và posting list (row id theo thứ tự popularity) mỗi mã
+        self.category_lookup = {}
+        self.category_postings = []
+        self.brand_lookup = {}
+        self.brand_postings = []
+        self.prices = None
+        self.price_order = None
+        self.sorted_prices = None
+        self.filter_cache_size = config.POPULARITY_CONFIG['filter_cache_size']
+        self.scan_chunk = config.POPULARITY_CONFIG['scan_chunk']
+        self._filter_cache = OrderedDict()
+        self._filter_cache_lock = threading.Lock()
         
     def fit(self, conn):
         """Train model với data từ DB"""
@@ -85,13 +123,7 @@ class PopularityRecommender:
             print("\nMetrics summary:")
             print(products_df[['unique_viewers', 'total_views', 'sold_count']].describe())
             
-            # Xử lý dữ liệu
-            products_df = self._preprocess_data(products_df)
-            products_df = self._calculate_enhanced_popularity(products_df)
-            
-            # Lưu recommendations và thời gian train
-            self.recommendations = products_df.sort_values('popularity_score', ascending=False)
-            self.last_train_time = datetime.now()
+            self.fit_products(products_df)
             
             print(f"\nTop 5 products by popularity:")
             print(self.recommendations[['name', 'popularity_score', 'total_views']].head())
@@ -102,6 +134,18 @@ class PopularityRecommender:
             print(f"Error during training: {str(e)}")
             return False
 
+    def fit_products(self, products_df):
+        """Train từ DataFrame sản phẩm (cùng cột với query trong fit)"""
+        # Xử lý dữ liệu
+        products_df = self._preprocess_data(products_df)
+        products_df = self._calculate_enhanced_popularity(products_df)
+        
+        # Lưu recommendations và thời gian train
+        self.recommendations = products_df.sort_values('popularity_score', ascending=False)
+        self.last_train_time = datetime.now()
+        self._build_recommendation_lists()
+        return self
+
     def _preprocess_data(self, df):
         """Xử lý và chuẩn hóa dữ liệu"""
         # Xử lý missing values
@@ -134,53 +178,86 @@ class PopularityRecommender:
             df['recency_score'] = 1 / (1 + df['days_since_launch'] / 30)  # Giảm dần theo tháng
             
             # Tính popularity với trọng số mới
+            weights = self.SCORE_WEIGHTS
             df['popularity_score'] = (
-                0.25 * df['total_views_score'] +      # Views vẫn quan trọng
-                0.20 * df['sold_count_score'] +       # Doanh số quan trọng thứ 2
-                0.15 * df['unique_viewers_score'] +    # Số người xem unique
-                0.15 * df['avg_rating_score'] +        # Rating quan trọng
-                0.15 * df['recency_score'] +          # Thêm độ mới
-                0.10 * df['review_count_score']        # Review ít quan trọng hơn
+                weights['total_views'] * df['total_views_score'] +        # Views vẫn quan trọng
+                weights['sold_count'] * df['sold_count_score'] +          # Doanh số quan trọng thứ 2
+                weights['unique_viewers'] * df['unique_viewers_score'] +  # Số người xem unique
+                weights['avg_rating'] * df['avg_rating_score'] +          # Rating quan trọng
+                weights['recency'] * df['recency_score'] +                # Thêm độ mới
+                weights['review_count'] * df['review_count_score']        # Review ít quan trọng hơn
             )
             
-            # Thêm reason dựa trên metrics
-            df['reason'] = df.apply(self._get_enhanced_reason, axis=1)
-            
         return df
 
-    def _get_enhanced_reason(self, row):
-        """Tạo lý do gợi ý thông minh hơn"""
-        reasons = []
-        
+    @staticmethod
+    def _numeric_column(df, column):
+        if column not in df.columns:
+            return np.full(len(df), np.nan)
+        return pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64)
+
+    def _reason_codes(self, df):
+        """Mã lý do gợi ý của từng dòng, tính bằng mask numpy thay cho apply theo dòng
+
+        Mỗi dòng có 3 nhóm lý do (views, rating, doanh số & độ mới), mỗi nhóm là
+        1 mã mẫu câu (0 = không có); 3 mã được gói vào 1 số uint8, chuỗi chỉ được
+        format trong _reason cho sản phẩm thực sự được trả về.
+        """
+        views = self._numeric_column(df, 'total_views')
+        viewers = self._numeric_column(df, 'unique_viewers')
+        rating = self._numeric_column(df, 'avg_rating')
+        reviews = self._numeric_column(df, 'review_count')
+        sold = self._numeric_column(df, 'sold_count')
+        days = self._numeric_column(df, 'days_since_launch')
+
         # Views & Engagement
-        if row['total_views'] >= 122:
-            views_ratio = int((row['total_views'] / 111.6 - 1) * 100)
-            if row['unique_viewers'] >= 26:
-                reasons.append(f"Hot {row['total_views']:,} lượt xem • {row['unique_viewers']} người quan tâm")
-            else:
-                reasons.append(f"Hot {row['total_views']:,} lượt xem")
-        elif row['total_views'] >= 112:
-            reasons.append(f"Phổ biến với {row['total_views']:,} lượt xem")
-        
-        # Rating & Reviews    
-        if row['avg_rating'] >= 4.0 and row['review_count'] >= 15:
-            reasons.append(f"Đánh giá xuất sắc {row['avg_rating']:.1f}★ ({row['review_count']} đánh giá)")
-        elif row['avg_rating'] >= 3.5 and row['review_count'] >= 10:
-            reasons.append(f"Đánh giá tốt {row['avg_rating']:.1f}★ ({row['review_count']} đánh giá)")
-            
+        views_code = np.select(
+            [(views >= 122) & (viewers >= 26), views >= 122, views >= 112], [1, 2, 3], 0
+        )
+        # Rating & Reviews
+        rating_code = np.select(
+            [(rating >= 4.0) & (reviews >= 15), (rating >= 3.5) & (reviews >= 10)], [1, 2], 0
+        )
         # Doanh số & Độ mới
-        if row['days_since_launch'] <= 30:
-            sales_per_day = row['sold_count'] / max(1, row['days_since_launch'])
-            if sales_per_day >= 2:
-                reasons.append(f"Bán {int(sales_per_day)} sản phẩm/ngày")
-            elif row['sold_count'] >= 29:
-                reasons.append(f"Mới & Bán chạy ({int(row['sold_count'])} đã bán)")
-        elif row['sold_count'] >= 100:
-            reasons.append(f"Best seller ({int(row['sold_count'])} đã bán)")
-        elif row['sold_count'] >= 50:
-            reasons.append(f"Bán chạy ({int(row['sold_count'])} đã bán)")
-        
-        return " • ".join(reasons[:2])
+        is_new = days <= 30
+        with np.errstate(invalid='ignore'):
+            sales_per_day = sold / np.maximum(1, days)
+        sales_code = np.select(
+            [is_new & (sales_per_day >= 2), is_new & (sold >= 29), ~is_new & (sold >= 100), ~is_new & (sold >= 50)],
+            [1, 2, 3, 4], 0
+        )
+        return (views_code * 15 + rating_code * 5 + sales_code).astype(np.uint8)
+
+    def _reason(self, row):
+        """Lý do gợi ý của 1 dòng (tối đa 2 ý) từ mã tính sẵn"""
+        views_code, rest = divmod(int(self.reason_codes[row]), 15)
+        rating_code, sales_code = divmod(rest, 5)
+        reasons = []
+
+        total_views = self.total_views[row]
+        if views_code == 1:
+            reasons.append(f"Hot {total_views:,} lượt xem • {self.unique_viewers[row]} người quan tâm")
+        elif views_code == 2:
+            reasons.append(f"Hot {total_views:,} lượt xem")
+        elif views_code == 3:
+            reasons.append(f"Phổ biến với {total_views:,} lượt xem")
+
+        if rating_code:
+            label = 'Đánh giá xuất sắc' if rating_code == 1 else 'Đánh giá tốt'
+            reasons.append(f"{label} {self.avg_ratings[row]:.1f}★ ({self.review_counts[row]} đánh giá)")
+
+        if sales_code and len(reasons) < 2:
+            sold_count = self.sold_counts[row]
+            if sales_code == 1:
+                reasons.append(f"Bán {int(sold_count / max(1, self._days_since_launch[row]))} sản phẩm/ngày")
+            elif sales_code == 2:
+                reasons.append(f"Mới & Bán chạy ({int(sold_count)} đã bán)")
+            elif sales_code == 3:
+                reasons.append(f"Best seller ({int(sold_count)} đã bán)")
+            else:
+                reasons.append(f"Bán chạy ({int(sold_count)} đã bán)")
+
+        return " • ".join(reasons)
 
     def _get_price_score(self, row):
         """Tính điểm giá dựa trên phân khúc"""
@@ -214,64 +291,190 @@ class PopularityRecommender:
         self.tfidf_matrix = tfidf.fit_transform(df['content'])
         self.feature_names = tfidf.get_feature_names_out()
 
-    def recommend(self, limit=8, category=None, min_price=None, max_price=None, brand=None):
-        """Cải thiện recommendations với phân phối tốt hơn"""
-        filtered_df = self.recommendations.copy()
-        
-        # 1. Phân nhóm theo giá chi tiết hơn
-        price_ranges = [
-            (0, 2000000, 'Phổ thông'),
-            (2000000, 5000000, 'Tầm trung thấp'),
-            (5000000, 15000000, 'Tầm trung cao'),
-            (15000000, float('inf'), 'Cao cấp')
-        ]
-        
-        filtered_df['price_segment'] = filtered_df.apply(
-            lambda x: next(
-                (segment for min_p, max_p, segment in price_ranges 
-                 if min_p <= x['min_price'] < max_p), 
-                'Unknown'
-            ),
-            axis=1
-        )
-        
-        # 2. Đa dạng hóa kết quả
-        diverse_results = []
-        seen_categories = set()
-        seen_brands = set()
-        segments_count = {'Cao cấp': 0, 'Tầm trung cao': 0, 'Tầm trung thấp': 0, 'Phổ thông': 0}
-        max_per_segment = 2
-        
-        # Sort by popularity within each segment
-        for segment in ['Cao cấp', 'Tầm trung cao', 'Tầm trung thấp', 'Phổ thông']:
-            segment_df = filtered_df[filtered_df['price_segment'] == segment]
-            
-            for _, product in segment_df.iterrows():
-                if len(diverse_results) >= limit:
+    def _segment_codes(self, prices):
+        """Mã phân khúc giá (index trong PRICE_SEGMENTS) cho mảng giá, -1 nếu không thuộc phân khúc nào"""
+        prices = np.asarray(prices, dtype=np.float64)
+        codes = np.searchsorted(self.PRICE_BOUNDS, prices, side='right') - 1
+        codes[np.isnan(prices) | (prices < self.PRICE_BOUNDS[0])] = -1
+        return codes
+
+    def _build_recommendation_lists(self):
+        """Tính sẵn phân khúc giá và danh sách gợi ý đa dạng lúc fit/load
+
+        Thuật toán giống bản cũ (duyệt phân khúc từ Cao cấp xuống, mỗi phân khúc tối đa
+        MAX_PER_SEGMENT sản phẩm, không trùng category/brand đã chọn) nhưng chạy 1 lần
+        trên mảng numpy; kết quả không phụ thuộc limit nên recommend chỉ cần cắt đầu danh sách.
+        """
+        df = self.recommendations
+        self.prices = pd.to_numeric(df['min_price'], errors='coerce').to_numpy(dtype=np.float64)
+        self.segment_codes = self._segment_codes(self.prices)
+        self.category_codes, self.category_lookup, self.category_postings = self._posting_lists(df['category_name'])
+        self.brand_codes, self.brand_lookup, self.brand_postings = self._posting_lists(df['brand_name'])
+        # Giá tăng dần (NaN cuối mảng) để lọc khoảng giá bằng binary search
+        self.price_order = np.argsort(self.prices, kind='stable')
+        self.sorted_prices = self.prices[self.price_order]
+        with self._filter_cache_lock:
+            self._filter_cache = OrderedDict()
+
+        # Mảng từng cột (view, không copy với cột số) để dựng Series kết quả không qua df.iloc
+        # Artifact cũ còn cột reason dạng chuỗi: bỏ, reason được format khi trả về
+        columns = [column for column in df.columns if column != 'reason']
+        self._column_values = [df[column].to_numpy() for column in columns]
+        self._product_fields = pd.Index(columns + ['reason', 'price_segment', 'metrics'])
+        self._row_labels = df.index.to_numpy()
+        self.avg_ratings = df['avg_rating'].to_numpy(dtype=np.float64)
+        self.review_counts = df['review_count'].to_numpy()
+        self.sold_counts = df['sold_count'].to_numpy()
+        self.total_views = df['total_views'].to_numpy()
+        self.unique_viewers = df['unique_viewers'].to_numpy()
+        self._days_since_launch = self._numeric_column(df, 'days_since_launch')
+        self.reason_codes = self._reason_codes(df)
+
+        picked = []
+        seen_categories = np.zeros(self.category_codes.max() + 1 if len(df) else 0, dtype=bool)
+        seen_brands = np.zeros(self.brand_codes.max() + 1 if len(df) else 0, dtype=bool)
+        for segment in self.SEGMENT_ORDER:
+            # recommendations đã sắp theo popularity_score giảm dần nên ứng viên đầu tiên là phổ biến nhất
+            in_segment = self.segment_codes == segment
+            for _ in range(self.MAX_PER_SEGMENT):
+                candidates = np.flatnonzero(
+                    in_segment & ~seen_categories[self.category_codes] & ~seen_brands[self.brand_codes]
+                )
+                if len(candidates) == 0:
                     break
-                    
-                if segments_count[segment] >= max_per_segment:
-                    continue
-                    
-                # Kiểm tra category và brand
-                if (product['category_name'] not in seen_categories and 
-                    product['brand_name'] not in seen_brands):
-                    
-                    # Format metrics
-                    product['metrics'] = {
-                        'avg_rating': round(product['avg_rating'], 1),
-                        'review_count': int(product['review_count']),
-                        'sold_count': int(product['sold_count']),
-                        'total_views': int(product['total_views']),
-                        'unique_viewers': int(product['unique_viewers'])
-                    }
-                    
-                    diverse_results.append(product)
-                    seen_categories.add(product['category_name'])
-                    seen_brands.add(product['brand_name'])
-                    segments_count[segment] += 1
-        
-        return diverse_results
+                row = candidates[0]
+                picked.append(row)
+                seen_categories[self.category_codes[row]] = True
+                seen_brands[self.brand_codes[row]] = True
+
+        self._diverse_results = self._format_products(picked)
+
+    @staticmethod
+    def _posting_lists(column):
+        """(mã mỗi dòng, tên -> mã, posting list mỗi mã); posting list giữ thứ tự dòng (popularity)"""
+        codes, uniques = pd.factorize(column, use_na_sentinel=False)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        postings = [order[bounds[code]:bounds[code + 1]] for code in range(len(uniques))]
+        lookup = {value: code for code, value in enumerate(uniques) if isinstance(value, str)}
+        return codes, lookup, postings
+
+    def _format_products(self, rows):
+        """Các dòng recommendations -> Series sản phẩm kèm price_segment và metrics"""
+        products = []
+        for row in rows:
+            values = [column[row] for column in self._column_values]
+            values.append(self._reason(row))
+            segment = self.segment_codes[row]
+            values.append(self.PRICE_SEGMENTS[segment][2] if segment >= 0 else 'Unknown')
+            # Format metrics
+            values.append({
+                'avg_rating': round(self.avg_ratings[row], 1),
+                'review_count': int(self.review_counts[row]),
+                'sold_count': int(self.sold_counts[row]),
+                'total_views': int(self.total_views[row]),
+                'unique_viewers': int(self.unique_viewers[row])
+            })
+            products.append(pd.Series(values, index=self._product_fields, dtype=object, name=self._row_labels[row]))
+        return products
+
+    def _filter_rows(self, limit, category, brand, min_price, max_price):
+        """limit dòng phổ biến nhất thỏa bộ lọc (giá so với min_price của sản phẩm)
+
+        Nguồn ứng viên là danh sách nhỏ nhất trong các posting list category/brand và
+        khoảng giá (tìm bằng binary search trên mảng giá đã sắp); nguồn được quét theo
+        thứ tự popularity từng scan_chunk dòng, các điều kiện còn lại kiểm tra vectorized
+        và dừng ngay khi đủ limit.
+        """
+        sources = []
+        category_code = brand_code = None
+        if category is not None:
+            category_code = self.category_lookup.get(category)
+            if category_code is None:
+                return []
+            sources.append(self.category_postings[category_code])
+        if brand is not None:
+            brand_code = self.brand_lookup.get(brand)
+            if brand_code is None:
+                return []
+            sources.append(self.brand_postings[brand_code])
+
+        check_price = min_price is not None or max_price is not None
+        if check_price:
+            low = -np.inf if min_price is None else min_price
+            high = np.inf if max_price is None else max_price
+            start = np.searchsorted(self.sorted_prices, low, side='left')
+            stop = np.searchsorted(self.sorted_prices, high, side='right')
+            if stop <= start:
+                return []
+            # Khoảng giá nhỏ: sắp lại theo thứ tự popularity và dùng làm nguồn
+            if stop - start <= 8 * self.scan_chunk and all(stop - start < len(source) for source in sources):
+                sources.append(np.sort(self.price_order[start:stop]))
+
+        source = min(sources, key=len) if sources else None
+        n_rows = len(source) if source is not None else len(self.prices)
+        found, n_found = [], 0
+        for offset in range(0, n_rows, self.scan_chunk):
+            if source is not None:
+                rows = source[offset:offset + self.scan_chunk]
+            else:
+                rows = np.arange(offset, min(offset + self.scan_chunk, n_rows))
+            mask = np.ones(len(rows), dtype=bool)
+            if category_code is not None:
+                mask &= self.category_codes[rows] == category_code
+            if brand_code is not None:
+                mask &= self.brand_codes[rows] == brand_code
+            if check_price:
+                prices = self.prices[rows]
+                mask &= (prices >= low) & (prices <= high)
+            rows = rows[mask]
+            found.append(rows)
+            n_found += len(rows)
+            if n_found >= limit:
+                break
+        return np.concatenate(found)[:limit].tolist() if found else []
+
+    @staticmethod
+    def _parse_filter(value, cast=str):
+        """Giá trị bộ lọc từ query string: None/'' = không lọc"""
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return None
+        return cast(value.strip() if isinstance(value, str) else value)
+
+    def recommend(self, limit=8, category=None, min_price=None, max_price=None, brand=None):
+        """Gợi ý theo độ phổ biến
+
+        Không có bộ lọc: danh sách đa dạng theo phân khúc giá/category/brand tính sẵn lúc fit.
+        Có bộ lọc: các sản phẩm phổ biến nhất thỏa category/brand/khoảng giá, lấy từ index
+        và cache LRU theo tổ hợp bộ lọc.
+        """
+        category = self._parse_filter(category)
+        brand = self._parse_filter(brand)
+        min_price = self._parse_filter(min_price, float)
+        max_price = self._parse_filter(max_price, float)
+        if category is None and brand is None and min_price is None and max_price is None:
+            return [product.copy() for product in self._diverse_results[:limit]]
+
+        key = (category, brand, min_price, max_price, limit)
+        with self._filter_cache_lock:
+            products = self._filter_cache.get(key)
+            if products is not None:
+                self._filter_cache.move_to_end(key)
+        if products is None:
+            products = self._format_products(self._filter_rows(limit, category, brand, min_price, max_price))
+            with self._filter_cache_lock:
+                self._filter_cache[key] = products
+                while len(self._filter_cache) > self.filter_cache_size:
+                    self._filter_cache.popitem(last=False)
+        return [product.copy() for product in products]
+
+    def top_products(self, n=100):
+        """n sản phẩm phổ biến nhất dạng mảng (product_ids, popularity_score), dùng cho rank fusion"""
+        df = self.recommendations
+        if df is None or len(df) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        head = df.iloc[:n]
+        return head['product_id'].to_numpy(dtype=np.int64), head['popularity_score'].to_numpy(dtype=np.float64)
 
     def _diversify_results(self, df, max_per_category=2, max_per_brand=2):
         """Đa dạng hóa kết quả theo danh mục, thương hiệu và phân khúc giá"""
@@ -383,81 +586,30 @@ class PopularityRecommender:
                 }
             }
 
+    def to_artifact(self):
+        """Mảng + meta để lưu artifact (xem model_store.ArtifactStore)"""
+        arrays, frame_spec = frame_to_arrays(self.recommendations, 'recommendations_')
+        return arrays, {
+            'recommendations': frame_spec,
+            'last_train_time': self.last_train_time.isoformat() if self.last_train_time else None
+        }
+
+    @classmethod
+    def from_artifact(cls, arrays, meta):
+        """Dựng lại model từ artifact (bảng recommendations đã sắp theo popularity_score)"""
+        model = cls()
+        model.recommendations = frame_from_arrays(arrays, meta['recommendations'])
+        if meta['last_train_time']:
+            model.last_train_time = datetime.fromisoformat(meta['last_train_time'])
+        model._build_recommendation_lists()
+        return model
+
     def plot_analytics(self):
         """Tạo dashboard phân tích"""
-        
-        # Set up the matplotlib figure
-        plt.style.use('seaborn')
-        fig = plt.figure(figsize=(20, 12))
-        
-        # 1. Popularity Score Distribution
-        plt.subplot(2, 3, 1)
-        sns.histplot(data=self.recommendations, x='popularity_score', bins=20)
-        plt.title('Phân phối Popularity Score')
-        
-        # 2. Top 10 Popular Products
-        plt.subplot(2, 3, 2)
-        top_10 = self.recommendations.head(10)
-        sns.barplot(data=top_10, y='name', x='popularity_score')
-        plt.title('Top 10 Sản phẩm phổ biến nhất')
-        
-        # 3. Category Distribution
-        plt.subplot(2, 3, 3)
-        category_counts = self.recommendations['category_name'].value_counts()
-        plt.pie(category_counts.values, labels=category_counts.index, autopct='%1.1f%%')
-        plt.title('Phân phối theo danh mục')
-        
-        # 4. Metrics Correlation
-        plt.subplot(2, 3, 4)
-        metrics = ['total_views', 'sold_count', 'unique_viewers', 'avg_rating']
-        sns.heatmap(self.recommendations[metrics].corr(), annot=True, cmap='coolwarm')
-        plt.title('Tương quan giữa các metrics')
-        
-        # 5. Views vs Sales
-        plt.subplot(2, 3, 5)
-        plt.scatter(self.recommendations['total_views'], 
-                   self.recommendations['sold_count'])
-        plt.xlabel('Tổng lượt xem')
-        plt.ylabel('Số lượng bán')
-        plt.title('Mối quan hệ Views - Sales')
-        
-        # 6. Price Distribution
-        plt.subplot(2, 3, 6)
-        sns.boxplot(data=self.recommendations, y='category_name', x='min_price')
-        plt.title('Phân phối giá theo danh mục')
-        
-        plt.tight_layout()
-        plt.savefig('popularity_analytics.png')
-        plt.show()
+        from popularity_analytics import plot_analytics
+        plot_analytics(self.recommendations)
 
     def create_interactive_dashboard(self):
         """Tạo dashboard tương tác với Plotly"""
-        
-        # 1. Popularity Score Distribution
-        fig1 = px.histogram(self.recommendations, 
-                           x='popularity_score',
-                           title='Phân phối Popularity Score')
-        
-        # 2. Top Products
-        fig2 = px.bar(self.recommendations.head(10),
-                      x='name', y='popularity_score',
-                      title='Top 10 Sản phẩm phổ biến nhất')
-        
-        # 3. Category Distribution
-        fig3 = px.pie(self.recommendations,
-                      names='category_name',
-                      title='Phân phối theo danh mục')
-        
-        # 4. Metrics Scatter Plot
-        fig4 = px.scatter(self.recommendations,
-                         x='total_views', y='sold_count',
-                         size='popularity_score',
-                         color='category_name',
-                         hover_data=['name'],
-                         title='Phân tích đa chiều Metrics')
-        
-        # Show all plots
-        fig1.show()
-        fig2.show()
-        fig3.show()
-        fig4.show()
\ No newline at end of file
+        from popularity_analytics import create_interactive_dashboard
+        create_interactive_dashboard(self.recommendations)
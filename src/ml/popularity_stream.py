@@ -0,0 +1,241 @@
+import hashlib
+import threading
+import logging
+import math
+import time
+from collections import deque
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from popularity_recommender import PopularityRecommender
+
+logger = logging.getLogger(__name__)
+
+class HyperLogLog:
+    """Sketch HyperLogLog đếm xấp xỉ số phần tử khác nhau (sai số ~1.04/sqrt(2^precision))"""
+
+    def __init__(self, precision=10):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'little')
+
+    def add(self, value):
+        h = self._hash(value)
+        index = h & ((1 << self.precision) - 1)
+        # Vị trí bit 1 đầu tiên của phần hash còn lại
+        rank = (64 - self.precision) - (h >> self.precision).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Ít phần tử: dùng linear counting cho chính xác hơn
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+class PopularityStream:
+    """Cập nhật popularity theo event /api/track giữa 2 lần tính lại toàn bộ từ DB
+
+    - Bộ đếm view/sold/review của từng sản phẩm giảm dần theo thời gian
+      (half_life_hours), cài bằng forward decay: event lúc t được cộng
+      exp(λ(t - t0)) với t0 = lúc rebase, nên mỗi event là O(1). Quy về thời điểm
+      now chỉ nhân mọi bộ đếm (cả số liệu DB, coi như tại t0) với cùng exp(-λ(now - t0)),
+      min-max không đổi khi nhân hệ số nên thứ hạng không phụ thuộc now.
+    - Người xem của từng sản phẩm được đếm xấp xỉ bằng HyperLogLog (chỉ tạo sketch
+      cho sản phẩm có view). Có viewer_loader thì sketch được seed bằng người xem
+      trong DB ở lần build đầu tiên sau view đầu tiên, unique_viewers = ước lượng
+      của hợp hai tập. Không có viewer_loader (hoặc load lỗi) thì unique_viewers =
+      số từ DB + ước lượng người xem từ lần rebase: người đã xem trước đó bị đếm
+      lại, lệch tối đa min(số DB, số người xem mới) và không vượt total_views.
+    - popularity_score của mọi sản phẩm được tính lại trên cùng thang min-max của các
+      bộ đếm đã decay rồi sắp lại, lazily trong build_model (chỉ khi có event mới).
+    - Bản fit từ DB là lần đối soát: rebase lên bản đó rồi replay event từ trained_from.
+    """
+
+    # action -> các bộ đếm được tăng
+    ACTION_METRICS = {
+        'view': ('total_views',),
+        'purchase': ('sold_count', 'order_count'),
+        'review': ('review_count',)
+    }
+    METRICS = ('total_views', 'sold_count', 'order_count', 'review_count')
+
+    def __init__(self, half_life_hours=24, hll_precision=10, max_recent_events=100000, viewer_loader=None):
+        self.decay_rate = math.log(2) / (half_life_hours * 3600)
+        self.hll_precision = hll_precision
+        # viewer_loader(product_ids) -> {product_id: user ids đã xem trong DB}
+        self.viewer_loader = viewer_loader
+        self._lock = threading.Lock()
+        # Event gần đây, để replay lên bản vừa fit lại từ DB
+        self._recent_events = deque(maxlen=max_recent_events)
+        self._base = None
+        self._touched = set()
+        self._viewers = {}
+        self._seeded = set()
+        self.rebased_at = None
+        self.events_since_rebase = 0
+        self.last_build_duration = None
+
+    @property
+    def is_ready(self):
+        return self._base is not None
+
+    def rebase(self, model, trained_from):
+        """Lấy model vừa fit từ DB làm mốc, replay các event xảy ra từ trained_from"""
+        df = model.recommendations
+        with self._lock:
+            self._base = model
+            self._landmark = trained_from.timestamp()
+            self._rows = {int(product_id): row for row, product_id in enumerate(df['product_id'])}
+            self._product_ids = df['product_id'].to_numpy()
+            self._baseline = {
+                metric: pd.to_numeric(df[metric], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+                for metric in self.METRICS + ('unique_viewers',)
+            }
+            # Tổng exp(λ(t - t0)) của các event từ lúc rebase (forward decay)
+            self._decayed = {metric: np.zeros(len(df), dtype=np.float64) for metric in self.METRICS}
+            self._raw = {metric: np.zeros(len(df), dtype=np.int64) for metric in self.METRICS}
+            self._new_viewers = np.zeros(len(df), dtype=np.int64)
+            self._base_scores = pd.to_numeric(df['popularity_score']).to_numpy(dtype=np.float64).copy()
+            self._viewers = {}
+            self._seeded = set()
+            self._touched = set()
+            self.events_since_rebase = 0
+            self.rebased_at = datetime.now()
+
+            replay = [event for event in self._recent_events if event[0] >= trained_from]
+            for event in replay:
+                self._apply(*event)
+        logger.info(f"Rebased popularity stream on {len(df)} products, replayed {len(replay)} events")
+
+    def record_event(self, product_id, user_id, action, timestamp=None):
+        """Áp 1 event /api/track; bỏ qua action không ảnh hưởng popularity"""
+        if action not in self.ACTION_METRICS:
+            return False
+        event = (timestamp or datetime.now(), product_id, user_id, action)
+        with self._lock:
+            self._recent_events.append(event)
+            if self._base is None:
+                return False
+            return self._apply(*event)
+
+    def _apply(self, timestamp, product_id, user_id, action):
+        row = self._rows.get(int(product_id))
+        if row is None:
+            # Sản phẩm mới chưa có trong lần fit: chờ lần đối soát sau
+            return False
+        weight = math.exp(self.decay_rate * (timestamp.timestamp() - self._landmark))
+        for metric in self.ACTION_METRICS[action]:
+            self._decayed[metric][row] += weight
+            self._raw[metric][row] += 1
+        if action == 'view' and user_id is not None:
+            sketch = self._viewers.get(row)
+            if sketch is None:
+                sketch = self._viewers[row] = HyperLogLog(self.hll_precision)
+            sketch.add(user_id)
+        self._touched.add(row)
+        self.events_since_rebase += 1
+        return True
+
+    @staticmethod
+    def _min_max(values):
+        """Chuẩn hóa min-max như MinMaxScaler lúc fit (cột hằng -> 0)"""
+        if len(values) == 0:
+            return values
+        spread = values.max() - values.min()
+        return (values - values.min()) / spread if spread > 0 else np.zeros(len(values))
+
+    def _seed_viewers(self):
+        """Nạp người xem trong DB vào sketch của các sản phẩm mới có view (1 lần / sản phẩm / rebase)"""
+        with self._lock:
+            base = self._base
+            pending = [row for row in self._viewers if row not in self._seeded]
+        if self.viewer_loader is None or not pending:
+            return
+        try:
+            viewers = self.viewer_loader([int(self._product_ids[row]) for row in pending])
+        except Exception as e:
+            # Giữ cách đếm cộng dồn cho lần build này, thử lại lần sau
+            logger.error(f"Error loading product viewers: {str(e)}")
+            return
+        with self._lock:
+            if self._base is not base:
+                return
+            for row in pending:
+                sketch = self._viewers[row]
+                for user_id in viewers.get(int(self._product_ids[row]), ()):
+                    sketch.add(user_id)
+                self._seeded.add(row)
+                self._touched.add(row)
+
+    def build_model(self):
+        """PopularityRecommender mới từ bộ đếm hiện tại
+
+        None nếu không có event nào từ lần build trước.
+        """
+        self._seed_viewers()
+        with self._lock:
+            if self._base is None or not self._touched:
+                return None
+            start = time.time()
+            n_changed = len(self._touched)
+            viewers = self._baseline['unique_viewers']
+            for row in self._touched:
+                sketch = self._viewers.get(row)
+                if sketch is None:
+                    continue
+                if row in self._seeded:
+                    # Sketch là hợp người xem trong DB và người xem mới
+                    self._new_viewers[row] = max(sketch.count() - viewers[row], 0)
+                else:
+                    # Không quá số view mới, nên unique_viewers không vượt total_views
+                    self._new_viewers[row] = min(sketch.count(), self._raw['total_views'][row])
+            self._touched = set()
+
+            # Thay phần min-max của lần fit bằng min-max trên bộ đếm đã decay; không cần
+            # quy về thời điểm build vì nhân cùng hệ số không đổi min-max (forward decay)
+            weights = PopularityRecommender.SCORE_WEIGHTS
+            scores = self._base_scores.copy()
+            for metric in ('total_views', 'sold_count', 'review_count'):
+                baseline = self._baseline[metric]
+                decayed = baseline + self._decayed[metric]
+                scores += weights[metric] * (self._min_max(decayed) - self._min_max(baseline))
+            scores += weights['unique_viewers'] * (
+                self._min_max(viewers + self._new_viewers) - self._min_max(viewers)
+            )
+            # recommendations đã sắp theo điểm lúc fit nên sắp ổn định giữ thứ tự cũ khi hòa điểm
+            order = np.argsort(-scores, kind='stable')
+
+            df = self._base.recommendations.copy()
+            for metric in self.METRICS:
+                df[metric] = np.rint(self._baseline[metric] + self._raw[metric]).astype(np.int64)
+            df['unique_viewers'] = np.rint(viewers + self._new_viewers).astype(np.int64)
+            df['popularity_score'] = scores
+            last_train_time = self._base.last_train_time
+
+        model = PopularityRecommender()
+        model.recommendations = df.iloc[order]
+        model.last_train_time = last_train_time
+        model._build_recommendation_lists()
+        self.last_build_duration = round(time.time() - start, 3)
+        logger.info(f"Built popularity model from stream ({n_changed} products changed) in {self.last_build_duration}s")
+        return model
+
+    def stats(self):
+        return {
+            'rebased_at': self.rebased_at.isoformat() if self.rebased_at else None,
+            'events_since_rebase': self.events_since_rebase,
+            'pending_products': len(self._touched),
+            'viewer_sketches': len(self._viewers),
+            'last_build_duration': self.last_build_duration
+        }
@@ -0,0 +1,185 @@
+import threading
+import logging
+import time
+import pandas as pd
+import config
+from db_pool import get_connection
+
+logger = logging.getLogger(__name__)
+
+class ProductCache:
+    """Cache thẻ sản phẩm (tên, ảnh, brand, category, giá, rating, đã bán) theo product id
+
+    Dùng chung trong process cho mọi endpoint/recommender. Thẻ hết hạn sau ttl
+    giây hoặc khi version catalog bị tăng (invalidate); mọi id thiếu/hết hạn
+    của một lần get_many được lấy bằng 1 query gộp thay vì 1 query mỗi sản phẩm.
+    """
+
+    CARD_QUERY = """
+        SELECT
+            p.id as product_id,
+            p.name,
+            p.image_url,
+            b.name as brand_name,
+            c.name as category_name,
+            COALESCE(pv.min_price, 0) as min_price,
+            COALESCE(pv.max_price, 0) as max_price,
+            COALESCE(r.avg_rating, 0) as avg_rating,
+            COALESCE(r.review_count, 0) as review_count,
+            COALESCE(s.sold_count, 0) as sold_count
+        FROM products p
+        LEFT JOIN brands b ON p.brand_id = b.id
+        LEFT JOIN categories c ON p.category_id = c.id
+        LEFT JOIN (
+            SELECT product_id, MIN(price) as min_price, MAX(price) as max_price
+            FROM productvariants
+            {where_variants}
+            GROUP BY product_id
+        ) pv ON p.id = pv.product_id
+        LEFT JOIN (
+            SELECT product_id,
+                   COUNT(*) as review_count,
+                   AVG(rating) as avg_rating
+            FROM reviews
+            {where_reviews}
+            GROUP BY product_id
+        ) r ON p.id = r.product_id
+        LEFT JOIN (
+            SELECT product_id, SUM(quantity) as sold_count
+            FROM orderitems oi
+            JOIN orders o ON oi.order_id = o.id
+            WHERE o.status != 'cancelled' {and_orders}
+            GROUP BY product_id
+        ) s ON p.id = s.product_id
+        {where_products}
+    """
+
+    def __init__(self, ttl=600, max_batch=500):
+        self.ttl = ttl
+        self.max_batch = max_batch
+        # product_id -> (card, loaded_at, version)
+        self._cards = {}
+        self._lock = threading.Lock()
+        self.version = 1
+        self.loaded_at = None
+        self._metrics = {'hits': 0, 'misses': 0, 'queries': 0}
+
+    def _query_cards(self, conn, product_ids=None):
+        """Chạy CARD_QUERY cho danh sách id (None = toàn bộ catalog)"""
+        if conn is None:
+            with get_connection() as conn:
+                return self._query_cards(conn, product_ids)
+        if product_ids is None:
+            query = self.CARD_QUERY.format(
+                where_variants='', where_reviews='', and_orders='', where_products=''
+            )
+            params = None
+        else:
+            placeholders = ','.join(['%s'] * len(product_ids))
+            # Lọc cả trong subquery để MySQL không phải group toàn bảng
+            query = self.CARD_QUERY.format(
+                where_variants=f"WHERE product_id IN ({placeholders})",
+                where_reviews=f"WHERE product_id IN ({placeholders})",
+                and_orders=f"AND oi.product_id IN ({placeholders})",
+                where_products=f"WHERE p.id IN ({placeholders})"
+            )
+            params = list(product_ids) * 4
+        df = pd.read_sql(query, conn, params=params)
+        with self._lock:
+            self._metrics['queries'] += 1
+        return df.to_dict('records')
+
+    def _store(self, cards, version):
+        now = time.time()
+        with self._lock:
+            for card in cards:
+                self._cards[int(card['product_id'])] = (card, now, version)
+
+    def load_all(self, conn=None):
+        """Load toàn bộ catalog bằng 1 query (warm cache)"""
+        start = time.time()
+        version = self.version
+        cards = self._query_cards(conn)
+        self._store(cards, version)
+        self.loaded_at = time.time()
+        logger.info(f"Loaded {len(cards)} product cards in {time.time() - start:.3f}s")
+        return len(cards)
+
+    def _fresh(self, entry, now):
+        return entry is not None and entry[2] == self.version and now - entry[1] <= self.ttl
+
+    def get_many(self, product_ids, conn=None):
+        """Thẻ sản phẩm theo đúng thứ tự product_ids (bỏ qua id không tồn tại)
+
+        Id thiếu hoặc hết hạn được lấy bằng 1 query gộp (chia lô max_batch);
+        conn=None thì mượn connection từ pool chỉ khi có miss.
+        """
+        product_ids = [int(pid) for pid in product_ids]
+        now = time.time()
+        cards = self._cards
+        misses = list(dict.fromkeys(pid for pid in product_ids if not self._fresh(cards.get(pid), now)))
+
+        if conn is None and len(misses) > self.max_batch:
+            # Nhiều lô -> mượn 1 connection dùng chung cho cả các lô
+            with get_connection() as conn:
+                return self.get_many(product_ids, conn)
+
+        with self._lock:
+            self._metrics['hits'] += len(product_ids) - len(misses)
+            self._metrics['misses'] += len(misses)
+
+        if misses:
+            version = self.version
+            fetched = [card for start in range(0, len(misses), self.max_batch)
+                       for card in self._query_cards(conn, misses[start:start + self.max_batch])]
+            self._store(fetched, version)
+            found = {int(card['product_id']) for card in fetched}
+            # Sản phẩm đã bị xóa khỏi DB thì bỏ khỏi cache
+            with self._lock:
+                for pid in misses:
+                    if pid not in found:
+                        self._cards.pop(pid, None)
+            cards = self._cards
+
+        result = []
+        for pid in product_ids:
+            entry = cards.get(pid)
+            if entry is not None:
+                result.append(dict(entry[0]))
+        return result
+
+    def get(self, product_id, conn=None):
+        cards = self.get_many([product_id], conn)
+        return cards[0] if cards else None
+
+    def invalidate(self, product_ids=None):
+        """Bỏ cache các id được chỉ định, hoặc toàn bộ catalog (tăng version) nếu None"""
+        with self._lock:
+            if product_ids is None:
+                self.version += 1
+            else:
+                for pid in product_ids:
+                    self._cards.pop(int(pid), None)
+        return self.version
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._metrics)
+            stats['entries'] = len(self._cards)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+        stats['version'] = self.version
+        stats['ttl'] = self.ttl
+        return stats
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_product_cache():
+    """Cache thẻ sản phẩm dùng chung cho toàn process (cấu hình từ config.PRODUCT_CACHE_CONFIG)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ProductCache(**config.PRODUCT_CACHE_CONFIG)
+    return _cache
@@ -1,12 +1,13 @@
 from collaborative_recommender import CollaborativeRecommender
 from popularity_recommender import PopularityRecommender
-import mysql.connector
+from interaction_counter import InteractionCounter
 from datetime import datetime
 
 class RecommenderSystem:
     def __init__(self):
         self.collaborative_recommender = CollaborativeRecommender()
         self.popularity_recommender = PopularityRecommender()
+        self.interaction_counter = InteractionCounter()
         self.conn = None
         self.last_train_time = None
         
@@ -15,10 +16,18 @@ class RecommenderSystem:
         self.conn = conn
         self.collaborative_recommender.fit(conn)
         self.popularity_recommender.fit(conn)
+        self.interaction_counter.load(conn)
         self.last_train_time = datetime.now()
         
+    def record_interaction(self, user_id, product_id, action):
+        """Cập nhật bộ đếm tương tác theo event mới"""
+        self.interaction_counter.record_event(user_id, product_id, action)
+        
     def has_interaction_history(self, user_id, min_interactions=3):
         """Kiểm tra user có đủ lịch sử tương tác không"""
+        if self.interaction_counter.is_loaded:
+            return self.interaction_counter.has_min_interactions(user_id, min_interactions)
+        
         query = """
             SELECT COUNT(*) as count
             FROM (
@@ -0,0 +1,300 @@
+# src/ml/serve.py
+"""Chạy ML service với nhiều worker process dùng chung model qua artifact mmap
+
+    python serve.py --workers 4
+
+- Process cha train/load model (app.init_models), lưu artifact và ghi RELEASE
+  (bộ version các model phục vụ cùng nhau), rồi fork 1 process supervisor; supervisor
+  fork các worker dùng chung socket lắng nghe và fork lại worker bị chết. Mọi lần
+  fork đều diễn ra khi chưa có thread nào chạy (supervisor không có thread), nên
+  process con không kế thừa lock đang bị thread khác giữ.
+- Process cha không nhận request: sau khi fork supervisor nó mới start các background
+  task train lại/xử lý event/đồng bộ content và publish release mới khi model đổi.
+- Worker load đúng các version trong RELEASE bằng np.load(mmap_mode='r'), nên
+  N worker chỉ chiếm 1 bản ma trận trong page cache. Candidate hybrid cũng được tính
+  1 lần ở process cha và ship trong release. Holder ở worker là read-only.
+- Reload: process cha gửi SIGHUP cho supervisor (chuyển tiếp tới các worker) sau mỗi release; worker load
+  trước bộ version mới rồi cùng swap tại activate_at. `kill -HUP <pid cha>`
+  train lại toàn bộ model rồi publish release.
+- Event /api/track và yêu cầu train từ worker được chuyển qua queue liên process
+  về process cha.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from werkzeug.serving import make_server
+import config
+import app as ml_app
+from model_store import get_artifact_store
+
+logger = logging.getLogger(__name__)
+
+class ReleaseWatcher:
+    """Worker: theo dõi RELEASE, load trước các version được ghim rồi swap tại activate_at"""
+
+    def __init__(self, store, poll_interval):
+        self.store = store
+        self.poll_interval = poll_interval
+        self.generation = None
+        self._wake = threading.Event()
+
+    def wake(self):
+        self._wake.set()
+
+    def apply(self, release):
+        """Load (mmap) mọi model của release rồi publish cùng lúc; False nếu thiếu artifact"""
+        models = ml_app.load_artifact_models(release['versions'])
+        missing = set(release['versions']) - set(models)
+        if missing:
+            logger.error(f"Release {release['generation']} is missing artifacts {sorted(missing)}, keeping current models")
+            return False
+
+        delay = release['activate_at'] - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        elif self.generation is not None:
+            logger.warning(f"Release {release['generation']} loaded {-delay:.2f}s after activate_at")
+        ml_app.publish_artifact_models(models)
+        self.generation = release['generation']
+        logger.info(f"Worker {os.getpid()} switched to release {self.generation}")
+        return True
+
+    def check(self):
+        release = self.store.read_release()
+        if release is None or release['generation'] == self.generation:
+            return False
+        return self.apply(release)
+
+    def run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Error applying release: {str(e)}")
+
+class ReleasePublisher:
+    """Process cha: lưu artifact cho model đang phục vụ và publish release khi có thay đổi"""
+
+    def __init__(self, store, workers, activate_delay):
+        self.store = store
+        self.workers = workers
+        self.activate_delay = activate_delay
+        self._lock = threading.Lock()
+
+    def publish(self, force=False):
+        with self._lock:
+            versions = ml_app.save_current_artifacts()
+            current = self.store.read_release()
+            if not force and current is not None and current['versions'] == versions:
+                return None
+            release = self.store.publish_release(versions, self.activate_delay)
+        if self.workers is not None:
+            self.workers.signal(signal.SIGHUP)
+        return release
+
+    def run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.publish()
+            except Exception as e:
+                logger.error(f"Error publishing release: {str(e)}")
+
+class WorkerPool:
+    """Fork và giám sát các worker; worker chết được thay bằng worker mới"""
+
+    def __init__(self, n_workers, listen_socket):
+        self.n_workers = n_workers
+        self.listen_socket = listen_socket
+        self._context = multiprocessing.get_context('fork')
+        self._processes = [None] * n_workers
+        self._stopping = False
+
+    def _spawn(self, worker_id):
+        process = self._context.Process(
+            target=run_worker, args=(self.listen_socket, worker_id), name=f"ml-worker-{worker_id}"
+        )
+        process.start()
+        self._processes[worker_id] = process
+        logger.info(f"Started worker {worker_id} (pid {process.pid})")
+
+    def start(self):
+        for worker_id in range(self.n_workers):
+            self._spawn(worker_id)
+
+    def signal(self, signum):
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                os.kill(process.pid, signum)
+
+    def monitor(self, interval=1.0):
+        while not self._stopping:
+            time.sleep(interval)
+            for worker_id, process in enumerate(self._processes):
+                if not self._stopping and process is not None and not process.is_alive():
+                    logger.warning(f"Worker {worker_id} exited with code {process.exitcode}, restarting")
+                    self._spawn(worker_id)
+
+    def request_stop(self):
+        """Dừng vòng monitor (gọi được từ signal handler)"""
+        self._stopping = True
+
+    def stop(self, timeout=10):
+        self._stopping = True
+        self.signal(signal.SIGTERM)
+        for process in self._processes:
+            if process is not None:
+                process.join(timeout)
+                if process.is_alive():
+                    process.kill()
+
+def run_supervisor(n_workers, listen_socket):
+    """Supervisor: fork và giám sát worker; chỉ có main thread nên fork lại worker luôn an toàn"""
+    workers = WorkerPool(n_workers, listen_socket)
+    signal.signal(signal.SIGHUP, lambda signum, frame: workers.signal(signal.SIGHUP))
+    signal.signal(signal.SIGTERM, lambda signum, frame: workers.request_stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: workers.request_stop())
+    workers.start()
+    workers.monitor()
+    workers.stop()
+    logger.info("All workers stopped")
+
+class WorkerSupervisor:
+    """Process cha: điều khiển process supervisor (fork trước khi start thread nào)"""
+
+    def __init__(self, n_workers, listen_socket):
+        self._process = multiprocessing.get_context('fork').Process(
+            target=run_supervisor, args=(n_workers, listen_socket), name='ml-supervisor'
+        )
+        self._stopping = False
+
+    def start(self):
+        self._process.start()
+        logger.info(f"Started worker supervisor (pid {self._process.pid})")
+
+    def signal(self, signum):
+        """Gửi signal cho supervisor; SIGHUP được chuyển tiếp tới các worker"""
+        if self._process.is_alive():
+            os.kill(self._process.pid, signum)
+
+    def wait(self, interval=1.0):
+        while not self._stopping and self._process.is_alive():
+            time.sleep(interval)
+        if not self._stopping:
+            logger.error(f"Worker supervisor exited with code {self._process.exitcode}")
+
+    def request_stop(self):
+        """Dừng vòng wait (gọi được từ signal handler)"""
+        self._stopping = True
+
+    def stop(self, timeout=15):
+        self._stopping = True
+        self.signal(signal.SIGTERM)
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.kill()
+
+def run_worker(listen_socket, worker_id):
+    """Worker: phục vụ request bằng model load từ release, không train"""
+    serving = config.SERVING_CONFIG
+    watcher = ReleaseWatcher(get_artifact_store(), serving['release_poll_interval'])
+    # Bỏ signal handler kế thừa từ process cha: đang khởi động thì SIGTERM dừng ngay
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGHUP, lambda signum, frame: watcher.wake())
+
+    for holder in ml_app.model_holders:
+        holder.read_only = True
+    # Thay model kế thừa từ process cha bằng bản mmap của release hiện tại
+    watcher.check()
+
+    server = make_server(
+        serving['host'], serving['port'], ml_app.app, threaded=True, fd=listen_socket.fileno()
+    )
+
+    def shutdown(signum, frame):
+        # serve_forever chạy ở main thread nên phải shutdown từ thread khác
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    threading.Thread(target=watcher.run, daemon=True).start()
+    threading.Thread(target=ml_app.reconcile_interaction_counts, daemon=True).start()
+    logger.info(f"Worker {worker_id} (pid {os.getpid()}) serving release {watcher.generation}")
+    server.serve_forever()
+
+def process_train_requests(publisher):
+    """Process cha: train model theo yêu cầu từ worker rồi publish release"""
+    holders = {holder.name: holder for holder in ml_app.model_holders}
+    while True:
+        name = ml_app.train_request_queue.get()
+        holder = holders.get(name)
+        if holder is not None and holder.train():
+            publisher.publish()
+
+def retrain_all(publisher):
+    """Process cha: train lại mọi model có artifact rồi publish release (SIGHUP)"""
+    for holder, _ in ml_app.artifact_models:
+        holder.train()
+    publisher.publish(force=True)
+
+def main():
+    serving = config.SERVING_CONFIG
+    parser = argparse.ArgumentParser(description="Multi-process ML recommendation server")
+    parser.add_argument('--workers', type=int, default=serving['workers'])
+    parser.add_argument('--host', default=serving['host'])
+    parser.add_argument('--port', type=int, default=serving['port'])
+    args = parser.parse_args()
+    serving.update(host=args.host, port=args.port)
+
+    if not config.ARTIFACT_CONFIG['enabled']:
+        raise SystemExit("Multi-process serving requires model artifacts (MODEL_ARTIFACTS != 0)")
+
+    # Queue liên process phải có trước khi fork worker
+    context = multiprocessing.get_context('fork')
+    ml_app.event_queue = context.Queue()
+    ml_app.train_request_queue = context.Queue()
+
+    # Worker dùng model thành phần của release để ghép hybrid, process cha không cần train hybrid
+    ml_app.hybrid_holder.read_only = True
+    logger.info("Initializing recommenders...")
+    warm_started = ml_app.init_models()
+    try:
+        ml_app.get_product_cache().load_all()
+    except Exception as e:
+        logger.error(f"Error warming product cache: {str(e)}")
+
+    store = get_artifact_store()
+    publisher = ReleasePublisher(store, None, serving['activate_delay'])
+    publisher.publish(force=True)
+
+    listen_socket = socket.create_server((args.host, args.port), backlog=128)
+    listen_socket.set_inheritable(True)
+    # Fork supervisor trước khi start bất kỳ thread nào trong process cha
+    workers = WorkerSupervisor(args.workers, listen_socket)
+    workers.start()
+    publisher.workers = workers
+
+    ml_app.start_background_tasks(warm_started)
+    threading.Thread(target=publisher.run, args=(serving['release_interval'],), daemon=True).start()
+    threading.Thread(target=process_train_requests, args=(publisher,), daemon=True).start()
+
+    signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(
+        target=retrain_all, args=(publisher,), daemon=True).start())
+    signal.signal(signal.SIGTERM, lambda signum, frame: workers.request_stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: workers.request_stop())
+
+    logger.info(f"Serving on {args.host}:{args.port} with {args.workers} workers")
+    workers.wait()
+    workers.stop()
+
+if __name__ == '__main__':
+    main()
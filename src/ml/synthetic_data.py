@@ -0,0 +1,64 @@
+"""Dữ liệu giả lập dùng chung cho các test và benchmark (không cần DB)"""
+import numpy as np
+import pandas as pd
+from content_based_recommender import ContentBasedRecommender
+from interaction_store import InteractionStore
+
+def generate_products(n_products=10_000, n_categories=30, n_brands=200, seed=42):
+    """Sinh catalog giả lập có cùng cột với query trong PopularityRecommender.fit"""
+    rng = np.random.default_rng(seed)
+    review_count = rng.poisson(8, n_products)
+    return pd.DataFrame({
+        'product_id': np.arange(1, n_products + 1),
+        'name': [f"Sản phẩm {i}" for i in range(1, n_products + 1)],
+        'image_url': [f"/images/{i}.jpg" for i in range(1, n_products + 1)],
+        'description': '',
+        'created_at': pd.Timestamp.now().normalize() - pd.to_timedelta(rng.integers(0, 720, n_products), unit='D'),
+        'brand_name': [f"Brand {b}" for b in rng.integers(0, n_brands, n_products)],
+        'category_name': [f"Category {c}" for c in rng.integers(0, n_categories, n_products)],
+        'review_count': review_count,
+        'avg_rating': np.where(review_count > 0, rng.uniform(2.5, 5.0, n_products), 0),
+        'order_count': rng.poisson(5, n_products),
+        'sold_count': rng.poisson(20, n_products),
+        'min_price': rng.lognormal(15.2, 1.0, n_products).round(-3),
+        'max_price': 0,
+        'unique_viewers': rng.poisson(30, n_products),
+        'total_views': rng.poisson(110, n_products)
+    })
+
+WORDS = ['pin', 'camera', 'màn hình', 'sạc nhanh', 'chống nước', 'bluetooth', 'ram', 'ssd', 'gaming', 'mỏng nhẹ']
+TYPES = ['điện thoại', 'laptop', 'tai nghe', 'ốp lưng', 'sạc', 'chuột']
+
+def make_products(ids, seed):
+    """Sản phẩm giả lập có cùng cột với dữ liệu của ContentBasedRecommender"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'id': ids,
+        'name': [f"{TYPES[i % len(TYPES)]} model {rng.choice(WORDS)}" for i in ids],
+        'description': [' '.join(rng.choice(WORDS, 5)) for _ in ids],
+        'category_name': [f"category {i % 4}" for i in ids],
+        'brand_name': [f"brand {i % 7}" for i in ids],
+        'min_price': rng.integers(100, 5000, len(ids)) * 1000.0,
+        'max_price': rng.integers(5000, 9000, len(ids)) * 1000.0
+    })
+
+def fitted(products):
+    """Content-based (hashing) fit trực tiếp từ products, không cần DB"""
+    recommender = ContentBasedRecommender()
+    recommender.vectorizer_mode = 'hashing'
+    recommender.neighbors_k = 20
+    recommender.product_features = products.copy()
+    recommender._extract_text_features()
+    recommender._build_feature_arrays()
+    recommender._calculate_similarity()
+    return recommender
+
+def make_store(n_users=200, n_items=120, density=0.05, seed=0):
+    """Tạo store từ dữ liệu tương tác ngẫu nhiên"""
+    rng = np.random.default_rng(seed)
+    dense = np.where(rng.random((n_users, n_items)) < density, rng.random((n_users, n_items)), 0.0)
+    rows, cols = np.nonzero(dense)
+    user_ids = np.arange(1, n_users + 1)
+    item_ids = np.arange(1000, 1000 + n_items)
+    store = InteractionStore.from_interactions(user_ids[rows], item_ids[cols], dense[rows, cols])
+    return store, dense
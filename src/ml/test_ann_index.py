@@ -0,0 +1,65 @@
+import numpy as np
+from ann_index import IVFInnerProductIndex
+from collaborative_recommender import CollaborativeRecommender
+from synthetic_data import make_store
+
+def make_items(n_items=3000, dim=16, n_clusters=30, seed=0):
+    """Vector item phân cụm (giống factors thật hơn dữ liệu đều)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 1, (n_clusters, dim))
+    items = centers[rng.integers(0, n_clusters, n_items)] + rng.normal(0, 0.3, (n_items, dim))
+    return items, rng.normal(0, 1, (100, dim))
+
+def recall(index, items, queries, k, nprobe):
+    hits = 0
+    for query in queries:
+        truth = np.argsort(-items.dot(query))[:k]
+        hits += len(set(truth.tolist()) & set(index.search(query, k, nprobe=nprobe)[0].tolist()))
+    return hits / (k * len(queries))
+
+def test_recall_against_brute_force():
+    items, queries = make_items()
+    index = IVFInnerProductIndex(n_lists=50, nprobe=8).build(items)
+    assert recall(index, items, queries, k=10, nprobe=8) >= 0.95
+    assert recall(index, items, queries, k=10, nprobe=50) == 1.0
+    # Điểm trả về là inner product chính xác, giảm dần
+    found, scores = index.search(queries[0], 10)
+    np.testing.assert_allclose(scores, items[found].dot(queries[0]))
+    assert (np.diff(scores) <= 0).all()
+
+def test_exclude():
+    items, queries = make_items()
+    index = IVFInnerProductIndex(n_lists=50, nprobe=8).build(items)
+    for query in queries[:20]:
+        exclude = np.argsort(-items.dot(query))[:15]
+        found, _ = index.search(query, 10, exclude=exclude)
+        assert len(found) == 10 and not np.isin(found, exclude).any()
+    # Loại hết item của các cụm được duyệt: không trả về -inf
+    found, _ = index.search(queries[0], 10, nprobe=50, exclude=np.arange(len(items) - 3))
+    assert sorted(found.tolist()) == [len(items) - 3, len(items) - 2, len(items) - 1]
+
+def test_folded_in_items_missing_until_refactorize():
+    store, _ = make_store(n_users=200, n_items=120)
+    recommender = CollaborativeRecommender(engine='svd', ann_min_items=50)
+    recommender.user_item_matrix = store
+    recommender._factorize()
+    index = recommender.ann_index
+    assert index is not None and index.n_items == 120
+
+    # Item mới được fold-in vào item_factors nhưng index chỉ build lại khi refactorize
+    assert recommender.update_user_item(1, 5000, 3)
+    new_item = store.item_index(5000)
+    query = recommender.user_factors[store.user_index(2)]
+    found, _ = index.search(query, store.n_items, nprobe=len(index.centroids))
+    assert new_item not in found.tolist() and len(found) == 120
+    assert 5000 not in recommender.recommend_scored(2, n_items=store.n_items)[0].tolist()
+
+    assert recommender.refactorize()
+    found, _ = recommender.ann_index.search(query, store.n_items, nprobe=len(recommender.ann_index.centroids))
+    assert new_item in found.tolist()
+
+if __name__ == "__main__":
+    test_recall_against_brute_force()
+    test_exclude()
+    test_folded_in_items_missing_until_refactorize()
+    print("All tests passed")
@@ -31,11 +31,11 @@ def test_collaborative_recommender():
 
         # 3. Kiểm tra kích thước ma trận
         logger.info(f"User-Item Matrix Shape: {recommender.user_item_matrix.shape}")
-        logger.info(f"Number of users: {len(recommender.user_item_matrix.index)}")
-        logger.info(f"Number of items: {len(recommender.user_item_matrix.columns)}")
+        logger.info(f"Number of users: {recommender.user_item_matrix.n_users}")
+        logger.info(f"Number of items: {recommender.user_item_matrix.n_items}")
 
         # 4. Test với một số user
-        test_users = recommender.user_item_matrix.index[:5]
+        test_users = recommender.user_item_matrix.user_ids[:5]
         for user_id in test_users:
             recs = recommender.recommend(user_id, n_items=5)
             
@@ -61,23 +61,23 @@ def test_collaborative_recommender():
                 )
 
         # 5. Đánh giá độ chính xác
-        if len(recommender.user_item_matrix.index) > 1:
+        if recommender.user_item_matrix.n_users > 1:
             test_ratio = 0.2
-            test_mask = np.random.rand(*recommender.user_item_matrix.shape) < test_ratio
-            train = recommender.user_item_matrix.copy()
-            test = recommender.user_item_matrix.copy()
+            matrix = recommender.user_item_matrix.to_dataframe()
+            test_mask = np.random.rand(*matrix.shape) < test_ratio
+            train = matrix.copy()
+            test = matrix.copy()
             
             train[test_mask] = 0
             test[~test_mask] = 0
             
             recommender = CollaborativeRecommender()
-            recommender.user_item_matrix = train
             recommender.fit(conn)
             
             predictions = []
             actuals = []
             
-            for user_id in recommender.user_item_matrix.index:
+            for user_id in recommender.user_item_matrix.user_ids:
                 if user_id in test.index:
                     pred = recommender.recommend(user_id)
                     if pred:  # Chỉ tính khi có predictions
@@ -1,4 +1,5 @@
-from src.ml.content_based_recommender import ContentBasedRecommender
+from content_based_recommender import ContentBasedRecommender
+from db_pool import get_connection
 import logging
 import pandas as pd
 
@@ -17,7 +18,8 @@ def test_model():
         recommender.fit()  # Không cần truyền conn nữa
 
         # 2. Test với một số sản phẩm mẫu
-        test_products = get_test_products(recommender.conn)
+        with get_connection() as conn:
+            test_products = get_test_products(conn)
         
         logger.info("\nTesting recommendations for sample products:")
         for product_id in test_products['id']:
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+from synthetic_data import make_products, fitted
+
+def test_incremental_update_and_compaction():
+    """Thêm/sửa/xóa incremental; compact cho kết quả giống fit lại từ đầu"""
+    products = make_products(np.arange(1, 201), seed=0)
+    recommender = fitted(products)
+    added = make_products(np.arange(201, 221), seed=1)
+    edited = make_products(np.arange(5, 10), seed=2)
+
+    assert recommender.apply_product_changes(pd.concat([added, edited]), deleted_ids=[1, 2]) == 27
+    assert 1 not in recommender.id_to_row and 215 in recommender.id_to_row
+    assert recommender.doc_freq.sum() == recommender.tf_matrix[recommender.alive].getnnz()
+
+    results = recommender.recommend(215, n_items=8)
+    assert len(results) == 8
+    assert all(rec['id'] not in (1, 2, 215) for rec in results)
+    report = recommender.drift_report(sample_size=50)
+    assert report['dead_rows'] == 7 and report['overlap@8'] > 0.8
+
+    # Fit lại từ đầu trên catalog sau thay đổi, cùng thứ tự dòng
+    current = pd.concat([products[products['id'] > 2], added, edited])
+    current = current.drop_duplicates('id', keep='last').set_index('id').loc[
+        list(recommender.id_to_row)].reset_index()
+    reference = fitted(current)
+
+    recommender.compact()
+    assert not recommender.needs_compaction()
+    assert len(recommender.product_features) == 218
+    for product_id in (3, 7, 150, 215):
+        assert ([rec['id'] for rec in recommender.recommend(product_id)] ==
+                [rec['id'] for rec in reference.recommend(product_id)])
+
+if __name__ == "__main__":
+    test_incremental_update_and_compaction()
+    print("All tests passed")
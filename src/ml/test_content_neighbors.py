@@ -0,0 +1,48 @@
+import os
+import tempfile
+import numpy as np
+from scipy.sparse import random as sparse_random
+from sklearn.preprocessing import normalize
+from content_based_recommender import top_k_neighbors_block
+
+def test_top_k_neighbors_block():
+    """Bảng top-k theo block khớp với cosine dense, không chứa chính nó"""
+    matrix = normalize(sparse_random(300, 50, density=0.1, format='csr', random_state=0))
+    dense = (matrix @ matrix.T).toarray()
+    np.fill_diagonal(dense, -np.inf)
+
+    indices, scores = [], []
+    for start in range(0, 300, 64):
+        block_indices, block_scores = top_k_neighbors_block(matrix, start, min(start + 64, 300), 10)
+        indices.append(block_indices)
+        scores.append(block_scores)
+    indices, scores = np.vstack(indices), np.vstack(scores)
+
+    assert indices.shape == (300, 10)
+    assert not (indices == np.arange(300)[:, None]).any()
+    assert (np.diff(scores, axis=1) <= 0).all()
+    np.testing.assert_allclose(scores, -np.sort(-dense, axis=1)[:, :10], rtol=1e-5)
+
+def test_save_load_neighbors():
+    from content_based_recommender import ContentBasedRecommender
+    import pandas as pd
+
+    recommender = ContentBasedRecommender()
+    recommender.product_features = pd.DataFrame({'id': np.arange(1, 6)})
+    recommender.neighbor_indices = np.arange(10, dtype=np.int32).reshape(5, 2)
+    recommender.neighbor_scores = np.ones((5, 2), dtype=np.float32)
+
+    path = os.path.join(tempfile.mkdtemp(), 'neighbors.npz')
+    recommender.save_neighbors(path)
+    recommender.neighbor_indices = None
+    assert recommender.load_neighbors(path)
+    assert recommender.neighbor_indices[4, 1] == 9
+
+    # Danh sách sản phẩm đã đổi -> không dùng bảng cũ
+    recommender.product_features = pd.DataFrame({'id': np.arange(2, 7)})
+    assert not recommender.load_neighbors(path)
+
+if __name__ == "__main__":
+    test_top_k_neighbors_block()
+    test_save_load_neighbors()
+    print("All tests passed")
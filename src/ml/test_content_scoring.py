@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import cosine_similarity
+from synthetic_data import make_products, fitted
+
+def baseline_scores(recommender, product_id, n_items=8):
+    """Vòng re-score cũ (DataFrame, .loc theo từng bonus) trên cosine cả dòng, dùng làm chuẩn"""
+    features = recommender.product_features
+    idx = features[features['id'] == product_id].index[0]
+    product = features.iloc[idx]
+    product_type = recommender._detect_product_type(product['name'])
+    base_similarities = cosine_similarity(
+        recommender.tfidf_matrix[idx:idx+1], recommender.tfidf_matrix).flatten()
+    scores_df = pd.DataFrame({
+        'index': range(len(base_similarities)),
+        'similarity': base_similarities,
+        'category': features['category_name'].fillna(''),
+        'brand': features['brand_name'].fillna(''),
+        'price': features['min_price'].fillna(0),
+        'name': features['name'].fillna(''),
+        'description': features['description'].fillna('')
+    })
+    scores_df = scores_df[scores_df['index'] != idx].copy()
+
+    max_sim = scores_df['similarity'].max()
+    if max_sim > 0:
+        scores_df['similarity'] = scores_df['similarity'] / max_sim * 0.3
+    scores_df.loc[scores_df['category'] == product['category_name'], 'similarity'] += 0.3
+    scores_df['similarity'] = scores_df['similarity'].clip(0, 0.6)
+    scores_df.loc[scores_df['brand'] == product['brand_name'], 'similarity'] += 0.2
+    scores_df['similarity'] = scores_df['similarity'].clip(0, 0.8)
+
+    base_price = product['min_price']
+    if base_price > 0:
+        price_diff = abs(scores_df['price'] - base_price) / base_price
+        scores_df.loc[price_diff <= 0.2, 'similarity'] += 0.15
+        scores_df.loc[(price_diff > 0.2) & (price_diff <= 0.3), 'similarity'] += 0.13
+        scores_df.loc[(price_diff > 0.3) & (price_diff <= 0.5), 'similarity'] += 0.10
+        scores_df.loc[price_diff > 0.5, 'similarity'] *= 0.5
+    scores_df['similarity'] = scores_df['similarity'].clip(0, 0.9)
+
+    if product_type in recommender.related_accessories:
+        acc_bonus = np.zeros(len(scores_df))
+        for group, bonus in (('primary', 0.10), ('secondary', 0.07)):
+            for keyword in recommender.related_accessories[product_type][group]:
+                mask = (
+                    scores_df['name'].str.lower().str.contains(keyword, na=False) |
+                    scores_df['description'].str.lower().str.contains(keyword, na=False)
+                )
+                acc_bonus = np.where(mask, bonus, acc_bonus)
+        scores_df['similarity'] = scores_df['similarity'] + acc_bonus
+    scores_df['similarity'] = scores_df['similarity'].clip(0, 0.95)
+
+    # Vòng cũ sort không ổn định; bản mới tách hòa theo dòng nên chuẩn cũng sort ổn định theo dòng
+    scores_df = scores_df.sort_values('similarity', ascending=False, kind='stable').head(n_items)
+    return features['id'].values[scores_df['index'].values], scores_df['similarity'].values
+
+def test_rescore_matches_baseline():
+    """Re-score vector hóa (qua bảng láng giềng top-K) cho cùng thứ tự và điểm với vòng cũ"""
+    recommender = fitted(make_products(np.arange(1, 301), seed=0))
+    for product_id in (1, 2, 3, 4, 5, 6, 50, 123, 299):
+        expected_ids, expected_scores = baseline_scores(recommender, product_id, n_items=12)
+        results = recommender.recommend(product_id, n_items=12)
+        assert [rec['id'] for rec in results] == expected_ids.tolist()
+        np.testing.assert_allclose([rec['similarity_score'] for rec in results], expected_scores, atol=1e-9)
+
+        ids, scores = recommender.recommend_scored(product_id, n_items=12)
+        assert ids.tolist() == expected_ids.tolist()
+        np.testing.assert_allclose(scores, expected_scores, atol=1e-9)
+
+def test_lookup_missing_and_added_ids():
+    """id_to_row cho sản phẩm đã fit/vừa thêm; id ngoài catalog đi đường sản phẩm mới (1 lần DB)"""
+    recommender = fitted(make_products(np.arange(1, 301), seed=0))
+    database = {int(row['id']): row for row in make_products(np.arange(301, 303), seed=3).to_dict('records')}
+    loaded = []
+    def load_product_row(product_id):
+        loaded.append(product_id)
+        return database.get(int(product_id))
+    recommender._load_product_row = load_product_row
+    assert all(recommender.product_features['id'].iloc[row] == product_id
+               for product_id, row in recommender.id_to_row.items())
+
+    # Không có ở đâu cả
+    assert recommender.recommend(999) == {}
+    ids, scores = recommender.recommend_scored(999)
+    assert len(ids) == 0 and len(scores) == 0
+    assert recommender._get_product_details(999) is None and 999 not in recommender.new_products
+
+    # Có trong DB nhưng thêm sau lần fit: vector hóa 1 lần rồi cache
+    loaded.clear()
+    new_ids, new_scores = recommender.recommend_scored(301, n_items=10)
+    assert len(new_ids) == 10 and 301 not in new_ids.tolist()
+    assert [rec['id'] for rec in recommender.recommend(301, n_items=10)] == new_ids.tolist()
+    assert recommender._get_product_details(301)['name'] == database[301]['name']
+    assert loaded == [301]
+
+    # Chèn vào ma trận: id_to_row trỏ tới dòng mới, bỏ cache; kết quả khớp đường sản phẩm mới
+    # (chỉ lệch do idf cập nhật theo sản phẩm vừa thêm)
+    recommender.apply_product_changes(pd.DataFrame([database[301]]))
+    row = recommender.id_to_row[301]
+    assert row == len(recommender.product_features) - 1 and 301 not in recommender.new_products
+    assert recommender.product_features['id'].iloc[row] == 301
+    ids, scores = recommender.recommend_scored(301, n_items=10)
+    assert ids.tolist() == new_ids.tolist()
+    np.testing.assert_allclose(scores, new_scores, atol=2e-3)
+    assert 301 in recommender.recommend_scored(133, n_items=len(recommender.product_features))[0].tolist()
+
+    # Sửa sản phẩm cũ: dòng cũ bị đánh dấu, id chỉ xuất hiện một lần
+    recommender.apply_product_changes(make_products(np.array([133]), seed=4))
+    assert recommender.id_to_row[133] == len(recommender.product_features) - 1
+    ids, _ = recommender.recommend_scored(301, n_items=len(recommender.product_features))
+    assert ids.tolist().count(133) == 1 and len(set(ids.tolist())) == len(ids)
+    assert loaded == [301]
+
+def test_top_rows_ties_at_cutoff():
+    """Điểm bị clip nên hay hòa ở ranh giới top n_items: luôn lấy dòng nhỏ trước"""
+    recommender = fitted(make_products(np.arange(1, 21), seed=0))
+    rng = np.random.default_rng(1)
+    scores = rng.integers(0, 3, 300).astype(np.float64)
+    scores[rng.integers(0, 300, 20)] = -np.inf
+    finite = np.flatnonzero(np.isfinite(scores))
+    for n_items in (1, 5, 37, 150, 400):
+        expected = finite[np.lexsort((finite, -scores[finite]))][:n_items]
+        assert recommender._top_rows(scores, n_items).tolist() == expected.tolist()
+
+if __name__ == "__main__":
+    test_rescore_matches_baseline()
+    test_lookup_missing_and_added_ids()
+    test_top_rows_ties_at_cutoff()
+    print("All tests passed")
@@ -0,0 +1,79 @@
+import threading
+import db_pool
+from db_pool import ConnectionPool, PoolTimeoutError
+
+class FakeConnection:
+    """Connection giả lập để test pool không cần MySQL"""
+    created = 0
+
+    def __init__(self, **kwargs):
+        FakeConnection.created += 1
+        self.alive = True
+        self.rollbacks = 0
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise ConnectionError("MySQL server has gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.alive = False
+
+def make_pool(**kwargs):
+    db_pool.mysql.connector.connect = FakeConnection
+    return ConnectionPool({}, **kwargs)
+
+def test_checkout_timeout_and_reuse():
+    """Hết connection thì chờ tới khi có connection được trả, quá timeout thì raise"""
+    original = db_pool.mysql.connector.connect
+    try:
+        pool = make_pool(min_size=1, max_size=2, checkout_timeout=0.2)
+        first = pool.get_connection()
+        second = pool.get_connection()
+        try:
+            pool.get_connection()
+            assert False, "expected PoolTimeoutError"
+        except PoolTimeoutError:
+            pass
+
+        raw = first._entry[0]
+        threading.Timer(0.05, first.close).start()
+        with pool.get_connection() as third:
+            # Dùng lại đúng connection vừa được trả, đã rollback transaction cũ
+            assert third._entry[0] is raw
+            assert raw.rollbacks == 1
+        second.close()
+
+        stats = pool.stats()
+        assert stats['created'] == 2
+        assert stats['timeouts'] == 1
+        assert stats['waits'] == 1
+        assert stats['in_use'] == 0 and stats['idle'] == 2
+    finally:
+        db_pool.mysql.connector.connect = original
+
+def test_health_check_replaces_dead_connection():
+    """Connection chết khi nằm trong pool được thay bằng connection mới"""
+    original = db_pool.mysql.connector.connect
+    try:
+        pool = make_pool(max_size=1, health_check_interval=0)
+        conn = pool.get_connection()
+        dead = conn._entry[0]
+        conn.close()
+        dead.alive = False
+
+        with pool.get_connection() as conn:
+            assert conn._entry[0] is not dead
+            assert conn.ping() is None
+        stats = pool.stats()
+        assert stats['health_check_failures'] == 1
+        assert stats['size'] == 1
+    finally:
+        db_pool.mysql.connector.connect = original
+
+if __name__ == "__main__":
+    test_checkout_timeout_and_reuse()
+    test_health_check_replaces_dead_connection()
+    print("All tests passed")
@@ -0,0 +1,233 @@
+import tempfile
+import time
+import numpy as np
+import config
+from hybrid_recommender import HybridRecommender
+from hybrid_candidates import CandidateTable, HybridCandidates
+from interaction_store import InteractionStore
+from model_store import ArtifactStore
+
+class FakeContent:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def recommend(self, product_id, n_items=8):
+        time.sleep(self.delay)
+        return [{'id': 100 + i} for i in range(n_items)]
+
+    def recommend_scored(self, product_id, n_items=8):
+        time.sleep(self.delay)
+        return np.arange(100, 100 + n_items), 1.0 / (1 + np.arange(n_items))
+
+class FakeCollaborative:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+
+    def recommend(self, user_id, n_items=8):
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("collaborative down")
+        return [200 + i for i in range(n_items)]
+
+    def recommend_scored(self, user_id, n_items=8):
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("collaborative down")
+        return np.arange(200, 200 + n_items), 4.0 - np.arange(n_items) * 0.5
+
+class FakePopularity:
+    def recommend(self, limit=8, **filters):
+        return [{'product_id': 300 + i} for i in range(limit)]
+
+    def top_products(self, n=100):
+        return np.arange(300, 300 + n), 1.0 / (1 + np.arange(n))
+
+class CardsHybrid(HybridRecommender):
+    """Thẻ sản phẩm dựng sẵn thay cho product cache (không cần DB)"""
+
+    def _get_product_details(self, product_ids, conn=None):
+        return {pid: {'product_id': pid, 'name': f"p{pid}", 'image_url': '', 'brand_name': 'b',
+                      'category_name': 'c', 'min_price': 1, 'max_price': 2} for pid in product_ids}
+
+def make_hybrid(content, collaborative):
+    return CardsHybrid.from_components(content, collaborative, FakePopularity())
+
+def test_parallel_fan_out():
+    # 2 nguồn chậm 0.2s chạy song song: tổng ~0.2s chứ không phải 0.4s
+    hybrid = make_hybrid(FakeContent(delay=0.2), FakeCollaborative(delay=0.2))
+    start = time.perf_counter()
+    recs, metadata = hybrid.recommend_with_metadata(user_id=1, product_id=2, n_items=8, deadline=1.0)
+    assert time.perf_counter() - start < 0.35
+    assert len(recs) == 8
+    assert {source['status'] for source in metadata['sources'].values()} == {'ok'}
+    assert not metadata['fallback']
+    assert metadata['sources']['content']['elapsed_ms'] >= 190
+    assert {rec['product_id'] for rec in recs} >= {100, 200}
+    assert metadata['sources']['content']['items'] == 100
+    assert recs[0]['score'] == 1.0
+
+def test_deadline_drops_late_source_and_falls_back():
+    hybrid = make_hybrid(FakeContent(), FakeCollaborative(delay=0.5))
+    start = time.perf_counter()
+    recs, metadata = hybrid.recommend_with_metadata(user_id=1, product_id=2, n_items=8, deadline=0.1)
+    assert time.perf_counter() - start < 0.3
+    assert metadata['sources']['collaborative']['status'] == 'timeout'
+    assert metadata['sources']['content']['status'] == 'ok'
+    assert metadata['fallback']
+    ids = [rec['product_id'] for rec in recs]
+    assert len(ids) == 8 and not any(200 <= pid < 300 for pid in ids)
+    assert any(pid >= 300 for pid in ids)
+
+    time.sleep(0.5)  # Chờ call trễ chạy xong, nếu không collaborative bị bỏ qua (skipped)
+    failing = make_hybrid(FakeContent(), FakeCollaborative(fail=True))
+    recs, metadata = failing.recommend_with_metadata(user_id=1, product_id=2, n_items=8, deadline=1.0)
+    assert metadata['sources']['collaborative']['status'] == 'error'
+    assert len(recs) == 8
+    assert failing.recommend(user_id=1, product_id=2, n_items=4, deadline=1.0)
+
+def test_late_source_is_skipped_until_it_finishes():
+    collaborative = FakeCollaborative(delay=0.5)
+    hybrid = make_hybrid(FakeContent(), collaborative)
+    _, metadata = hybrid.recommend_with_metadata(user_id=1, product_id=2, n_items=8, deadline=0.1)
+    assert metadata['sources']['collaborative']['status'] == 'timeout'
+
+    # Call trễ vẫn đang chạy: request sau không gọi lại collaborative (không chiếm thêm thread)
+    collaborative.delay = 0.0
+    recs, metadata = hybrid.recommend_with_metadata(user_id=1, product_id=2, n_items=8, deadline=0.1)
+    assert metadata['sources']['collaborative'] == {'status': 'timeout', 'elapsed_ms': 0.0, 'items': 0, 'skipped': True}
+    assert metadata['fallback'] and len(recs) == 8
+
+    # Call trễ chạy xong thì nguồn được gọi lại bình thường
+    time.sleep(0.5)
+    _, metadata = hybrid.recommend_with_metadata(user_id=1, product_id=2, n_items=8, deadline=0.5)
+    assert metadata['sources']['collaborative']['status'] == 'ok'
+
+def test_candidate_table():
+    table = CandidateTable(
+        [7, 9],
+        np.array([[5, 6, -1], [8, -1, -1]], dtype=np.int32),
+        np.array([[0.9, 0.5, -np.inf], [0.3, -np.inf, -np.inf]], dtype=np.float32)
+    )
+    item_ids, scores = table.get(7)
+    assert item_ids.tolist() == [5, 6] and np.allclose(scores, [0.9, 0.5])
+    assert table.get(9, n=1)[0].tolist() == [8]
+    assert table.get(1) is None and 9 in table
+
+def test_user_only_and_product_only_modes():
+    # Không có bảng tính sẵn: gọi model trực tiếp
+    hybrid = make_hybrid(FakeContent(), FakeCollaborative())
+    recs, metadata = hybrid.recommend_with_metadata(user_id=1, n_items=8)
+    assert metadata['mode'] == 'user' and 'content' not in metadata['sources']
+    assert not metadata['sources']['collaborative'].get('cached')
+    assert recs[0]['product_id'] == 200 and recs[0]['reason'] == "Rất phù hợp với sở thích của bạn"
+
+    recs, metadata = hybrid.recommend_with_metadata(product_id=300, n_items=8)
+    assert metadata['mode'] == 'product' and 'collaborative' not in metadata['sources']
+    ids = [rec['product_id'] for rec in recs]
+    assert ids[0] == 100 and len(ids) == 8 and 300 not in ids  # không gợi ý chính sản phẩm đang xem
+    assert hybrid.recommend() == []
+
+    # Bảng tính sẵn: request không gọi model (model chậm cũng không ảnh hưởng)
+    hybrid = make_hybrid(FakeContent(delay=1.0), FakeCollaborative(delay=1.0))
+    hybrid.product_candidates = CandidateTable(
+        [300], np.arange(400, 500, dtype=np.int32)[None, :], np.linspace(1, 0, 100, dtype=np.float32)[None, :]
+    )
+    hybrid.user_candidates = CandidateTable(
+        [1], np.arange(500, 600, dtype=np.int32)[None, :], np.linspace(1, 0, 100, dtype=np.float32)[None, :]
+    )
+    start = time.perf_counter()
+    recs, metadata = hybrid.recommend_with_metadata(product_id=300, n_items=8, deadline=0.5)
+    assert time.perf_counter() - start < 0.2
+    assert metadata['sources']['content']['cached'] and recs[0]['product_id'] == 400
+    recs, metadata = hybrid.recommend_with_metadata(user_id=1, n_items=8, deadline=0.5)
+    assert metadata['sources']['collaborative']['cached'] and recs[0]['product_id'] == 500
+    assert not metadata['fallback']
+
+def test_candidates_artifact_and_live_filter():
+    # Candidate lưu thành artifact rồi load lại bằng mmap như các model khác
+    users = CandidateTable(
+        [1], np.arange(500, 600, dtype=np.int32)[None, :], np.linspace(1, 0, 100, dtype=np.float32)[None, :]
+    )
+    store = ArtifactStore(tempfile.mkdtemp())
+    store.save('hybrid_candidates', HybridCandidates(users=users))
+    loaded, _ = store.load('hybrid_candidates', HybridCandidates)
+    assert loaded.products is None and isinstance(loaded.users.item_ids, np.memmap)
+    assert loaded.users.get(1, 3)[0].tolist() == [500, 501, 502]
+
+    # User tương tác với 500, 502 sau lúc tính bảng: bị loại theo hàng hiện tại của ma trận
+    collaborative = FakeCollaborative(delay=1.0)
+    collaborative.user_item_matrix = InteractionStore.from_interactions([1, 1], [450, 500], [1.0, 1.0])
+    matrix = collaborative.user_item_matrix
+    matrix.set(matrix.user_index(1), matrix.add_item(502), 1.0)
+    hybrid = CardsHybrid.from_components(FakeContent(), collaborative, FakePopularity(), candidates=loaded)
+    recs, metadata = hybrid.recommend_with_metadata(user_id=1, n_items=8, deadline=0.5)
+    ids = [rec['product_id'] for rec in recs]
+    assert metadata['sources']['collaborative']['cached'] and ids[:2] == [501, 503]
+    assert 500 not in ids and 502 not in ids
+
+def fake_train_component(name, conn=None):
+    """Train model thành phần từ dữ liệu giả lập (không cần DB), chậm 0.3s mỗi model"""
+    from collaborative_recommender import CollaborativeRecommender
+    from popularity_recommender import PopularityRecommender
+    from synthetic_data import fitted, generate_products, make_products, make_store
+    time.sleep(0.3)
+    if name == 'content_based':
+        return fitted(make_products(np.arange(1, 301), 0))
+    if name == 'collaborative':
+        model = CollaborativeRecommender()
+        model.user_item_matrix = make_store()[0]
+        model._factorize()
+        return model
+    if name == 'popularity' and FAIL_POPULARITY:
+        raise RuntimeError("popularity query failed")
+    return PopularityRecommender().fit_products(generate_products(300))
+
+FAIL_POPULARITY = False
+
+class FakeTrainedHybrid(HybridRecommender):
+    # Process con (spawn) import lại hàm này theo tên module
+    component_trainer = staticmethod(fake_train_component)
+
+def test_parallel_fit():
+    global FAIL_POPULARITY
+    # 3 model chạy song song: không phải tổng thời gian của 3 model
+    config.HYBRID_CONFIG['fit_processes'] = False
+    try:
+        hybrid = FakeTrainedHybrid()
+        start = time.perf_counter()
+        assert hybrid.fit()
+        assert time.perf_counter() - start < sum(report['duration'] for report in hybrid.fit_report.values())
+    finally:
+        config.HYBRID_CONFIG['fit_processes'] = True
+
+    # Collaborative/content-based train trong process con (spawn)
+    hybrid = FakeTrainedHybrid()
+    assert hybrid.fit()
+    assert {report['status'] for report in hybrid.fit_report.values()} == {'ok'}
+    # Model dựng lại từ artifact của process con vẫn gợi ý được
+    assert len(hybrid.content_based.recommend_scored(1, 5)[0]) == 5
+    user_id = int(hybrid.collaborative.user_item_matrix.user_ids[0])
+    assert len(hybrid.collaborative.recommend_scored(user_id, 5)[0]) == 5
+
+    # Model lỗi không ảnh hưởng model khác; model truyền vào được dùng lại
+    FAIL_POPULARITY = True
+    try:
+        retrained = FakeTrainedHybrid()
+        assert not retrained.fit(reuse={'content_based': hybrid.content_based})
+    finally:
+        FAIL_POPULARITY = False
+    assert retrained.content_based is hybrid.content_based
+    assert retrained.fit_report['content_based']['status'] == 'reused'
+    assert retrained.fit_report['collaborative']['status'] == 'ok'
+    assert retrained.fit_report['popularity']['status'] == 'error'
+
+if __name__ == "__main__":
+    test_parallel_fan_out()
+    test_deadline_drops_late_source_and_falls_back()
+    test_late_source_is_skipped_until_it_finishes()
+    test_candidate_table()
+    test_user_only_and_product_only_modes()
+    test_candidates_artifact_and_live_filter()
+    test_parallel_fit()
+    print("All tests passed")
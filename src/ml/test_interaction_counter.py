@@ -0,0 +1,86 @@
+from interaction_counter import InteractionCounter
+from recommender import RecommenderSystem
+
+class FakeCursor:
+    def __init__(self, rows, views, on_execute=None):
+        self.rows = rows
+        self.views = views
+        self.on_execute = on_execute
+        self.query = None
+
+    def execute(self, query, params=None):
+        self.query = query
+        if self.on_execute and query == InteractionCounter.BULK_QUERY:
+            self.on_execute()
+
+    def fetchall(self):
+        return self.rows if self.query == InteractionCounter.BULK_QUERY else self.views
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self, rows, views=(), on_execute=None):
+        self.rows = rows
+        self.views = views
+        self.on_execute = on_execute
+
+    def cursor(self):
+        return FakeCursor(self.rows, self.views, self.on_execute)
+
+def test_interaction_counter():
+    counter = InteractionCounter()
+    assert not counter.is_loaded
+    counter.load(FakeConnection([(1, 5), (2, 2)], views=[(2, 10)]))
+
+    assert counter.has_min_interactions(1, 5)
+    assert not counter.has_min_interactions('2', 3)
+    assert counter.count(99) == 0
+
+    # Event từ /api/track cập nhật ngay, action không được lưu vào DB thì bỏ qua
+    counter.record_event('2', '11', 'view')
+    counter.record_event(2, 11, 'cart')
+    assert counter.count(2) == 3
+    counter.record_event(99, 11, 'purchase')
+    assert counter.count(99) == 1
+
+    # Xem lại sản phẩm đã xem (có sẵn trong DB hoặc từ event) không tạo dòng mới
+    counter.record_event(2, 10, 'view')
+    counter.record_event(2, 11, 'view')
+    assert counter.count(2) == 3
+
+    # Đối soát: DB là chuẩn, event đến trong lúc query được cộng lại; view đã có trong
+    # kết quả DB thì không cộng thêm
+    def events_during_load():
+        counter.increment(3)
+        counter.record_event(2, 11, 'view')
+        counter.record_event(2, 12, 'view')
+
+    drift = counter.load(FakeConnection([(1, 5), (2, 4)], views=[(2, 10), (2, 11)], on_execute=events_during_load))
+    assert counter.count(2) == 5
+    assert counter.count(99) == 0
+    assert counter.count(3) == 1
+    assert drift == 2
+    assert counter.stats()['users'] == 3
+    counter.record_event(2, 12, 'view')
+    assert counter.count(2) == 5
+
+def test_recommender_system_interactions():
+    system = RecommenderSystem()
+    # Bộ đếm chưa load: đếm bằng query trên connection
+    system.conn = FakeConnection([(4,)])
+    assert system.has_interaction_history(1, min_interactions=3)
+
+    system.interaction_counter.load(FakeConnection([(1, 2)], views=[(1, 10)]))
+    system.record_interaction(1, 10, 'view')
+    assert not system.has_interaction_history(1)
+    system.record_interaction(1, 11, 'view')
+    assert system.has_interaction_history(1)
+
+if __name__ == "__main__":
+    test_interaction_counter()
+    test_recommender_system_interactions()
+    print("All tests passed")
@@ -0,0 +1,142 @@
+import logging
+import numpy as np
+import config
+from collaborative_recommender import CollaborativeRecommender, ImplicitALS
+from synthetic_data import make_store
+
+# Cấu hình logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def test_interaction_store():
+    store, dense = make_store()
+
+    # 1. Id maps và thống kê cơ bản
+    assert store.shape == dense.shape
+    assert store.nnz == np.count_nonzero(dense)
+    assert store.user_index(1) == 0 and store.item_index(1000) == 0
+    assert store.user_index(99999) is None
+    np.testing.assert_allclose(store.row_means(), dense.mean(axis=1))
+
+    # 2. Cập nhật ô có sẵn, ô mới và user/item mới
+    store.set(0, 0, 0.5)
+    new_user = store.add_user(99999)
+    new_item = store.add_item(5000)
+    store.set(new_user, new_item, 0.7)
+    assert store.get(new_user, new_item) == 0.7
+    assert store.shape == (dense.shape[0] + 1, dense.shape[1] + 1)
+
+    indices, values = store.user_row(new_user)
+    assert indices.tolist() == [new_item] and values.tolist() == [0.7]
+    indices, _ = store.item_column(new_item)
+    assert indices.tolist() == [new_user]
+
+    # 3. Compact giữ nguyên dữ liệu
+    nnz = store.nnz
+    matrix = store.tocsr()
+    assert matrix.shape == store.shape and matrix.nnz == nnz
+    assert store.get(new_user, new_item) == 0.7
+    logger.info(f"Interaction store OK - shape {store.shape}, sparsity {store.sparsity()}%")
+
+def test_collaborative_fold_in():
+    store, dense = make_store()
+    recommender = CollaborativeRecommender()
+    recommender.user_item_matrix = store
+    recommender._factorize()
+
+    # Fold-in lại 1 user có sẵn phải gần với factor từ SVD
+    expected = recommender.user_factors[3].copy()
+    recommender._fold_in_user(3)
+    assert np.abs(recommender.user_factors[3] - expected).max() < 0.05
+
+    # Tương tự cho item: cùng hệ số regularization với SVD, gram nghịch đảo cập nhật hạng 1
+    expected = recommender.item_factors[7].copy()
+    recommender._fold_in_item(7)
+    assert np.abs(recommender.item_factors[7] - expected).max() < 0.05 * np.abs(expected).max()
+    k = recommender.item_factors.shape[1]
+    np.testing.assert_allclose(
+        recommender._item_gram_inv,
+        np.linalg.inv(recommender.item_factors.T.dot(recommender.item_factors) + recommender.fold_in_reg * np.eye(k)),
+        atol=1e-8
+    )
+
+    # Event cho user/item mới không chạy lại SVD
+    assert recommender.update_user_item(99999, 5000, 3)
+    assert len(recommender.user_factors) == store.n_users
+    assert len(recommender.item_factors) == store.n_items
+    recs = recommender.recommend(99999, n_items=5)
+    assert len(recs) == 5 and 5000 not in recs
+    logger.info(f"Fold-in OK - drift {recommender.refactor_drift():.4f}")
+
+def test_recommend_many_matches_single_user():
+    store, dense = make_store()
+    recommender = CollaborativeRecommender(engine='svd', ann_min_items=10 ** 6)
+    recommender.user_item_matrix = store
+    recommender._factorize()
+
+    # Nhiều chunk (chunk_size nhỏ), có user không tồn tại ở giữa
+    user_ids = list(range(1, 16)) + [99999] + list(range(16, 31))
+    n_items = dense.shape[1] - 4
+    item_ids, scores = recommender.recommend_many(user_ids, n_items=n_items, chunk_size=7)
+    assert item_ids.shape == scores.shape == (len(user_ids), n_items)
+    assert item_ids.dtype == np.int32 and scores.dtype == np.float32
+
+    for position, user_id in enumerate(user_ids):
+        expected_ids, expected_scores = recommender.recommend_scored(user_id, n_items=n_items)
+        n = len(expected_ids)
+        assert item_ids[position, :n].tolist() == expected_ids.tolist()
+        np.testing.assert_allclose(scores[position, :n], expected_scores, rtol=1e-5)
+        # Ô trống (user không tồn tại / không đủ item chưa tương tác) được đệm -1 / -inf
+        assert (item_ids[position, n:] == -1).all() and np.isneginf(scores[position, n:]).all()
+        if user_id == 99999:
+            assert n == 0
+        else:
+            interacted = 1000 + np.flatnonzero(dense[user_id - 1])
+            assert n == min(n_items, dense.shape[1] - len(interacted))
+            assert not np.isin(item_ids[position], interacted).any()
+
+def test_als_engine():
+    store, dense = make_store()
+    recommender = CollaborativeRecommender(engine='als')
+    recommender.user_item_matrix = store
+    recommender._factorize()
+    user_factors, item_factors = recommender.user_factors, recommender.item_factors
+
+    # Loss weighted ALS thấp hơn nhiều so với factors ngẫu nhiên, ô đã tương tác được chấm điểm cao hơn
+    alpha, reg = config.ALS_CONFIG['alpha'], config.ALS_CONFIG['regularization']
+    observed = dense > 0
+    confidence = 1 + alpha * dense
+
+    def loss(users, items):
+        return ((confidence * (observed - users.dot(items.T)) ** 2).sum()
+                + reg * ((users ** 2).sum() + (items ** 2).sum()))
+
+    rng = np.random.default_rng(1)
+    random_loss = loss(rng.normal(0, 0.1, user_factors.shape), rng.normal(0, 0.1, item_factors.shape))
+    assert loss(user_factors, item_factors) < 0.2 * random_loss
+    scores = user_factors.dot(item_factors.T)
+    assert scores[observed].mean() > scores[~observed].mean() + 0.5
+
+    # Kết quả không phụ thuộc số thread (mỗi hàng giải độc lập)
+    matrix = store.tocsr() * alpha
+    single = ImplicitALS(n_threads=1, iterations=3).fit(matrix)
+    threaded = ImplicitALS(n_threads=4, iterations=3).fit(matrix)
+    np.testing.assert_allclose(single[0], threaded[0])
+    np.testing.assert_allclose(single[1], threaded[1])
+
+    # Fold-in user có sẵn = nghiệm đúng của hàng đó với item_factors hiện tại, gần factor đã fit
+    expected = user_factors[3].copy()
+    weights = confidence[3]
+    exact = np.linalg.solve(
+        item_factors.T.dot(weights[:, None] * item_factors) + reg * np.eye(item_factors.shape[1]),
+        item_factors.T.dot(weights * observed[3])
+    )
+    recommender._fold_in_user(3)
+    np.testing.assert_allclose(recommender.user_factors[3], exact, atol=1e-3)
+    assert np.linalg.norm(recommender.user_factors[3] - expected) < 0.15 * np.linalg.norm(expected)
+
+if __name__ == "__main__":
+    test_interaction_store()
+    test_collaborative_fold_in()
+    test_recommend_many_matches_single_user()
+    test_als_engine()
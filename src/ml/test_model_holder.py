@@ -0,0 +1,88 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from model_holder import ModelHolder
+
+def make_holder(delay=0.2):
+    calls = []
+
+    def train_fn():
+        calls.append(1)
+        time.sleep(delay)
+        return f"model-{len(calls)}"
+
+    return ModelHolder('test', train_fn), calls
+
+def test_cold_start_single_flight():
+    """Nhiều request đồng thời lúc cold start chỉ kích hoạt 1 lượt train"""
+    holder, calls = make_holder()
+    results = []
+
+    def request():
+        holder.train(wait=True)
+        results.append(holder.get())
+
+    threads = [threading.Thread(target=request) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == ['model-1'] * 20
+    assert holder.version == 1
+
+def test_stale_while_revalidate():
+    """Quá soft TTL: trả ngay version cũ, đúng 1 lượt train ở background"""
+    holder, calls = make_holder()
+    holder.train()
+    holder.publish(holder.get(), trained_from=datetime.now() - timedelta(seconds=100))
+
+    started = [holder.refresh(soft_ttl=50) for _ in range(10)]
+    assert started.count(True) == 1
+    assert holder.get() == 'model-1'
+
+    while holder.is_training:
+        time.sleep(0.01)
+    assert holder.get() == 'model-2'
+    assert len(calls) == 2
+    # Version mới chưa quá soft TTL -> không train lại
+    assert not holder.refresh(soft_ttl=50)
+
+def test_retry_backoff_after_failure():
+    """Train lỗi thì giữ version cũ và không thử lại trước retry_interval"""
+    holder, _ = make_holder(delay=0)
+    holder.train()
+    holder._train_fn = lambda: 1 / 0
+    holder.publish(holder.get(), trained_from=datetime.now() - timedelta(seconds=100))
+
+    assert not holder.train()
+    assert holder.get() == 'model-1'
+    assert holder.last_error
+    assert not holder.refresh(soft_ttl=50, retry_interval=60)
+
+def test_publish_compare_and_swap():
+    """publish với expected_version cũ không ghi đè version mới hơn"""
+    holder, _ = make_holder(delay=0)
+    holder.train()
+    holder.train()
+    assert holder.publish('stale-snapshot', expected_version=1) is None
+    assert holder.get() == 'model-2'
+    assert holder.publish('snapshot', expected_version=2) == 3
+
+def test_read_only_holder():
+    """Holder read-only (worker) chỉ nhận version publish từ ngoài, không tự train"""
+    holder, calls = make_holder(delay=0)
+    holder.read_only = True
+    assert not holder.train(wait=True)
+    holder.publish('released', trained_from=datetime.now() - timedelta(seconds=100))
+    assert not holder.refresh(soft_ttl=50)
+    assert holder.get() == 'released' and calls == []
+
+if __name__ == "__main__":
+    test_cold_start_single_flight()
+    test_stale_while_revalidate()
+    test_retry_backoff_after_failure()
+    test_publish_compare_and_swap()
+    test_read_only_holder()
+    print("All tests passed")
@@ -0,0 +1,123 @@
+import json
+import os
+import tempfile
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from model_store import ArtifactStore, frame_to_arrays, frame_from_arrays
+from collaborative_recommender import CollaborativeRecommender
+from popularity_recommender import PopularityRecommender
+from synthetic_data import make_products, fitted
+
+def make_popularity_frame(product_ids, names, scores):
+    n = len(product_ids)
+    return pd.DataFrame({
+        'product_id': product_ids, 'name': names, 'popularity_score': scores,
+        'category_name': [f"category {i}" for i in range(n)], 'brand_name': [f"brand {i}" for i in range(n)],
+        'min_price': [1e6 * (i + 1) for i in range(n)], 'avg_rating': [4.5] * n, 'review_count': [3] * n,
+        'sold_count': [10] * n, 'total_views': [100] * n, 'unique_viewers': [20] * n
+    })
+
+def make_collaborative(n_users=120, n_items=80, seed=0):
+    rng = np.random.default_rng(seed)
+    n = 1500
+    interactions = pd.DataFrame({
+        'user_id': rng.integers(1, n_users + 1, n),
+        'product_id': rng.integers(1000, 1000 + n_items, n),
+        'rating': rng.integers(0, 6, n).astype(float),
+        'purchase_count': rng.integers(0, 3, n),
+        'view_count': rng.integers(1, 20, n),
+        'review_count': rng.integers(0, 2, n)
+    }).drop_duplicates(['user_id', 'product_id'])
+    return CollaborativeRecommender(engine='svd', ann_min_items=50).fit_interactions(interactions)
+
+def test_frame_round_trip():
+    """Cột chuỗi (có None), số, datetime được giữ nguyên sau khi lưu/load"""
+    df = pd.DataFrame({
+        'name': ['Điện thoại', None, 'Tai nghe'],
+        'price': [1.5, 2.0, 3.25],
+        'created_at': pd.to_datetime(['2024-01-01', '2024-02-01', '2024-03-01'])
+    })
+    arrays, spec = frame_to_arrays(df, 'f_')
+    restored = frame_from_arrays(arrays, json.loads(json.dumps(spec)))
+    assert restored['name'].isna().tolist() == [False, True, False]
+    assert restored['name'].fillna('').tolist() == ['Điện thoại', '', 'Tai nghe']
+    assert restored['price'].tolist() == [1.5, 2.0, 3.25]
+    assert (restored['created_at'] == df['created_at']).all()
+
+def test_save_load_recommenders():
+    """Model load từ artifact (mmap) gợi ý giống hệt model gốc"""
+    store = ArtifactStore(tempfile.mkdtemp(), keep_versions=2)
+
+    collaborative = make_collaborative()
+    store.save('collaborative', collaborative, trained_from=datetime(2024, 1, 1))
+    loaded, manifest = store.load('collaborative', CollaborativeRecommender)
+    assert manifest['trained_from'] == '2024-01-01T00:00:00'
+    assert isinstance(loaded.item_factors, np.memmap)
+    for user_id in (1, 5, 42):
+        assert loaded.recommend(user_id) == collaborative.recommend(user_id)
+    # Fold-in chạy trên snapshot nên không ghi vào mảng mmap chỉ đọc
+    before = {user_id: loaded.recommend(user_id) for user_id in (1, 5, 42)}
+    user_factors = np.array(loaded.user_factors)
+    working = loaded.snapshot()
+    assert working.update_user_item(1, 1001, 1.0)
+    assert working.update_user_item(99999, 1002, 1.0)
+    assert loaded.user_item_matrix.user_index(99999) is None
+    assert np.array_equal(loaded.user_factors, user_factors)
+    assert {user_id: loaded.recommend(user_id) for user_id in (1, 5, 42)} == before
+
+    content = fitted(make_products(np.arange(1, 151), seed=0))
+    store.save('content_based', content)
+    loaded, _ = store.load('content_based', type(content))
+    for product_id in (3, 77, 150):
+        assert loaded.recommend(product_id) == content.recommend(product_id)
+    assert loaded.snapshot().apply_product_changes(make_products(np.arange(151, 156), seed=1)) == 5
+
+    popularity = PopularityRecommender()
+    popularity.recommendations = make_popularity_frame([3, 1, 2], ['c', 'a', 'b'], [0.9, 0.5, 0.1])
+    popularity.last_train_time = datetime(2024, 1, 2)
+    store.save('popularity', popularity)
+    loaded, _ = store.load('popularity', PopularityRecommender)
+    assert loaded.recommendations.to_dict('records') == popularity.recommendations.to_dict('records')
+    assert loaded.last_train_time == popularity.last_train_time
+
+def test_versions_and_incompatible_format():
+    """CURRENT trỏ tới version mới nhất, version cũ bị dọn, format khác bị bỏ qua"""
+    store = ArtifactStore(tempfile.mkdtemp(), keep_versions=2)
+    popularity = PopularityRecommender()
+    popularity.recommendations = make_popularity_frame([1], ['a'], [1.0])
+    versions = [store.save('popularity', popularity) for _ in range(3)]
+    assert store.versions('popularity') == versions[1:]
+    assert store.current_version('popularity') == versions[-1]
+
+    path = os.path.join(store.root, 'popularity', versions[-1], 'manifest.json')
+    with open(path) as f:
+        manifest = json.load(f)
+    manifest['format_version'] = -1
+    with open(path, 'w') as f:
+        json.dump(manifest, f)
+    assert store.load('popularity', PopularityRecommender) is None
+    assert store.load('popularity', CollaborativeRecommender, version=versions[1]) is None
+
+def test_release_pins_versions():
+    """Release ghim bộ version; version đang được release dùng không bị dọn"""
+    store = ArtifactStore(tempfile.mkdtemp(), keep_versions=1)
+    popularity = PopularityRecommender()
+    popularity.recommendations = make_popularity_frame([1], ['a'], [1.0])
+    pinned = store.save('popularity', popularity)
+    release = store.publish_release({'popularity': pinned}, activate_delay=2.0)
+    assert release['generation'] == 1 and release['activate_at'] > release['created_at']
+
+    latest = store.save('popularity', popularity)
+    assert store.versions('popularity') == [pinned, latest]
+    assert store.publish_release({'popularity': latest})['generation'] == 2
+    store.save('popularity', popularity)
+    assert pinned not in store.versions('popularity')
+    assert store.read_release()['versions'] == {'popularity': latest}
+
+if __name__ == "__main__":
+    test_frame_round_trip()
+    test_save_load_recommenders()
+    test_versions_and_incompatible_format()
+    test_release_pins_versions()
+    print("All tests passed")
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+from popularity_recommender import PopularityRecommender
+from synthetic_data import generate_products
+
+def legacy_recommend(recommendations, limit=8):
+    """Cách recommend cũ: copy catalog, apply theo dòng rồi iterrows mỗi request"""
+    filtered_df = recommendations.copy()
+    filtered_df['price_segment'] = filtered_df.apply(
+        lambda x: next(
+            (segment for min_p, max_p, segment in PopularityRecommender.PRICE_SEGMENTS
+             if min_p <= x['min_price'] < max_p),
+            'Unknown'
+        ),
+        axis=1
+    )
+    diverse_results = []
+    seen_categories = set()
+    seen_brands = set()
+    for segment in ['Cao cấp', 'Tầm trung cao', 'Tầm trung thấp', 'Phổ thông']:
+        count = 0
+        for _, product in filtered_df[filtered_df['price_segment'] == segment].iterrows():
+            if len(diverse_results) >= limit or count >= PopularityRecommender.MAX_PER_SEGMENT:
+                break
+            if product['category_name'] not in seen_categories and product['brand_name'] not in seen_brands:
+                diverse_results.append(product)
+                seen_categories.add(product['category_name'])
+                seen_brands.add(product['brand_name'])
+                count += 1
+    return diverse_results
+
+def legacy_reason(row):
+    """Cách tạo reason cũ: format theo từng dòng bằng df.apply(axis=1) lúc fit"""
+    reasons = []
+    if row['total_views'] >= 122:
+        if row['unique_viewers'] >= 26:
+            reasons.append(f"Hot {row['total_views']:,} lượt xem • {row['unique_viewers']} người quan tâm")
+        else:
+            reasons.append(f"Hot {row['total_views']:,} lượt xem")
+    elif row['total_views'] >= 112:
+        reasons.append(f"Phổ biến với {row['total_views']:,} lượt xem")
+    if row['avg_rating'] >= 4.0 and row['review_count'] >= 15:
+        reasons.append(f"Đánh giá xuất sắc {row['avg_rating']:.1f}★ ({row['review_count']} đánh giá)")
+    elif row['avg_rating'] >= 3.5 and row['review_count'] >= 10:
+        reasons.append(f"Đánh giá tốt {row['avg_rating']:.1f}★ ({row['review_count']} đánh giá)")
+    if row['days_since_launch'] <= 30:
+        sales_per_day = row['sold_count'] / max(1, row['days_since_launch'])
+        if sales_per_day >= 2:
+            reasons.append(f"Bán {int(sales_per_day)} sản phẩm/ngày")
+        elif row['sold_count'] >= 29:
+            reasons.append(f"Mới & Bán chạy ({int(row['sold_count'])} đã bán)")
+    elif row['sold_count'] >= 100:
+        reasons.append(f"Best seller ({int(row['sold_count'])} đã bán)")
+    elif row['sold_count'] >= 50:
+        reasons.append(f"Bán chạy ({int(row['sold_count'])} đã bán)")
+    return " • ".join(reasons[:2])
+
+
+def test_precomputed_recommend_matches_legacy():
+    recommender = PopularityRecommender().fit_products(generate_products(3000, n_categories=12, n_brands=40))
+
+    for limit in (1, 3, 8, 20):
+        recs = recommender.recommend(limit=limit)
+        assert ([int(p['product_id']) for p in recs] ==
+                [int(p['product_id']) for p in legacy_recommend(recommender.recommendations, limit)])
+    recs = recommender.recommend(limit=8)
+    assert len({p['category_name'] for p in recs}) == len(recs)
+    assert len({p['brand_name'] for p in recs}) == len(recs)
+    assert all('metrics' in p and 'price_segment' in p for p in recs)
+
+    # Kết quả trả về là bản copy, sửa không ảnh hưởng danh sách tính sẵn
+    recs[0]['name'] = 'changed'
+    assert recommender.recommend(limit=1)[0]['name'] != 'changed'
+
+    # Load từ artifact tính lại cùng danh sách
+    arrays, meta = recommender.to_artifact()
+    loaded = PopularityRecommender.from_artifact(arrays, meta)
+    assert ([int(p['product_id']) for p in loaded.recommend(limit=8)] ==
+            [int(p['product_id']) for p in recommender.recommend(limit=8)])
+
+def test_indexed_filters_match_brute_force():
+    recommender = PopularityRecommender().fit_products(generate_products(5000, n_categories=12, n_brands=40))
+    recommender.scan_chunk = 16
+    df = recommender.recommendations
+    cases = [
+        {'category': 'Category 3'},
+        {'brand': 'Brand 7'},
+        {'category': 'Category 3', 'brand': 'Brand 7'},
+        {'min_price': '5000000'},
+        {'max_price': '1500000', 'brand': 'Brand 2'},
+        {'min_price': 3000000, 'max_price': 3100000},
+        {'category': 'Category 5', 'min_price': '10000000', 'max_price': '20000000'},
+        {'category': 'Không tồn tại'},
+        {'min_price': 9e12}
+    ]
+    for filters in cases:
+        mask = pd.Series(True, index=df.index)
+        if 'category' in filters:
+            mask &= df['category_name'] == filters['category']
+        if 'brand' in filters:
+            mask &= df['brand_name'] == filters['brand']
+        if 'min_price' in filters:
+            mask &= df['min_price'] >= float(filters['min_price'])
+        if 'max_price' in filters:
+            mask &= df['min_price'] <= float(filters['max_price'])
+        for limit in (3, 8, 50):
+            expected = df[mask]['product_id'].head(limit).tolist()
+            assert [int(p['product_id']) for p in recommender.recommend(limit=limit, **filters)] == expected
+            # Lần 2 lấy từ cache
+            assert [int(p['product_id']) for p in recommender.recommend(limit=limit, **filters)] == expected
+
+    # Tham số rỗng từ query string = không lọc
+    assert ([int(p['product_id']) for p in recommender.recommend(category='', min_price='')] ==
+            [int(p['product_id']) for p in recommender.recommend()])
+
+    recommender.filter_cache_size = 2
+    for brand in ('Brand 1', 'Brand 2', 'Brand 3'):
+        recommender.recommend(brand=brand)
+    assert len(recommender._filter_cache) == 2
+
+def test_vectorized_reasons_match_legacy():
+    rng = np.random.default_rng(3)
+    products = generate_products(4000)
+    products['sold_count'] = rng.integers(0, 150, len(products))
+    products['review_count'] = rng.integers(0, 25, len(products))
+    recommender = PopularityRecommender().fit_products(products)
+    assert 'reason' not in recommender.recommendations.columns
+
+    expected = recommender.recommendations.apply(legacy_reason, axis=1).tolist()
+    assert [recommender._reason(row) for row in range(len(expected))] == expected
+    assert len(set(expected)) > 100
+    for product in recommender.recommend(limit=8):
+        assert product['reason'] == expected[recommender.recommendations.index.get_loc(product.name)]
+
+if __name__ == "__main__":
+    test_precomputed_recommend_matches_legacy()
+    test_indexed_filters_match_brute_force()
+    test_vectorized_reasons_match_legacy()
+    print("All tests passed")
@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+import numpy as np
+from popularity_recommender import PopularityRecommender
+from popularity_stream import HyperLogLog, PopularityStream
+from synthetic_data import generate_products
+
+def test_hyperloglog_estimate():
+    sketch = HyperLogLog(precision=10)
+    for user_id in range(20000):
+        sketch.add(user_id)
+        sketch.add(user_id)  # Phần tử lặp không làm tăng ước lượng
+    assert abs(sketch.count() - 20000) / 20000 < 0.08
+
+    small = HyperLogLog(precision=10)
+    for user_id in range(50):
+        small.add(user_id)
+    assert abs(small.count() - 50) <= 2
+
+    other = HyperLogLog(precision=10)
+    for user_id in range(10000, 30000):
+        other.add(user_id)
+    sketch.merge(other)
+    assert abs(sketch.count() - 30000) / 30000 < 0.08
+
+def test_stream_updates_and_reorders():
+    base = PopularityRecommender().fit_products(generate_products(2000, n_categories=10, n_brands=30))
+    trained_from = datetime.now() - timedelta(minutes=5)
+    stream = PopularityStream(half_life_hours=24, hll_precision=8)
+    # Event trước khi có model được giữ lại để replay
+    stream.record_event(int(base.recommendations['product_id'].iloc[-1]), 1, 'view')
+    stream.rebase(base, trained_from)
+    assert stream.events_since_rebase == 1
+
+    # Sản phẩm cuối bảng được xem/mua nhiều -> lên đầu
+    product_id = int(base.recommendations['product_id'].iloc[-2])
+    for user_id in range(300):
+        assert stream.record_event(product_id, user_id, 'view')
+    for user_id in range(40):
+        stream.record_event(product_id, user_id, 'purchase')
+    assert not stream.record_event(product_id, 1, 'cart')
+    assert not stream.record_event(999999, 1, 'view')
+
+    model = stream.build_model()
+    df = model.recommendations
+    scores = df['popularity_score'].to_numpy()
+    assert np.all(np.diff(scores) <= 1e-12)
+    assert int(df['product_id'].iloc[0]) == product_id
+    row = df[df['product_id'] == product_id].iloc[0]
+    original = base.recommendations[base.recommendations['product_id'] == product_id].iloc[0]
+    assert row['total_views'] == original['total_views'] + 300
+    assert row['sold_count'] == original['sold_count'] + 40
+    assert abs(row['unique_viewers'] - original['unique_viewers'] - 300) <= 30
+    assert sorted(df['product_id']) == sorted(base.recommendations['product_id'])
+    assert stream.build_model() is None
+
+    # Index bộ lọc được dựng lại trên thứ hạng mới
+    category = row['category_name']
+    assert int(model.recommend(limit=1, category=category)[0]['product_id']) == product_id
+
+    # Fit lại từ DB sau các event: rebase không replay event cũ hơn trained_from
+    stream.rebase(model, datetime.now() + timedelta(seconds=1))
+    assert stream.events_since_rebase == 0
+    assert stream.build_model() is None
+
+def test_old_events_decay():
+    base = PopularityRecommender().fit_products(generate_products(2000, n_categories=10, n_brands=30))
+    now = datetime.now()
+    stream = PopularityStream(half_life_hours=1, hll_precision=8)
+    stream.rebase(base, now - timedelta(hours=6))
+    # Cùng số view: sản phẩm xếp trên bị xem cách đây 5 giờ, sản phẩm xếp dưới vừa được xem
+    product_ids = base.recommendations['product_id']
+    old_product, recent_product = int(product_ids.iloc[1000]), int(product_ids.iloc[1001])
+    for _ in range(300):
+        stream.record_event(old_product, None, 'view', timestamp=now - timedelta(hours=5))
+        stream.record_event(recent_product, None, 'view', timestamp=now)
+
+    ranked = stream.build_model().recommendations['product_id'].tolist()
+    assert ranked.index(recent_product) < 10
+    assert ranked.index(recent_product) < ranked.index(old_product)
+
+def test_returning_viewers_not_double_counted():
+    base = PopularityRecommender().fit_products(generate_products(2000, n_categories=10, n_brands=30))
+    recommendations = base.recommendations
+    product_id = int(recommendations['product_id'].iloc[500])
+    original = int(recommendations['unique_viewers'].iloc[500])
+    # Người xem trong DB là user 0..original-1
+    calls = []
+    def viewer_loader(product_ids):
+        calls.append(list(product_ids))
+        if len(calls) == 1:
+            raise RuntimeError("database unavailable")
+        return {product_id: list(range(original))}
+    stream = PopularityStream(half_life_hours=24, hll_precision=10, viewer_loader=viewer_loader)
+    stream.rebase(base, datetime.now() - timedelta(minutes=5))
+
+    # Mọi người xem trong DB xem lại, user 1000..1049 xem lần đầu
+    assert original > 10
+    for user_id in list(range(original)) + list(range(1000, 1050)):
+        stream.record_event(product_id, user_id, 'view')
+    # Load lỗi: tạm cộng dồn (người xem lại bị đếm 2 lần)
+    model = stream.build_model()
+    row = model.recommendations[model.recommendations['product_id'] == product_id].iloc[0]
+    assert abs(row['unique_viewers'] - 2 * original - 50) <= 5
+
+    # Lần build sau seed lại từ DB: chỉ tính người xem mới
+    stream.record_event(product_id, 1050, 'view')
+    model = stream.build_model()
+    row = model.recommendations[model.recommendations['product_id'] == product_id].iloc[0]
+    assert abs(row['unique_viewers'] - original - 51) <= 5
+    assert calls == [[product_id], [product_id]]
+
+    # Đã seed thì không load lại cho tới lần rebase sau
+    stream.record_event(product_id, 1051, 'view')
+    assert stream.build_model() is not None and len(calls) == 2
+
+if __name__ == "__main__":
+    test_hyperloglog_estimate()
+    test_stream_updates_and_reorders()
+    test_old_events_decay()
+    test_returning_viewers_not_double_counted()
+    print("All tests passed")
@@ -0,0 +1,72 @@
+from product_cache import ProductCache
+
+COLUMNS = ['product_id', 'name', 'image_url', 'brand_name', 'category_name',
+           'min_price', 'max_price', 'avg_rating', 'review_count', 'sold_count']
+
+class FakeCursor:
+    description = [(name,) for name in COLUMNS]
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, query, params=None):
+        self.connection.queries.append(params)
+        catalog = self.connection.catalog
+        # params = danh sách id lặp lại cho 4 mệnh đề IN
+        ids = params[:len(params) // 4] if params else sorted(catalog)
+        self.rows = [catalog[pid] for pid in ids if pid in catalog]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self, n_products=20):
+        self.queries = []
+        self.catalog = {
+            pid: (pid, f'Product {pid}', f'{pid}.jpg', 'Brand', 'Category', 100.0 * pid, 120.0 * pid, 4.5, 3, 7)
+            for pid in range(1, n_products + 1)
+        }
+
+    def cursor(self):
+        return FakeCursor(self)
+
+def test_product_cache():
+    conn = FakeConnection()
+    cache = ProductCache(ttl=600, max_batch=3)
+
+    # Miss: 5 id -> 2 query gộp (max_batch 3), giữ đúng thứ tự yêu cầu, bỏ id không tồn tại
+    cards = cache.get_many([5, 2, 99, 7, 1, 3], conn)
+    assert [card['product_id'] for card in cards] == [5, 2, 7, 1, 3]
+    assert len(conn.queries) == 2
+
+    # Hit: không query thêm
+    cards = cache.get_many([3, 5], conn)
+    assert [card['name'] for card in cards] == ['Product 3', 'Product 5']
+    assert len(conn.queries) == 2
+
+    # Thẻ trả về là bản sao, sửa không ảnh hưởng cache
+    cards[0]['name'] = 'changed'
+    assert cache.get(3, conn)['name'] == 'Product 3'
+
+    # Invalidate theo id và theo version
+    conn.catalog[3] = (3, 'Renamed', '3.jpg', 'Brand', 'Category', 1.0, 2.0, 5.0, 1, 1)
+    cache.invalidate([3])
+    assert cache.get(3, conn)['name'] == 'Renamed'
+    cache.invalidate()
+    cache.get_many([5, 2], conn)
+    assert conn.queries[-1][:2] == [5, 2]
+
+    # Load toàn bộ catalog bằng 1 query
+    assert cache.load_all(conn) == 20
+    queries = len(conn.queries)
+    assert len(cache.get_many(range(1, 21), conn)) == 20
+    assert len(conn.queries) == queries
+    assert cache.stats()['entries'] == 20
+
+if __name__ == "__main__":
+    test_product_cache()
+    print("All tests passed")
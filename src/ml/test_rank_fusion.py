@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from rank_fusion import fuse, normalize_scores
+
+def brute_force_fuse(sources, n_items, weights, method, rrf_k=60):
+    """Gộp bằng dict theo từng item (cách cũ) để đối chiếu"""
+    fused, best = {}, {}
+    for name, (item_ids, scores) in sources.items():
+        normalized = normalize_scores(scores, method, rrf_k)
+        for item_id, score in zip(item_ids, normalized):
+            contribution = weights[name] * score
+            fused[int(item_id)] = fused.get(int(item_id), 0.0) + contribution
+            if contribution > best.get(int(item_id), (-1, None))[0]:
+                best[int(item_id)] = (contribution, name)
+    ranked = sorted(fused, key=lambda item_id: (-fused[item_id], item_id))[:n_items]
+    return ranked, [fused[item_id] for item_id in ranked], [best[item_id][1] for item_id in ranked]
+
+@pytest.mark.parametrize('method', ['weighted', 'rrf'])
+def test_fuse_matches_brute_force(method):
+    rng = np.random.default_rng(3)
+    weights = {'content': 0.5, 'collaborative': 0.4, 'popularity': 0.1}
+    # Các nguồn trùng nhau một phần, không sắp sẵn
+    sources = {
+        name: (rng.choice(1000, 300, replace=False), rng.normal(size=300))
+        for name in weights
+    }
+    item_ids, scores, best = fuse(sources, 20, weights=weights, method=method)
+    expected_ids, expected_scores, expected_best = brute_force_fuse(sources, 20, weights, method)
+    assert item_ids.tolist() == expected_ids
+    assert np.allclose(scores, expected_scores)
+    assert best.tolist() == expected_best
+
+def test_fuse_edge_cases():
+    empty = (np.empty(0, dtype=np.int64), np.empty(0))
+    item_ids, scores, best = fuse({'content': empty}, 8)
+    assert len(item_ids) == 0 and len(best) == 0
+
+    # Điểm bằng nhau -> chuẩn hóa thành 1; -inf bị bỏ
+    item_ids, scores, best = fuse({
+        'content': (np.array([5, 3]), np.array([2.0, 2.0])),
+        'collaborative': (np.array([3, 9]), np.array([1.0, -np.inf]))
+    }, 8, weights={'content': 0.5, 'collaborative': 0.4})
+    assert item_ids.tolist() == [3, 5]
+    assert np.allclose(scores, [0.9, 0.5])
+    assert best.tolist() == ['content', 'content']
+
+    with pytest.raises(ValueError):
+        normalize_scores(np.ones(3), method='borda')
+
+def test_fuse_ties_at_cutoff():
+    """Nhiều item hòa điểm ở hạng thứ k: lấy item id nhỏ nhất, không phụ thuộc thứ tự đầu vào"""
+    rng = np.random.default_rng(1)
+    item_ids = rng.permutation(np.arange(100, 400))
+    # 1 item điểm cao, còn lại chia 3 mức điểm, mỗi mức ~100 item
+    scores = np.where(item_ids == item_ids[0], 10.0, (item_ids % 3).astype(np.float64))
+    for n_items in (1, 5, 37, 150, 299):
+        fused_ids, fused_scores, _ = fuse({'popular': (item_ids, scores)}, n_items)
+        expected = sorted(zip(-scores, item_ids))[:n_items]
+        assert fused_ids.tolist() == [item_id for _, item_id in expected]
+        assert (np.diff(fused_scores) <= 0).all()
+
+if __name__ == "__main__":
+    test_fuse_matches_brute_force('weighted')
+    test_fuse_matches_brute_force('rrf')
+    test_fuse_edge_cases()
+    test_fuse_ties_at_cutoff()
+    print("All tests passed")
@@ -147,12 +147,13 @@ class RecommenderTester:
         """Tính similarity giữa 2 users"""
         try:
             if not self.collab_rec or \
-               user_a not in self.collab_rec.user_item_matrix.index or \
-               user_b not in self.collab_rec.user_item_matrix.index:
+               not self.collab_rec.user_item_matrix.has_user(user_a) or \
+               not self.collab_rec.user_item_matrix.has_user(user_b):
                 return 0
                 
-            user_a_vec = self.collab_rec.user_item_matrix.loc[user_a].values
-            user_b_vec = self.collab_rec.user_item_matrix.loc[user_b].values
+            matrix = self.collab_rec.user_item_matrix
+            user_a_vec = matrix.user_vector(matrix.user_index(user_a))
+            user_b_vec = matrix.user_vector(matrix.user_index(user_b))
             
             similarity = cosine_similarity([user_a_vec], [user_b_vec])[0][0]
             return similarity
@@ -23,6 +23,8 @@ def visualize_collaborative_analytics():
         conn = mysql.connector.connect(**db_config)
         model = CollaborativeRecommender()
         model.fit(conn)
+        # Ma trận dense chỉ dùng cho visualize
+        matrix = model.user_item_matrix.to_dataframe()
         
         # Tạo figure với subplot layout
         plt.style.use('default')
@@ -30,7 +32,7 @@ def visualize_collaborative_analytics():
         
         # 1. Phân phối số lượng tương tác của users
         plt.subplot(2, 3, 1)
-        user_interactions = (model.user_item_matrix > 0).sum(axis=1)
+        user_interactions = (matrix > 0).sum(axis=1)
         sns.histplot(data=user_interactions, bins=30)
         plt.title('Phân phối số lượng tương tác của Users', fontsize=12, pad=10)
         plt.xlabel('Số lượng tương tác')
@@ -38,7 +40,7 @@ def visualize_collaborative_analytics():
         
         # 2. Phân phối số lượng tương tác của items
         plt.subplot(2, 3, 2)
-        item_interactions = (model.user_item_matrix > 0).sum(axis=0)
+        item_interactions = (matrix > 0).sum(axis=0)
         sns.histplot(data=item_interactions, bins=30)
         plt.title('Phân phối số lượng tương tác của Items', fontsize=12, pad=10)
         plt.xlabel('Số lượng tương tác')
@@ -46,15 +48,15 @@ def visualize_collaborative_analytics():
         
         # 3. Heatmap ma trận tương tác (sample)
         plt.subplot(2, 3, 3)
-        sample_size = min(50, len(model.user_item_matrix))
-        interaction_sample = model.user_item_matrix.iloc[:sample_size, :sample_size]
+        sample_size = min(50, len(matrix))
+        interaction_sample = matrix.iloc[:sample_size, :sample_size]
         sns.heatmap(interaction_sample, cmap='YlOrRd')
         plt.title('Heatmap ma trận tương tác (sample)', fontsize=12, pad=10)
         
         # 4. Phân phối các giá trị singular
         plt.subplot(2, 3, 4)
         if len(model.user_factors) > 0:
-            U, sigma, Vt = np.linalg.svd(model.user_item_matrix.fillna(0))
+            U, sigma, Vt = np.linalg.svd(matrix.fillna(0))
             plt.plot(sigma[:30], 'bo-')
             plt.title('Phân phối Singular Values', fontsize=12, pad=10)
             plt.xlabel('Index')
@@ -62,7 +64,7 @@ def visualize_collaborative_analytics():
         
         # 5. Sparsity Analysis
         plt.subplot(2, 3, 5)
-        sparsity = (model.user_item_matrix == 0).sum().sum() / (model.user_item_matrix.shape[0] * model.user_item_matrix.shape[1])
+        sparsity = (matrix == 0).sum().sum() / (matrix.shape[0] * matrix.shape[1])
         labels = ['Có tương tác', 'Không có tương tác']
         sizes = [(1-sparsity)*100, sparsity*100]
         plt.pie(sizes, labels=labels, autopct='%1.1f%%')
@@ -88,8 +90,8 @@ def visualize_collaborative_analytics():
         
         # Thêm một số thống kê
         print("\nThống kê chi tiết:")
-        print(f"Số lượng Users: {len(model.user_item_matrix)}")
-        print(f"Số lượng Items: {len(model.user_item_matrix.columns)}")
+        print(f"Số lượng Users: {model.user_item_matrix.n_users}")
+        print(f"Số lượng Items: {model.user_item_matrix.n_items}")
         print(f"Sparsity: {sparsity*100:.2f}%")
         print(f"Trung bình tương tác/user: {user_interactions.mean():.2f}")
         print(f"Trung bình tương tác/item: {item_interactions.mean():.2f}")
@@ -44,7 +44,7 @@ def visualize_recommendation_calculation(user_id=10):  # Default user_id = 5
         
         # 3. Top recommendations
         plt.subplot(2, 2, 3)
-        actual_ratings = model.user_item_matrix.iloc[user_id].values
+        actual_ratings = model.user_item_matrix.user_vector(user_id)
         mask = actual_ratings == 0
         masked_predictions = predicted_ratings.copy()
         masked_predictions[~mask] = -np.inf
@@ -28,7 +28,7 @@ def visualize_recommendation_process():
         
         # Tính predicted ratings
         predicted_ratings = user_vector.dot(V)
-        actual_ratings = model.user_item_matrix.iloc[test_user_idx].values
+        actual_ratings = model.user_item_matrix.user_vector(test_user_idx)
         
         # Tạo figure
         plt.figure(figsize=(20, 15))
@@ -19,7 +19,7 @@ def visualize_svd_process():
         model.fit(conn)
         
         # Chuẩn bị data như cũ
-        original_matrix = model.user_item_matrix.fillna(0).values
+        original_matrix = model.user_item_matrix.to_dataframe().values
         U, sigma, Vt = np.linalg.svd(original_matrix)
         Sigma = np.zeros((U.shape[1], Vt.shape[0]))
         np.fill_diagonal(Sigma, sigma)